@@ -1,13 +1,37 @@
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, render_template_string, request, jsonify, Response
 from flask_cors import CORS
-from utils.automata import get_automata
+from utils.automata import Context, get_automata, warmup_modules
+from utils.functions.sesiones import MemoryBackend, get_backend
+from utils.functions.tokens import get_tokens
+from utils.functions.eventlog import stats_all as eventlog_stats
+from utils.functions.agregados import get_aggregator
+from utils.functions.cupos import get_ledger
+from utils.functions.exportar import exportar, TIPOS as _TIPOS_EXPORT
 import os
+import time
+from pathlib import Path
+import threading
+import gzip
+import json
+import hashlib
+import hmac
+from collections import OrderedDict
+import secrets
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+from http.cookies import SimpleCookie
 
 app = Flask(__name__)
-CORS(app)  # Permitir solicitudes desde cualquier origen
+CORS(app, expose_headers=['X-SAES-Token'])  # Permitir solicitudes desde cualquier origen
 
-# Obtener la instancia del autómata
+# Obtener la instancia del autómata (compila las rutas de utils.modules)
+_t_rutas = time.perf_counter()
 automata = get_automata()
+_RUTAS_S = time.perf_counter() - _t_rutas
 
 # HTML de la interfaz (puedes moverlo a un archivo separado si prefieres)
 HTML_TEMPLATE = r"""
@@ -605,6 +629,14 @@ HTML_TEMPLATE = r"""
                         body: JSON.stringify({ message: message })
                     });
                     
+                    if (response.status === 429) {
+                        const busy = await response.json();
+                        await new Promise(resolve => setTimeout(resolve, 1000));
+                        this.hideTyping();
+                        this.addMessage('system', busy.response);
+                        return;
+                    }
+
                     if (!response.ok) {
                         throw new Error('Error en la respuesta del servidor');
                     }
@@ -693,10 +725,356 @@ HTML_TEMPLATE = r"""
 </html>
 """
 
+# ------------------ Página precalculada ------------------
+# La plantilla no tiene variables: se renderiza una sola vez al arrancar y se
+# guarda como bytes (plano + gzip) con su ETag fuerte.
+
+_GZIP_MIN_BYTES = int(os.environ.get('SAES_GZIP_MIN_BYTES', 1024))
+_INDEX_CACHE_CONTROL = 'public, no-cache'
+
+_INDEX_PAGE = None
+
+
+def _build_index_page():
+    """Renderiza HTML_TEMPLATE y devuelve {'raw', 'gzip', 'etag', 'etag_gzip'}."""
+    with app.app_context():
+        html = render_template_string(HTML_TEMPLATE)
+    raw = html.encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    return {
+        'raw': raw,
+        'gzip': gzip.compress(raw, compresslevel=9, mtime=0),
+        'etag': digest,
+        'etag_gzip': f'{digest}-gz',
+    }
+
+
+def _get_index_page():
+    global _INDEX_PAGE
+    if _INDEX_PAGE is None:
+        _INDEX_PAGE = _build_index_page()
+    return _INDEX_PAGE
+
+
+def _acepta_gzip() -> bool:
+    return 'gzip' in request.accept_encodings
+
+
+def _encode_json(payload, acepta_gzip):
+    """Serializa payload; devuelve (bytes, comprimido) aplicando gzip sobre _GZIP_MIN_BYTES."""
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    if acepta_gzip and len(body) >= _GZIP_MIN_BYTES:
+        return gzip.compress(body, compresslevel=6), True
+    return body, False
+
+
+def _json_response(payload, status=200):
+    """Como jsonify, pero comprime con gzip si el cuerpo supera _GZIP_MIN_BYTES."""
+    body, comprimido = _encode_json(payload, _acepta_gzip())
+    resp = Response(body, status=status, mimetype='application/json')
+    resp.vary.add('Accept-Encoding')
+    if comprimido:
+        resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+
+# ------------------ Sesiones ------------------
+# Cada navegador tiene su propio Context, identificado por la cookie saes_sid
+# y guardado en el backend de utils.functions.sesiones (memoria o SQLite
+# compartido entre procesos, según SAES_SESSION_BACKEND).
+# Con SAES_SESSION_TOKENS=1 la parte estable del Context viaja en un token
+# firmado (utils.functions.tokens), en la cookie saes_tok o en el header
+# X-SAES-Token; cada respuesta trae el token nuevo en ambos. Solo el flujo en
+# curso (inscripción, dictamen...) pasa por el backend.
+
+_SESSION_COOKIE = 'saes_sid'
+_TOKEN_COOKIE = 'saes_tok'
+_TOKEN_HEADER = 'X-SAES-Token'
+_SESIONES = get_backend()
+_SESIONES_EN_MEMORIA = isinstance(_SESIONES, MemoryBackend)
+_TOKENS = get_tokens() if os.environ.get('SAES_SESSION_TOKENS', '0').strip().lower() in ('1', 'true', 'si', 'yes') else None
+
+
+def _token_de(cookie_header, token_header):
+    return token_header or _cookie_de(cookie_header, _TOKEN_COOKIE)
+
+
+def _cargar_sesion(cookie_header, token_header=None):
+    """Devuelve (sid, ctx, estado, conocida). Si la cookie/token no existe o
+    expiró, crea una sesión (conocida=False).
+    estado: con cookie, si la sesión es nueva; con token, si tiene flujo guardado."""
+    if _TOKENS is not None:
+        token = _token_de(cookie_header, token_header)
+        sid, ctx, con_flujo = _TOKENS.cargar(token)
+        return sid, ctx, con_flujo, _TOKENS.sid_de(token) == sid
+    sid = _sid_de_cookie(cookie_header)
+    if sid:
+        ctx = _SESIONES.get(sid)
+        if ctx is not None:
+            return sid, ctx, False, True
+    return secrets.token_urlsafe(18), Context(), True, False
+
+
+def _guardar_sesion(sid, ctx, estado):
+    """Persiste la sesión; devuelve (Set-Cookie, token) a mandar, None donde no haga falta."""
+    if _TOKENS is None:
+        _SESIONES.put(sid, ctx)
+        return (_cookie_sesion(sid) if estado else None), None
+    token = _TOKENS.guardar(sid, ctx, estado)
+    return f'{_TOKEN_COOKIE}={token}; Path=/; HttpOnly; SameSite=Lax', token
+
+
+def _cookie_sesion(sid):
+    return f'{_SESSION_COOKIE}={sid}; Path=/; HttpOnly; SameSite=Lax'
+
+
+# ------------------ Warmup / readiness ------------------
+# Al importar el módulo (también bajo gunicorn u otro servidor WSGI) se cargan
+# todas las tablas, se construyen índices, se compilan las rutas y se
+# precalcula la página. /api/ready responde 503 hasta terminar.
+
+_READY = threading.Event()
+_WARMUP_LOCK = threading.Lock()
+_WARMUP_INICIADO = False
+_WARMUP = {'steps_ms': {}, 'total_ms': None, 'error': None}
+
+
+def _warmup():
+    steps = _WARMUP['steps_ms']
+
+    def record(nombre, segundos):
+        steps[nombre] = round(segundos * 1000, 3)
+
+    t0 = time.perf_counter()
+    try:
+        record('rutas', _RUTAS_S)
+        warmup_modules(record)
+        t = time.perf_counter()
+        _get_index_page()
+        record('render.index', time.perf_counter() - t)
+    except Exception as e:
+        _WARMUP['error'] = str(e)
+        print(f"Error en warmup: {e}")
+    finally:
+        _WARMUP['total_ms'] = round((time.perf_counter() - t0) * 1000, 3)
+        _READY.set()
+
+
+def start_warmup():
+    """Lanza el warmup en segundo plano; las llamadas siguientes no hacen nada."""
+    global _WARMUP_INICIADO
+    with _WARMUP_LOCK:
+        if _WARMUP_INICIADO:
+            return
+        _WARMUP_INICIADO = True
+    threading.Thread(target=_warmup, name='saes-warmup', daemon=True).start()
+
+
+def _warmup_tras_fork():
+    # Con --preload el hilo de warmup se queda en el proceso padre: si no
+    # terminó antes del fork, el worker lo vuelve a lanzar. Si el padre no lo
+    # había lanzado (p. ej. el reloader, que hace fork+exec), nada.
+    global _WARMUP_INICIADO, _WARMUP_LOCK
+    _WARMUP_LOCK = threading.Lock()
+    if _WARMUP_INICIADO and not _READY.is_set():
+        _WARMUP_INICIADO = False
+        start_warmup()
+
+
+# ------------------ Control de admisión ------------------
+# Tres capas para /api/chat: token bucket por sesión, tope global de step()
+# en vuelo con cola de espera acotada, y rechazo rápido (429) cuando la cola
+# está llena. Los contadores se exponen en /api/metrics.
+
+_RATE_PER_S = float(os.environ.get('SAES_RATE_PER_S', 2.0))
+_RATE_BURST = float(os.environ.get('SAES_RATE_BURST', 6))
+_MAX_INFLIGHT = int(os.environ.get('SAES_MAX_INFLIGHT', 32))
+_MAX_QUEUE = int(os.environ.get('SAES_MAX_QUEUE', 64))
+_QUEUE_WAIT_S = float(os.environ.get('SAES_QUEUE_WAIT_S', 2.0))
+
+_MSG_OCUPADO = 'Hay muchas solicitudes en este momento, intenta en un momento. ⏳'
+
+
+class TokenBuckets:
+    """Un token bucket por clave (sesión o IP), como mucho max_keys: al
+    llenarse se descarta el usado hace más tiempo (LRU), que es el que más
+    probablemente ya se rellenó."""
+
+    def __init__(self, rate, burst, max_keys=50_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # clave -> [tokens, ultimo_ts], del menos al más reciente
+        self.limitados = 0
+
+    def consume(self, clave) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(clave)
+            if b is None:
+                while len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                b = self._buckets[clave] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(clave)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+            if b[0] >= 1.0:
+                b[0] -= 1.0
+                return True
+            self.limitados += 1
+            return False
+
+
+class Admision:
+    """Tope de llamadas en vuelo con cola de espera acotada (FIFO aproximado)."""
+
+    def __init__(self, max_inflight, max_queue, wait_s):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.wait_s = wait_s
+        self._cond = threading.Condition()
+        self.inflight = 0
+        self.waiting = 0
+        self.admitidas = 0
+        self.encoladas = 0
+        self.descartadas = 0
+        self.expiradas = 0
+
+    def saturado(self) -> bool:
+        """Chequeo sin bloqueo: True si ya no cabe ni en la cola."""
+        return self.inflight >= self.max_inflight and self.waiting >= self.max_queue
+
+    def acquire(self, desde=None) -> bool:
+        """desde (time.monotonic()): cuándo llegó la petición, si ya esperó
+        en otra cola (la del pool en modo async); esa espera cuenta contra wait_s."""
+        with self._cond:
+            if desde is not None and time.monotonic() - desde > self.wait_s:
+                self.expiradas += 1
+                return False
+            if self.inflight < self.max_inflight and self.waiting == 0:
+                self.inflight += 1
+                self.admitidas += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.descartadas += 1
+                return False
+            self.waiting += 1
+            self.encoladas += 1
+            try:
+                ok = self._cond.wait_for(lambda: self.inflight < self.max_inflight, self.wait_s)
+            finally:
+                self.waiting -= 1
+            if not ok:
+                self.expiradas += 1
+                return False
+            self.inflight += 1
+            self.admitidas += 1
+            return True
+
+    def descartar(self) -> None:
+        with self._cond:
+            self.descartadas += 1
+
+    def encolar(self) -> None:
+        """Cuenta una petición que espera fuera de acquire() (cola del pool)."""
+        with self._cond:
+            self.encoladas += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def metrics(self) -> dict:
+        return {
+            'inflight': self.inflight,
+            'waiting': self.waiting,
+            'max_inflight': self.max_inflight,
+            'max_queue': self.max_queue,
+            'admitted': self.admitidas,
+            'queued': self.encoladas,
+            'shed': self.descartadas,
+            'queue_timeouts': self.expiradas,
+        }
+
+
+_BUCKETS = TokenBuckets(_RATE_PER_S, _RATE_BURST)
+_ADMISION = Admision(_MAX_INFLIGHT, _MAX_QUEUE, _QUEUE_WAIT_S)
+
+
+def _cookie_de(cookie_header, nombre):
+    if not cookie_header:
+        return None
+    c = SimpleCookie()
+    try:
+        c.load(cookie_header)
+    except Exception:
+        return None
+    morsel = c.get(nombre)
+    return morsel.value if morsel is not None else None
+
+
+def _sid_de_cookie(cookie_header):
+    return _cookie_de(cookie_header, _SESSION_COOKIE)
+
+
+def _clave_cliente(sid, conocida, remote_addr):
+    """Clave del rate limit: la sesión solo si ya existía (cookie de una
+    sesión viva o token con firma válida); si no, la IP. Una cookie inventada
+    no abre un bucket nuevo."""
+    if sid and conocida:
+        return 'sid:' + sid
+    return 'ip:' + (remote_addr or '')
+
+
+def _payload_ocupado(motivo):
+    return {'error': motivo, 'response': _MSG_OCUPADO, 'status': 'busy'}
+
+
+def _run_admitido(fn, nxt, text, sid, ctx, estado, desde=None):
+    """Ejecuta el handler ya enrutado si pasa la admisión y guarda la sesión.
+    Devuelve (respuesta, Set-Cookie, token); None si se descartó."""
+    if not _ADMISION.acquire(desde):
+        return None
+    try:
+        out = automata.run(fn, nxt, text, ctx)
+        return (out,) + _guardar_sesion(sid, ctx, estado)
+    finally:
+        _ADMISION.release()
+
+
+def _metrics_payload():
+    return {
+        'admission': _ADMISION.metrics(),
+        'rate_limit': {
+            'rate_per_s': _BUCKETS.rate,
+            'burst': _BUCKETS.burst,
+            'limited': _BUCKETS.limitados,
+            'sessions': len(_BUCKETS._buckets),
+        },
+        'event_logs': eventlog_stats(),
+    }
+
+
 @app.route('/')
 def index():
     """Página principal con la interfaz del chat"""
-    return render_template_string(HTML_TEMPLATE)
+    page = _get_index_page()
+    usa_gzip = _acepta_gzip()
+    etag = page['etag_gzip'] if usa_gzip else page['etag']
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(page['gzip'] if usa_gzip else page['raw'], mimetype='text/html')
+        if usa_gzip:
+            resp.headers['Content-Encoding'] = 'gzip'
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = _INDEX_CACHE_CONTROL
+    resp.vary.add('Accept-Encoding')
+    return resp
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -704,60 +1082,426 @@ def chat():
     try:
         data = request.get_json()
         if not data or 'message' not in data:
-            return jsonify({'error': 'Mensaje requerido'}), 400
+            return _json_response({'error': 'Mensaje requerido'}, 400)
         
         user_message = data['message']
+
+        sid, ctx, estado, conocida = _cargar_sesion(request.headers.get('Cookie'),
+                                                    request.headers.get(_TOKEN_HEADER))
+        if not _BUCKETS.consume(_clave_cliente(sid, conocida, request.remote_addr)):
+            return _respuesta_ocupado('rate_limited')
         
         # Procesar el mensaje usando tu autómata
-        bot_response = automata.step(user_message)
+        fn, nxt = automata.match(user_message, ctx)
+        res = _run_admitido(fn, nxt, user_message, sid, ctx, estado)
+        if res is None:
+            return _respuesta_ocupado('overloaded')
+        bot_response, set_cookie, token = res
         
-        return jsonify({
+        resp = _json_response({
             'response': bot_response,
             'status': 'success'
         })
+        if set_cookie:
+            resp.headers['Set-Cookie'] = set_cookie
+        if token:
+            resp.headers[_TOKEN_HEADER] = token
+        return resp
     
     except Exception as e:
         print(f"Error procesando mensaje: {e}")
-        return jsonify({
+        return _json_response({
             'error': 'Error interno del servidor',
             'response': 'Lo siento, hubo un error procesando tu mensaje. Intenta nuevamente.'
-        }), 500
+        }, 500)
+
+def _respuesta_ocupado(motivo):
+    resp = _json_response(_payload_ocupado(motivo), 429)
+    resp.headers['Retry-After'] = '1'
+    return resp
+
+@app.route('/api/metrics')
+def metrics():
+    """Contadores de admisión y rate limit"""
+    return jsonify(_metrics_payload())
+
+_INSCRIPCIONES_LOG = Path(__file__).resolve().parent / "resources" / "logs" / "inscripciones.ndjson"
+
+@app.route('/api/stats/inscripciones')
+def stats_inscripciones():
+    """Contadores en vivo de inscripciones (incrementales desde el último checkpoint)"""
+    return jsonify(get_aggregator(_INSCRIPCIONES_LOG).snapshot())
+
+@app.route('/api/stats/cupos')
+def stats_cupos():
+    """Cupo vivo por grupo/materia según el ledger"""
+    return jsonify(get_ledger().snapshot())
+
+# Exportación para servicios escolares: sin SAES_EXPORT_TOKEN queda apagada
+# (son datos de alumnos). El token va en "Authorization: Bearer <token>".
+_EXPORT_TOKEN = os.environ.get('SAES_EXPORT_TOKEN', '').strip()
+_EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+@app.route('/api/export/<tipo>')
+def export(tipo):
+    """Solicitudes de dictamen o inscripción filtradas, en CSV o JSONL, por streaming.
+    Parámetros: formato, periodo, estatus (se puede repetir), desde, hasta."""
+    auth = request.headers.get('Authorization', '')
+    if not _EXPORT_TOKEN or not hmac.compare_digest(auth.encode(), f'Bearer {_EXPORT_TOKEN}'.encode()):
+        return jsonify({'error': 'No autorizado'}), 403
+    if tipo not in _TIPOS_EXPORT:
+        return jsonify({'error': f'Tipo desconocido: {tipo}'}), 404
+
+    formato = request.args.get('formato', 'csv').strip().lower()
+    periodo = request.args.get('periodo', '')
+    try:
+        partes = exportar(tipo, formato, periodo, request.args.getlist('estatus'),
+                          request.args.get('desde', ''), request.args.get('hasta', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    etiqueta = ''.join(c for c in periodo if c.isalnum() or c == '-') or 'todos'
+    nombre = f"{tipo}-{etiqueta}.{formato}"
+    resp = Response((p.encode('utf-8') for p in partes), mimetype=_EXPORT_MIMETYPES[formato])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+@app.route('/api/ready')
+def ready():
+    """Readiness: 503 hasta que termina el warmup (o si falló), con tiempos por paso"""
+    listo = _READY.is_set() and not _WARMUP['error']
+    return jsonify({
+        'ready': listo,
+        'warmup': _WARMUP,
+    }), (200 if listo else 503)
 
 @app.route('/api/status')
 def status():
     """Endpoint para verificar el estado del servidor"""
+    if _TOKENS is not None:
+        ctx = _cargar_sesion(request.headers.get('Cookie'), request.headers.get(_TOKEN_HEADER))[1]
+    else:
+        ctx = _SESIONES.get(request.cookies.get(_SESSION_COOKIE) or '') or Context()
     return jsonify({
-        'status': 'online',
-        'automata_state': automata.ctx.state,
-        'user': automata.ctx.get('user', 'Sin sesión')
+        'status': 'online' if _READY.is_set() else 'warming_up',
+        'automata_state': ctx.state,
+        'user': ctx.get('user', 'Sin sesión')
     })
 
 @app.route('/api/reset', methods=['POST'])
 def reset():
     """Endpoint para reiniciar la sesión del chatbot"""
     try:
-        automata.reset()
-        return jsonify({
+        if _TOKENS is not None:
+            # El token no se puede revocar: se borra el flujo y se tira la cookie
+            sid = _TOKENS.sid_de(_token_de(request.headers.get('Cookie'), request.headers.get(_TOKEN_HEADER)))
+        else:
+            sid = request.cookies.get(_SESSION_COOKIE)
+        if sid:
+            _SESIONES.delete(sid)
+        resp = jsonify({
             'status': 'success',
             'message': 'Sesión reiniciada correctamente'
         })
+        if _TOKENS is not None:
+            resp.headers['Set-Cookie'] = f'{_TOKEN_COOKIE}=; Path=/; Max-Age=0; HttpOnly; SameSite=Lax'
+        return resp
     except Exception as e:
         return jsonify({
             'error': 'Error reiniciando sesión'
         }), 500
 
+# ------------------ Modo asíncrono ------------------
+# Servidor HTTP/1.1 sobre asyncio (SAES_SERVER=async). El enrutamiento por
+# regex del autómata corre en el event loop; el handler (lectura de CSV,
+# escritura de NDJSON) se manda a un ThreadPoolExecutor acotado. El resto de
+# endpoints se sirven llamando a la app WSGI de Flask dentro del mismo pool.
+
+_ASYNC_WORKERS = int(os.environ.get('SAES_ASYNC_WORKERS', 16))
+_ASYNC_MAX_PENDING = int(os.environ.get('SAES_ASYNC_MAX_PENDING', _ASYNC_WORKERS * 8))
+_ASYNC_BACKLOG = int(os.environ.get('SAES_ASYNC_BACKLOG', 2048))
+_ASYNC_MAX_BODY = 64 * 1024
+_ASYNC_MAX_HEADERS = 100
+_ASYNC_KEEPALIVE_S = 15
+
+
+class _HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class AsyncServer:
+    def __init__(self, host, port, workers=_ASYNC_WORKERS, max_pending=_ASYNC_MAX_PENDING):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='saes-worker')
+        self.max_pending = max_pending
+        self._pending = None  # asyncio.Semaphore; se crea dentro del loop
+        # Cada step() ocupa un worker del pool: con un tope mayor, lo que no
+        # cabe esperaría en la cola del executor sin pasar nunca por la
+        # admisión (ni cola acotada ni 429)
+        _ADMISION.max_inflight = min(_ADMISION.max_inflight, workers)
+
+    async def offload(self, fn, *args):
+        """Ejecuta fn en el pool; como mucho max_pending tareas encoladas a la vez."""
+        async with self._pending:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def lleno(self) -> bool:
+        """True si ya hay max_pending tareas en el pool: /api/chat responde 429 en vez de esperar turno."""
+        return self._pending.locked()
+
+    # ---- Parseo HTTP ----
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), _ASYNC_KEEPALIVE_S)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise _HttpError(400)
+
+        headers = {}
+        for _ in range(_ASYNC_MAX_HEADERS + 1):
+            raw = await reader.readline()
+            if raw in (b'\r\n', b'\n', b''):
+                break
+            k, _, v = raw.decode('latin-1').partition(':')
+            headers[k.strip().lower()] = v.strip()
+        else:
+            raise _HttpError(431)
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise _HttpError(411)
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise _HttpError(400)
+        if length < 0:
+            raise _HttpError(400)
+        if length > _ASYNC_MAX_BODY:
+            raise _HttpError(413)
+        body = await reader.readexactly(length) if length else b''
+
+        path, _, query = target.partition('?')
+        return method.upper(), unquote(path), query, version, headers, body
+
+    def _write_response(self, writer, status, headers, body, keep_alive):
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        head += [f'{k}: {v}' for k, v in headers]
+        head.append(f'Content-Length: {len(body)}')
+        head.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+    # ---- Endpoints ----
+    async def _chat(self, headers, body, peer):
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            data = None
+        acepta_gzip = 'gzip' in headers.get('accept-encoding', '')
+        extra = []
+        if not isinstance(data, dict) or 'message' not in data:
+            status, payload = 400, {'error': 'Mensaje requerido'}
+        elif _ADMISION.saturado() or self.lleno():
+            # Rechazo en el loop, sin ocupar un worker del pool
+            _ADMISION.descartar()
+            status, payload = 429, _payload_ocupado('overloaded')
+        else:
+            user_message = data['message']
+            try:
+                cookie, token = headers.get('cookie'), headers.get(_TOKEN_HEADER.lower())
+                # Con un backend fuera del proceso (SQLite) la lectura va al pool, no al loop
+                if _SESIONES_EN_MEMORIA:
+                    sid, ctx, estado, conocida = _cargar_sesion(cookie, token)
+                else:
+                    sid, ctx, estado, conocida = await self.offload(_cargar_sesion, cookie, token)
+                if not _BUCKETS.consume(_clave_cliente(sid, conocida, peer)):
+                    status, payload = 429, _payload_ocupado('rate_limited')
+                else:
+                    fn, nxt = automata.match(user_message, ctx)
+                    res = None
+                    if self.lleno():
+                        _ADMISION.descartar()
+                    else:
+                        if _ADMISION.inflight >= _ADMISION.max_inflight:
+                            _ADMISION.encolar()  # espera en la cola del pool
+                        res = await self.offload(_run_admitido, fn, nxt, user_message, sid, ctx,
+                                                 estado, time.monotonic())
+                    if res is None:
+                        status, payload = 429, _payload_ocupado('overloaded')
+                    else:
+                        bot_response, set_cookie, token = res
+                        status, payload = 200, {'response': bot_response, 'status': 'success'}
+                        if set_cookie:
+                            extra.append(('Set-Cookie', set_cookie))
+                        if token:
+                            extra.append((_TOKEN_HEADER, token))
+            except Exception as e:
+                print(f"Error procesando mensaje: {e}")
+                status, payload = 500, {
+                    'error': 'Error interno del servidor',
+                    'response': 'Lo siento, hubo un error procesando tu mensaje. Intenta nuevamente.'
+                }
+
+        if status == 429:
+            extra.append(('Retry-After', '1'))
+
+        out, comprimido = _encode_json(payload, acepta_gzip)
+        resp_headers = [('Content-Type', 'application/json'), ('Vary', 'Accept-Encoding')] + extra
+        if comprimido:
+            resp_headers.append(('Content-Encoding', 'gzip'))
+        return status, resp_headers, out
+
+    def _call_wsgi(self, method, path, query, headers, body, peer, stream=False):
+        """stream=True devuelve el cuerpo como iterador (se cierra al terminar)."""
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': str(self.port),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': peer,
+            'CONTENT_TYPE': headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for k, v in headers.items():
+            if k not in ('content-type', 'content-length'):
+                environ['HTTP_' + k.upper().replace('-', '_')] = v
+
+        result = {}
+
+        def start_response(status, resp_headers, exc_info=None):
+            result['status'] = int(status.split(' ', 1)[0])
+            result['headers'] = [(k, v) for k, v in resp_headers if k.lower() not in ('content-length', 'connection')]
+
+        chunks = app(environ, start_response)
+        if stream:
+            return result['status'], result['headers'], chunks
+        try:
+            out = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return result['status'], result['headers'], out
+
+    async def _dispatch(self, method, path, query, headers, body, peer):
+        if method == 'POST' and path == '/api/chat':
+            return await self._chat(headers, body, peer)
+        # La exportación puede ser grande: se manda por pedazos, no se junta
+        stream = path.startswith('/api/export/')
+        return await self.offload(self._call_wsgi, method, path, query, headers, body, peer, stream)
+
+    async def _write_chunked(self, writer, status, headers, chunks, keep_alive):
+        """Respuesta con Transfer-Encoding: chunked; cada pedazo se genera en el pool."""
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        head += [f'{k}: {v}' for k, v in headers]
+        head.append('Transfer-Encoding: chunked')
+        head.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        it = iter(chunks)
+        fin = object()
+        try:
+            while True:
+                chunk = await self.offload(next, it, fin)
+                if chunk is fin:
+                    break
+                if chunk:
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        finally:
+            if hasattr(chunks, 'close'):
+                await self.offload(chunks.close)
+
+    async def _handle_conn(self, reader, writer):
+        peer = (writer.get_extra_info('peername') or ('', 0))[0]
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader)
+                except _HttpError as e:
+                    self._write_response(writer, e.status, [], b'', False)
+                    break
+                if req is None:
+                    break
+                method, path, query, version, headers, body = req
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                status, resp_headers, out = await self._dispatch(method, path, query, headers, body, peer)
+                if isinstance(out, bytes):
+                    self._write_response(writer, status, resp_headers, out, keep_alive)
+                else:
+                    await self._write_chunked(writer, status, resp_headers, out, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        self._pending = asyncio.Semaphore(self.max_pending)
+        server = await asyncio.start_server(self._handle_conn, self.host, self.port,
+                                            backlog=_ASYNC_BACKLOG, reuse_address=True)
+        async with server:
+            await server.serve_forever()
+
+
+def run_async(host, port):
+    srv = AsyncServer(host, port)
+    try:
+        asyncio.run(srv.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.executor.shutdown(wait=True)
+
+
+# El warmup corre solo en el proceso que atiende: importado por un servidor
+# WSGI, aquí; con python server.py, en el bloque de abajo (el padre del
+# reloader de Flask solo vigila archivos y nunca atiende peticiones).
+if __name__ != '__main__':
+    start_warmup()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_warmup_tras_fork)
+
+
 if __name__ == '__main__':
     # Configurar puerto desde variable de entorno o usar 5000 por defecto
     port = int(os.environ.get('PORT', 5001))
+    # 'threaded' (servidor de desarrollo de Flask) o 'async' (asyncio + pool acotado)
+    modo = os.environ.get('SAES_SERVER', 'threaded').strip().lower()
     
     print("Iniciando SAES Chat Server...")
     print(f"Interfaz disponible en: http://localhost:{port}")
     print(f"API disponible en: http://localhost:{port}/api/chat")
     print("Presiona Ctrl+C para detener el servidor")
     
-    app.run(
-        host='0.0.0.0',  # Permite conexiones externas
-        port=port,
-        debug=True,      # Modo desarrollo - cambiar a False en producción
-        threaded=True    # Permite múltiples conexiones simultáneas
-    )
\ No newline at end of file
+    if modo == 'async':
+        print(f"Modo asíncrono: {_ASYNC_WORKERS} workers, hasta {_ASYNC_MAX_PENDING} tareas en espera")
+        start_warmup()
+        run_async('0.0.0.0', port)
+    else:
+        # Con debug=True el reloader relanza este script en un hijo con
+        # WERKZEUG_RUN_MAIN=true: ese es el que atiende
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_warmup()
+        app.run(
+            host='0.0.0.0',  # Permite conexiones externas
+            port=port,
+            debug=True,      # Modo desarrollo - cambiar a False en producción
+            threaded=True    # Permite múltiples conexiones simultáneas
+        )
@@ -0,0 +1,387 @@
+# simulador.py
+"""
+Simulador de "hora pico" de inscripción.
+
+Crea N sesiones sintéticas; cada una inicia sesión, elige turno (M/V) y pide
+grupo con preferencia sesgada hacia los grupos populares (Zipf). Si no hay
+cupo reintenta con otro grupo del mismo turno (--reintentos).
+
+Modos:
+    automata  llama al autómata en proceso, con un Context por sesión.
+              Por defecto los logs van a un directorio temporal (el ledger de
+              cupo y la lista de espera se crean sobre ese log), así la
+              simulación no toca resources/logs. --logs-reales lo desactiva.
+              El calendario se fija a --periodo (por defecto, el de grupos.csv).
+              Las N boletas se dan de alta en un índice de credenciales en
+              memoria con la contraseña del simulador y un KDF barato
+              (--kdf-iteraciones).
+    http      habla con el servidor (python server.py) vía /api/chat, con la
+              cookie de sesión de cada alumno. Escribe en los logs del servidor.
+              El primer mensaje de cada sesión llega sin cookie y el límite
+              de peticiones lo cuenta por IP: para una simulación de carga
+              arranca el servidor con SAES_RATE_PER_S/SAES_RATE_BURST altos,
+              si no casi todo vuelve como "ocupado" (429). El periodo es el
+              del servidor (calendario o SAES_PERIODO).
+              Las boletas tienen que existir para el servidor:
+              --escribir-alumnos genera un CSV para SAES_ALUMNOS_CSV.
+
+Reporte: throughput, percentiles de latencia (todas las peticiones y solo
+'grupo:'), resultados, líneas de log por segundo y sobrecupo. El sobrecupo
+se cuenta del lado del cliente: inscripciones confirmadas por grupo contra
+los lugares libres que había al empezar (ledger en proceso o
+/api/stats/cupos), por cada materia del grupo.
+
+Uso:
+    python simulador.py --n 2000 --concurrencia 64
+    python simulador.py --escribir-alumnos /tmp/alumnos.csv --n 500
+    SAES_ALUMNOS_CSV=/tmp/alumnos.csv python server.py
+    python simulador.py --modo http --url http://127.0.0.1:5001 --n 500
+"""
+
+from __future__ import annotations
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_BASE = Path(__file__).resolve().parent
+_GRUPOS_CSV = _BASE / "resources" / "data" / "grupos.csv"
+_PASSWORD = "contrasena123"
+_BOLETA_BASE = 2023630000
+_MAX_BOLETAS = 10000  # USER_RE solo acepta 202363XXXX
+_KDF_ITERACIONES = 1000  # el costo real de login no es lo que se mide aquí
+
+# Clasificación de respuestas del chat (mismo texto en ambos modos)
+_RESULTADOS = (
+    ("De acuerdo, te inscribo", "inscrito"),
+    ("Se liberó un lugar", "inscrito"),
+    ("Lo intenté, pero", "sin_cupo"),
+    ("Sigues en la lista de espera", "en_espera"),
+    ("Ya estás inscrito", "ya_inscrito"),
+    ("No puedo inscribirte", "materia_duplicada"),
+    ("se empalma", "empalme"),
+    ("te faltan prerrequisitos", "sin_prerrequisitos"),
+    ("tienes adeudos", "adeudos"),
+)
+
+
+# Respuestas del login que cortan la sesión
+_LOGIN_OCUPADO = "Estoy verificando muchas contraseñas"
+_LOGIN_FALLIDO = "Usuario o contraseña incorrectos"
+_LOGIN_REINTENTOS = 20
+
+
+def _boletas(n: int) -> List[str]:
+    return [str(_BOLETA_BASE + i) for i in range(n)]
+
+
+def _escribir_alumnos(path: str, n: int, iteraciones: int) -> None:
+    from utils.functions.credenciales import hash_contrasena
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(["boleta", "contrasena_hash"])
+        for boleta in _boletas(n):
+            w.writerow([boleta, hash_contrasena(_PASSWORD, iteraciones)])
+
+
+def _clasificar(respuesta: str) -> str:
+    for prefijo, resultado in _RESULTADOS:
+        if prefijo in respuesta:
+            return resultado
+    return "otro"
+
+
+def _cargar_grupos(periodo: Optional[str] = None) -> Tuple[Dict[str, List[str]], str]:
+    """(turno ('M'/'V') -> [grupo_id], periodo). Sin periodo, el que más
+    grupos tiene en grupos.csv."""
+    with open(_GRUPOS_CSV, "r", encoding="utf-8-sig", newline="") as f:
+        rows = [{(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                for raw in csv.DictReader(f)]
+    if not periodo:
+        conteo = Counter(r.get("periodo_id", "") for r in rows)
+        periodo = conteo.most_common(1)[0][0] if conteo else ""
+    por_turno: Dict[str, List[str]] = {"M": [], "V": []}
+    for row in rows:
+        gid, mid = row.get("grupo_id", "").upper(), row.get("materia_id", "").upper()
+        if not gid or not mid or row.get("periodo_id", "") != periodo:
+            continue
+        turno = "M" if row.get("turno", "").lower().startswith("m") else "V"
+        if gid not in por_turno[turno]:
+            por_turno[turno].append(gid)
+    return por_turno, periodo
+
+
+def _sobrecupo(libres: Dict[str, dict], confirmados: Counter) -> Dict[str, int]:
+    """Lugares donde se confirmaron más inscripciones que lugares libres al inicio."""
+    out = {}
+    for clave, lugar in libres.items():
+        gid = clave.split("/", 1)[0]
+        exceso = confirmados.get(gid, 0) - max(lugar["capacidad"] - lugar["inscritos"], 0)
+        if exceso > 0:
+            out[clave] = exceso
+    return out
+
+
+def _pesos_zipf(n: int, s: float, rnd: random.Random) -> List[float]:
+    """Pesos 1/rank^s con los rangos repartidos al azar (qué grupo es 'el popular')."""
+    rangos = list(range(1, n + 1))
+    rnd.shuffle(rangos)
+    return [1.0 / (r ** s) for r in rangos]
+
+
+def _percentiles(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {}
+    v = sorted(valores)
+
+    def p(q):
+        return round(v[min(len(v) - 1, int(q * len(v)))] * 1000, 2)
+
+    return {"p50_ms": p(0.50), "p90_ms": p(0.90), "p99_ms": p(0.99), "max_ms": round(v[-1] * 1000, 2)}
+
+
+# ------------------ Clientes ------------------
+
+class ClienteAutomata:
+    def __init__(self, logs_reales: bool, periodo: str, n: int, kdf_iteraciones: int) -> None:
+        from utils.functions import credenciales, periodos
+        # El calendario se fija al periodo de los grupos simulados
+        periodos._CALENDARIO = periodos.Calendario(fijo=periodo)
+        credenciales._CREDENCIALES = credenciales.Credenciales.desde_filas(
+            {b: _PASSWORD for b in _boletas(n)}, kdf_iteraciones)
+        if not logs_reales:
+            self._aislar_logs()
+        from utils.automata import Context, get_automata
+        from utils.functions.cupos import get_ledger
+        from utils.functions.eventlog import stats_all
+        self._Context = Context
+        self._automata = get_automata()
+        self.ledger = get_ledger()
+        self._stats_all = stats_all
+
+    def _aislar_logs(self) -> None:
+        """Ledger (y con él la lista de espera y el módulo de inscripción) sobre un log temporal."""
+        from utils.functions import cupos
+        self.tmp = Path(tempfile.mkdtemp(prefix="saes-sim-"))
+        cupos.usar_log(self.tmp / "inscripciones.ndjson")
+        print(f"[simulador] logs en {self.tmp}")
+
+    def nueva_sesion(self):
+        return self._Context()
+
+    def enviar(self, sesion, mensaje: str) -> str:
+        return self._automata.step(mensaje, sesion)
+
+    def lineas_escritas(self) -> int:
+        return sum(s["written"] for s in self._stats_all().values())
+
+    def cupos(self) -> Dict[str, dict]:
+        return self.ledger.snapshot()
+
+    def cerrar(self) -> None:
+        from utils.functions.eventlog import flush_all
+        flush_all(10.0)
+
+
+class ClienteHttp:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+
+    def nueva_sesion(self):
+        return {"cookie": None}
+
+    def _request(self, path: str, payload: Optional[dict] = None, cookie: Optional[str] = None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.url + path, data=data, method="POST" if data else "GET")
+        req.add_header("Content-Type", "application/json")
+        if cookie:
+            req.add_header("Cookie", cookie)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status, resp.headers, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, json.loads(e.read() or b"{}")
+
+    def enviar(self, sesion, mensaje: str) -> str:
+        status, headers, body = self._request("/api/chat", {"message": mensaje}, sesion["cookie"])
+        set_cookie = headers.get("Set-Cookie")
+        if set_cookie:
+            sesion["cookie"] = set_cookie.split(";", 1)[0]
+        if status == 429:
+            return "__ocupado__"
+        return body.get("response", "")
+
+    def lineas_escritas(self) -> int:
+        _, _, body = self._request("/api/metrics")
+        return sum(s.get("written", 0) for s in body.get("event_logs", {}).values())
+
+    def cupos(self) -> Dict[str, dict]:
+        return self._request("/api/stats/cupos")[2]
+
+    def cerrar(self) -> None:
+        pass
+
+
+# ------------------ Simulación ------------------
+
+def _sesion(cliente, i: int, args, por_turno, pesos, rnd_seed: int, lat: List, lat_grupo: List, res: Counter,
+            confirmados: Counter, lock: threading.Lock) -> None:
+    rnd = random.Random(rnd_seed)
+    sesion = cliente.nueva_sesion()
+    turno = "M" if rnd.random() < args.p_matutino else "V"
+    grupos, w = por_turno[turno], pesos[turno]
+    mensajes = ["iniciar sesion", str(_BOLETA_BASE + i), _PASSWORD, f"turno: {turno}"]
+
+    def enviar(msg: str) -> Tuple[str, float]:
+        t0 = time.perf_counter()
+        out = cliente.enviar(sesion, msg)
+        dt = time.perf_counter() - t0
+        with lock:
+            lat.append(dt)
+        if args.pausa_ms:
+            time.sleep(args.pausa_ms / 1000.0)
+        return out, dt
+
+    for msg in mensajes:
+        out, _ = enviar(msg)
+        for k in range(_LOGIN_REINTENTOS):
+            # Pool del KDF lleno: como un alumno real, reintenta en un momento
+            if not out.startswith(_LOGIN_OCUPADO):
+                break
+            with lock:
+                res["login_reintentos"] += 1
+            time.sleep(min(0.25, 0.005 * 2 ** k))
+            out, _ = enviar(msg)
+        if out == "__ocupado__" or out.startswith(_LOGIN_OCUPADO):
+            with lock:
+                res["ocupado"] += 1
+            return
+        if out.startswith(_LOGIN_FALLIDO):
+            with lock:
+                res["login_fallido"] += 1
+            return
+
+    intentados = set()
+    for _ in range(1 + args.reintentos):
+        candidatos = [(g, p) for g, p in zip(grupos, w) if g not in intentados]
+        if not candidatos:
+            break
+        gid = rnd.choices([g for g, _ in candidatos], weights=[p for _, p in candidatos])[0]
+        intentados.add(gid)
+        out, dt = enviar(f"grupo: {gid}")
+        resultado = "ocupado" if out == "__ocupado__" else _clasificar(out)
+        with lock:
+            lat_grupo.append(dt)
+            res[resultado] += 1
+            if resultado == "inscrito":
+                confirmados[gid] += 1
+        if resultado != "sin_cupo":
+            break
+
+
+def simular(args) -> dict:
+    if args.n > _MAX_BOLETAS:
+        raise SystemExit(f"--n máximo {_MAX_BOLETAS} (boletas 202363XXXX)")
+    rnd = random.Random(args.seed)
+    por_turno, periodo = _cargar_grupos(args.periodo)
+    pesos = {t: _pesos_zipf(len(g), args.zipf, rnd) for t, g in por_turno.items()}
+    if args.modo == "automata":
+        cliente = ClienteAutomata(args.logs_reales, periodo, args.n, args.kdf_iteraciones)
+    else:
+        cliente = ClienteHttp(args.url)
+
+    lat: List[float] = []
+    lat_grupo: List[float] = []
+    res: Counter = Counter()
+    confirmados: Counter = Counter()
+    lock = threading.Lock()
+    lineas_antes = cliente.lineas_escritas()
+    libres = cliente.cupos()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        futuros = [pool.submit(_sesion, cliente, i, args, por_turno, pesos, rnd.randrange(1 << 30),
+                               lat, lat_grupo, res, confirmados, lock) for i in range(args.n)]
+        for f in futuros:
+            f.result()
+    dt = time.perf_counter() - t0
+    cliente.cerrar()
+    dt_log = time.perf_counter() - t0
+    lineas = cliente.lineas_escritas() - lineas_antes
+    sobre = _sobrecupo(libres, confirmados)
+
+    return {
+        "modo": args.modo,
+        "sesiones": args.n,
+        "concurrencia": args.concurrencia,
+        "segundos": round(dt, 3),
+        "sesiones_por_s": round(args.n / dt, 1),
+        "peticiones": len(lat),
+        "peticiones_por_s": round(len(lat) / dt, 1),
+        "latencia": _percentiles(lat),
+        "latencia_grupo": _percentiles(lat_grupo),
+        "resultados": dict(res.most_common()),
+        "lineas_log": lineas,
+        "lineas_log_por_s": round(lineas / dt_log, 1) if dt_log else 0.0,
+        "sobrecupo": len(sobre),
+        "sobrecupo_detalle": sobre,
+    }
+
+
+def _imprimir(r: dict) -> None:
+    print(f"Modo: {r['modo']} | sesiones: {r['sesiones']} | concurrencia: {r['concurrencia']}")
+    print(f"Tiempo: {r['segundos']} s | {r['sesiones_por_s']} sesiones/s | {r['peticiones_por_s']} peticiones/s")
+    print(f"Latencia (todas): {r['latencia']}")
+    print(f"Latencia (grupo): {r['latencia_grupo']}")
+    print(f"Resultados: {r['resultados']}")
+    print(f"Log: {r['lineas_log']} líneas | {r['lineas_log_por_s']} líneas/s")
+    print(f"Sobrecupo: {r['sobrecupo']} lugares" + (f" {r['sobrecupo_detalle']}" if r['sobrecupo'] else ""))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Simulador de hora pico de inscripción")
+    ap.add_argument("--modo", choices=("automata", "http"), default="automata")
+    ap.add_argument("--url", default="http://127.0.0.1:5001")
+    ap.add_argument("--n", type=int, default=1000, help="sesiones sintéticas")
+    ap.add_argument("--concurrencia", type=int, default=32)
+    ap.add_argument("--zipf", type=float, default=1.2, help="sesgo hacia grupos populares (0 = uniforme)")
+    ap.add_argument("--p-matutino", type=float, default=0.6)
+    ap.add_argument("--reintentos", type=int, default=2, help="otros grupos a intentar si no hay cupo")
+    ap.add_argument("--pausa-ms", type=float, default=0.0, help="pausa entre mensajes de una sesión")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--periodo", help="periodo de los grupos (por defecto el de grupos.csv)")
+    ap.add_argument("--logs-reales", action="store_true", help="(automata) escribir en resources/logs")
+    ap.add_argument("--kdf-iteraciones", type=int, default=_KDF_ITERACIONES,
+                    help="costo del hash de las contraseñas sintéticas")
+    ap.add_argument("--escribir-alumnos", metavar="CSV",
+                    help="solo escribe el CSV de credenciales de las N boletas (para SAES_ALUMNOS_CSV) y sale")
+    ap.add_argument("--json", action="store_true", help="reporte en JSON")
+    args = ap.parse_args(argv)
+
+    if args.modo == "automata" or args.escribir_alumnos:
+        sys.path.insert(0, str(_BASE))
+    if args.escribir_alumnos:
+        n = min(args.n, _MAX_BOLETAS)
+        _escribir_alumnos(args.escribir_alumnos, n, args.kdf_iteraciones)
+        print(f"{n} boletas escritas en {args.escribir_alumnos}")
+        return 0
+    r = simular(args)
+    if args.json:
+        print(json.dumps(r, ensure_ascii=False, indent=2))
+    else:
+        _imprimir(r)
+    return 1 if r["sobrecupo"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# tests/test_credenciales.py
+"""Espera por intentos fallidos (utils.functions.credenciales) con intentos
+simultáneos de la misma boleta."""
+
+import threading
+
+from utils.functions import credenciales
+from utils.functions.credenciales import Credenciales
+
+_HILOS = 32
+_BOLETA = "2023630001"
+
+
+def _rafaga(cred):
+    barrera = threading.Barrier(_HILOS)
+    esperas = [None] * _HILOS
+
+    def intento(i):
+        barrera.wait()
+        esperas[i] = cred.reservar_intento(_BOLETA)
+
+    hilos = [threading.Thread(target=intento, args=(i,)) for i in range(_HILOS)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return esperas
+
+
+def test_rafaga_no_se_salta_la_espera():
+    cred = Credenciales.desde_filas({_BOLETA: "secreta"}, iteraciones=1000)
+    esperas = _rafaga(cred)
+    # Pasan los libres más el primero que ya activa la espera; el resto espera
+    assert esperas.count(0.0) == credenciales._FALLOS_LIBRES + 1
+    assert all(e > 0 for e in esperas if e)
+    assert cred.fallo(_BOLETA) > 0
+
+
+def test_devolver_y_exito_no_cuentan():
+    cred = Credenciales.desde_filas({_BOLETA: "secreta"}, iteraciones=1000)
+    for _ in range(credenciales._FALLOS_LIBRES + 3):
+        assert cred.reservar_intento(_BOLETA) == 0.0
+        cred.devolver_intento(_BOLETA)  # KDF ocupado
+    assert cred.espera(_BOLETA) == 0.0
+    assert cred.reservar_intento(_BOLETA) == 0.0
+    assert cred.verificar(_BOLETA, "secreta")
+    cred.exito(_BOLETA)
+    assert cred._fallos == {}
@@ -0,0 +1,71 @@
+# tests/test_cupos.py
+"""Varios procesos inscribiendo en el mismo grupo (utils.functions.cupos):
+el cupo se comparte por el log y nunca hay sobrecupo."""
+
+import json
+import multiprocessing as mp
+
+_PROCESOS = 6
+_POR_PROCESO = 12
+_CAPACIDAD = 10
+_GRUPOS = ("grupo_id,materia_id,capacidad,inscritos,periodo_id\n"
+           f"3CM1,MAT101,{_CAPACIDAD},0,2025-1\n"
+           f"3CM1,MAT102,{_CAPACIDAD + 5},0,2025-1\n")
+
+
+def _inscribir(grupos, log, wid, barrera, salida):
+    from utils.functions.cupos import SeatLedger
+    ledger = SeatLedger(grupos, log)
+    barrera.wait()
+    resultados = []
+    for i in range(_POR_PROCESO):
+        boleta = f"20256{wid:02d}{i:03d}"
+        resultado, _ = ledger.reservar_grupo(boleta, "3CM1", registrar=lambda d, b=boleta: {
+            "boleta": b, "grupo_id": "3CM1", "resultado": "inscrito",
+            "materias": [{"materia_id": m} for m in d["disponibles"]]})
+        resultados.append(resultado)
+    ledger.al_dia()
+    salida.put((resultados, ledger.snapshot()))
+
+
+def test_inscripciones_en_varios_procesos(tmp_path):
+    grupos = tmp_path / "grupos.csv"
+    grupos.write_text(_GRUPOS, encoding="utf-8")
+    log = tmp_path / "inscripciones.ndjson"
+    ctx = mp.get_context("spawn")
+    barrera, salida = ctx.Barrier(_PROCESOS), ctx.Queue()
+    procs = [ctx.Process(target=_inscribir, args=(grupos, log, w, barrera, salida)) for w in range(_PROCESOS)]
+    for p in procs:
+        p.start()
+    vistos = [salida.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    resultados = [r for rs, _ in vistos for r in rs]
+    assert resultados.count("inscrito") == _CAPACIDAD
+    assert resultados.count("sin_cupo") == _PROCESOS * _POR_PROCESO - _CAPACIDAD
+    # Al final todos los procesos ven el mismo cupo, ya lleno
+    for _, snap in vistos:
+        assert snap["3CM1/MAT101"] == {"capacidad": _CAPACIDAD, "inscritos": _CAPACIDAD}
+        assert snap["3CM1/MAT102"]["inscritos"] == _CAPACIDAD
+
+    lineas = [json.loads(l) for l in log.read_text(encoding="utf-8").splitlines()]
+    assert len(lineas) == _CAPACIDAD
+    assert len({e["boleta"] for e in lineas}) == _CAPACIDAD
+
+
+def test_inscrito_en_disco_al_confirmar(tmp_path):
+    from utils.functions.cupos import SeatLedger
+    grupos = tmp_path / "grupos.csv"
+    grupos.write_text(_GRUPOS, encoding="utf-8")
+    log = tmp_path / "inscripciones.ndjson"
+    ledger = SeatLedger(grupos, log)
+    resultado, _ = ledger.reservar_grupo("2025600001", "3CM1", registrar=lambda d: {
+        "boleta": "2025600001", "grupo_id": "3CM1", "resultado": "inscrito"})
+    assert resultado == "inscrito"
+    # Sin flush: la confirmación no sale antes de que la línea esté en el archivo
+    lineas = [json.loads(l) for l in log.read_text(encoding="utf-8").splitlines()]
+    assert [e["boleta"] for e in lineas] == ["2025600001"]
+    # Un ledger nuevo (reinicio) la reproduce
+    assert SeatLedger(grupos, log).inscritos("3CM1", "MAT101") == 1
@@ -0,0 +1,54 @@
+# tests/test_dictamen.py
+"""Una sola solicitud de dictamen abierta por (boleta, materia, periodo),
+aunque la carta llegue a la vez por varios procesos."""
+
+import os
+import json
+import multiprocessing as mp
+
+from utils.functions import folios
+
+_PROCESOS = 6
+_PENDIENTE = {"materia": "Calculo Diferencial e Integral I", "semestre": "2023-1", "calificacion": "2"}
+
+
+def _usar_folios(folios_dir):
+    """Folios y leases en tmp, no en resources/folios."""
+    folios._ALLOCATOR = folios.FolioAllocator(folios_dir)
+    folios._ALLOCATOR_PID = os.getpid()
+
+
+def _enviar_carta(log, folios_dir, i, barrera, salida):
+    from utils.modules import dictamen
+    dictamen._DICTAMEN_LOG = log
+    _usar_folios(folios_dir)
+    barrera.wait()
+    accion, entrada = dictamen._registrar_carta("2023630000", dict(_PENDIENTE), f"carta {i}")
+    salida.put((accion, entrada["folio"]))
+
+
+def test_carta_simultanea_en_varios_procesos(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAES_PERIODO", "2025-1")
+    log = tmp_path / "dictamen.ndjson"
+    folios_dir = tmp_path / "folios"
+    monkeypatch.setattr(folios, "_ALLOCATOR", folios.FolioAllocator(folios_dir))
+    monkeypatch.setattr(folios, "_ALLOCATOR_PID", os.getpid())
+    ctx = mp.get_context("spawn")
+    barrera, salida = ctx.Barrier(_PROCESOS), ctx.Queue()
+    procs = [ctx.Process(target=_enviar_carta, args=(log, folios_dir, i, barrera, salida))
+             for i in range(_PROCESOS)]
+    for p in procs:
+        p.start()
+    resultados = [salida.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    acciones = sorted(a for a, _ in resultados)
+    assert acciones.count("nueva") == 1
+    assert set(acciones) <= {"nueva", "actualizada"}
+    assert len({f for _, f in resultados}) == 1  # todas sobre el mismo folio
+
+    lineas = [json.loads(l) for l in log.read_text(encoding="utf-8").splitlines()]
+    assert len(lineas) == _PROCESOS
+    assert lineas[-1]["actualizaciones"] == _PROCESOS - 1
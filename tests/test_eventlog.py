@@ -0,0 +1,54 @@
+# tests/test_eventlog.py
+"""Varios procesos escribiendo el mismo log (utils.functions.eventlog):
+ninguna línea se intercala, se parte ni se pierde."""
+
+import json
+import multiprocessing as mp
+
+import pytest
+
+from utils.functions import segmentos
+
+_PROCESOS = 6
+_POR_PROCESO = 3000
+
+
+def _escritor(path, wid, barrera):
+    from utils.functions.eventlog import EventLogWriter
+    w = EventLogWriter(path, fsync="none", flush_interval_s=0.01, max_batch=64)
+    barrera.wait()
+    relleno = "x" * (wid * 97 % 700)  # líneas de largos distintos
+    for i in range(_POR_PROCESO):
+        w.append({"w": wid, "i": i, "relleno": relleno})
+    assert w.flush(60)
+    w.close()
+
+
+@pytest.mark.parametrize("rotar_bytes", ["0", "200000"], ids=["sin_rotar", "rotando"])
+def test_escritores_en_varios_procesos(tmp_path, monkeypatch, rotar_bytes):
+    # Los hijos (spawn) leen la configuración al importar
+    monkeypatch.setenv("SAES_LOG_ROTATE_BYTES", rotar_bytes)
+    monkeypatch.setenv("SAES_LOG_COMPACT_AFTER", "4")
+    path = tmp_path / "stress.ndjson"
+    ctx = mp.get_context("spawn")
+    barrera = ctx.Barrier(_PROCESOS)
+    procs = [ctx.Process(target=_escritor, args=(str(path), w, barrera)) for w in range(_PROCESOS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+        assert p.exitcode == 0
+
+    vistos = {w: [] for w in range(_PROCESOS)}
+    total = 0
+    for seg in segmentos.segments(path):
+        with segmentos.open_segment(seg) as f:
+            for line in f:
+                assert line.endswith(b"\n")
+                entry = json.loads(line)
+                vistos[entry["w"]].append(entry["i"])
+                total += 1
+    assert total == _PROCESOS * _POR_PROCESO
+    # Cada proceso escribe en orden y sin duplicados
+    for w, idx in vistos.items():
+        assert idx == list(range(_POR_PROCESO)), w
@@ -0,0 +1,53 @@
+# tests/test_folios.py
+"""Unicidad de folios (utils.functions.folios) con varios hilos a la vez."""
+
+import os
+import threading
+
+from utils.functions.folios import FolioAllocator
+
+_HILOS = 16
+_POR_HILO = 5000
+
+
+def _emitir_en_hilos(alloc, prefijo):
+    salida = [[] for _ in range(_HILOS)]
+    barrera = threading.Barrier(_HILOS)
+
+    def trabajo(i):
+        barrera.wait()  # que todos arranquen juntos
+        mios = salida[i]
+        for _ in range(_POR_HILO):
+            mios.append(alloc.next(prefijo))
+
+    hilos = [threading.Thread(target=trabajo, args=(i,)) for i in range(_HILOS)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return [f for mios in salida for f in mios]
+
+
+def test_folios_unicos_entre_hilos(tmp_path):
+    alloc = FolioAllocator(tmp_path)
+    folios = _emitir_en_hilos(alloc, "INS")
+    assert len(folios) == _HILOS * _POR_HILO
+    assert len(set(folios)) == len(folios)
+    assert all(f.startswith("INS-") and f"-W{alloc.worker_id:03d}-" in f for f in folios)
+
+
+def test_dos_allocators_no_comparten_worker(tmp_path):
+    a, b = FolioAllocator(tmp_path), FolioAllocator(tmp_path)
+    assert a.worker_id != b.worker_id
+    folios = _emitir_en_hilos(a, "DIC") + _emitir_en_hilos(b, "DIC")
+    assert len(set(folios)) == len(folios)
+
+
+def test_reinicio_no_repite_folios(tmp_path):
+    primero = FolioAllocator(tmp_path, worker_id=7)
+    antes = set(_emitir_en_hilos(primero, "INS"))
+    # Simula que el proceso murió: se libera el lock del worker y se vuelve a reclamar
+    os.close(primero._fd)
+    segundo = FolioAllocator(tmp_path, worker_id=7)
+    despues = set(_emitir_en_hilos(segundo, "INS"))
+    assert not antes & despues
@@ -10,6 +10,7 @@ API:
     - create_automata() -> Automata
     - get_automata() -> Automata (singleton)
     - process_input(text: str) -> str
+    - warmup_modules(record) -> None
 """
 
 from __future__ import annotations
@@ -17,6 +18,7 @@ import re
 import pkgutil
 import importlib
 from typing import Callable, List, Optional, Tuple, Pattern, Set
+import time
 import unicodedata
 
 def norm(s: str) -> str:
@@ -128,20 +130,36 @@ class Automata:
     # recorre las rutas registradas y, al encontrar la primera que coincide,
     #  ejecuta su handler y actualiza el estado. Si nada coincide, 
     # llama a un fallback o devuelve un mensaje por defecto.
-    def step(self, text: str) -> str:
+    # Se separa en match() (solo regex, barato) y run() (handler, puede hacer I/O)
+    # para que el servidor asíncrono enrute en línea y mande el handler a un pool.
+    # ctx opcional: el servidor pasa el Context de cada sesión; si no se da,
+    # se usa self.ctx (consola / un solo usuario).
+    def match(self, text: str, ctx: Optional[Context] = None) -> Tuple[Optional[Callable[[Context, str], str]], Optional[str]]:
+        ctx = self.ctx if ctx is None else ctx
         t = norm(text)
         for rx, fn, nxt, origin, allowed in self._routes:
-            if allowed and self.ctx.state not in allowed:
-                # print(f"[SKIP] estado {self.ctx.state} no en {allowed} para {origin}")
+            if allowed and ctx.state not in allowed:
+                # print(f"[SKIP] estado {ctx.state} no en {allowed} para {origin}")
                 continue
             if rx.search(t):
                 # print(f"[MATCH] {origin} -> {rx.pattern}")
-                out = fn(self.ctx, text)
-                if nxt:
-                    self.ctx.state = nxt
-                    self.ctx["state"] = nxt
-                return out
-        return self._fallback(self.ctx, text) if self._fallback else "No hay manejador..."
+                return fn, nxt
+        return None, None
+
+    def run(self, fn: Optional[Callable[[Context, str], str]], nxt: Optional[str], text: str,
+            ctx: Optional[Context] = None) -> str:
+        ctx = self.ctx if ctx is None else ctx
+        if fn is None:
+            return self._fallback(ctx, text) if self._fallback else "No hay manejador..."
+        out = fn(ctx, text)
+        if nxt:
+            ctx.state = nxt
+            ctx["state"] = nxt
+        return out
+
+    def step(self, text: str, ctx: Optional[Context] = None) -> str:
+        fn, nxt = self.match(text, ctx)
+        return self.run(fn, nxt, text, ctx)
 
     def reset(self) -> None:
         self.ctx = Context()
@@ -159,4 +177,44 @@ def get_automata() -> Automata:
     return _AUTOMATA_SINGLETON
 
 def process_input(text: str) -> str:
-    return get_automata().step(text)
\ No newline at end of file
+    return get_automata().step(text)
+
+# -------------------- Warmup --------------------
+def _iter_modules():
+    pkg = importlib.import_module("utils.modules")
+    for finder, mod_name, ispkg in pkgutil.iter_modules(pkg.__path__, pkg.__name__ + "."):
+        try:
+            yield mod_name.rsplit(".", 1)[-1], importlib.import_module(mod_name)
+        except Exception:
+            continue
+
+def warmup_modules(record: Callable[[str, float], None]) -> None:
+    """
+    Precarga cada módulo de utils.modules para que el primer alumno no pague el costo:
+      - tablas:  llama a todas sus funciones _load_*() sin argumentos (CSV -> caché).
+      - indices: llama a warmup() si el módulo la define (índices derivados).
+      - regex:   compila sus *_RE en la caché de `re` con los flags de los handlers.
+    record(nombre_paso, segundos) recibe el tiempo de cada paso.
+    """
+    for short_name, mod in _iter_modules():
+        for attr, value in list(vars(mod).items()):
+            if attr.startswith("_load_") and callable(value):
+                t0 = time.perf_counter()
+                value()
+                record(f"tablas.{short_name}.{attr}", time.perf_counter() - t0)
+
+        hook = getattr(mod, "warmup", None)
+        if callable(hook):
+            t0 = time.perf_counter()
+            hook()
+            record(f"indices.{short_name}", time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for attr, value in vars(mod).items():
+            if attr.endswith("_RE") and isinstance(value, str):
+                for flags in (re.I | re.X, re.I):
+                    try:
+                        re.compile(value, flags)
+                    except re.error:
+                        pass
+        record(f"regex.{short_name}", time.perf_counter() - t0)
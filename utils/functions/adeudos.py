@@ -0,0 +1,106 @@
+# utils/functions/adeudos.py
+"""
+Adeudos por boleta (resources/data/vemos/adeudos.csv): colegiaturas,
+multas de biblioteca, material de laboratorio...
+
+Columnas esperadas: boleta,concepto,monto,fecha  (solo boleta es obligatoria)
+
+- El CSV se indexa en un dict boleta -> [adeudos]; la consulta es un lookup.
+- Si el archivo cambia (mtime/tamaño) se vuelve a indexar. Para no hacer un
+  stat por consulta, el cambio se revisa como mucho cada
+  SAES_ADEUDOS_CHECK_S segundos.
+- El índice nuevo se arma aparte y se publica con una sola asignación: los
+  lectores nunca ven uno a medias.
+API:
+    - get_adeudos() -> AdeudosIndex
+    - AdeudosIndex.de(boleta) -> list[dict]
+    - AdeudosIndex.tiene(boleta) -> bool
+    - render_bloqueo(adeudos, accion) -> str
+"""
+
+from __future__ import annotations
+import os
+import csv
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_ADEUDOS_CSV = Path(__file__).resolve().parents[2] / "resources" / "data" / "vemos" / "adeudos.csv"
+_CHECK_S = float(os.environ.get("SAES_ADEUDOS_CHECK_S", 2.0))
+
+
+class AdeudosIndex:
+    def __init__(self, path: Path = _ADEUDOS_CSV, check_s: float = _CHECK_S) -> None:
+        self.path = Path(path)
+        self.check_s = check_s
+        self._lock = threading.Lock()
+        self._firma: Optional[Tuple[int, int]] = None
+        self._por_boleta: Dict[str, List[dict]] = {}
+        self._proxima_revision = 0.0
+        self._recargar()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _recargar(self) -> None:
+        firma = self._stat()
+        por_boleta: Dict[str, List[dict]] = {}
+        if firma and firma[1] > 0:
+            try:
+                with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+                    for raw in csv.DictReader(f):
+                        row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                        if row.get("boleta"):
+                            por_boleta.setdefault(row["boleta"], []).append(row)
+            except FileNotFoundError:
+                firma = None
+        self._por_boleta = por_boleta
+        self._firma = firma
+
+    def _revisar(self) -> None:
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            if self._stat() != self._firma:
+                self._recargar()
+            self._proxima_revision = ahora + self.check_s
+
+    # ---- Consultas ----
+    def de(self, boleta: str) -> List[dict]:
+        self._revisar()
+        return self._por_boleta.get(str(boleta).strip(), [])
+
+    def tiene(self, boleta: str) -> bool:
+        return bool(self.de(boleta))
+
+
+def render_bloqueo(adeudos: List[dict], accion: str) -> str:
+    out = [f"No puedes {accion}: tienes adeudos pendientes."]
+    for a in adeudos:
+        concepto = a.get("concepto") or "Adeudo"
+        monto = f" | ${a['monto']}" if a.get("monto") else ""
+        fecha = f" | desde {a['fecha']}" if a.get("fecha") else ""
+        out.append(f"- {concepto}{monto}{fecha}")
+    out.append("Regulariza tu situación en servicios escolares (o en biblioteca) y vuelve a intentarlo.")
+    return "\n".join(out)
+
+
+# ------------------ Singleton ------------------
+_INDEX: Optional[AdeudosIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+def get_adeudos() -> AdeudosIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = AdeudosIndex()
+    return _INDEX
@@ -0,0 +1,226 @@
+# utils/functions/agregados.py
+"""
+Contadores en vivo sobre inscripciones.ndjson, sin releer el log.
+
+- Se guarda un checkpoint (segmento, inode, offset) junto con los contadores
+  en <log>.agg.json. Cada consulta solo lee lo agregado desde el checkpoint
+  (ver utils.functions.segmentos.iter_lines) y actualiza los contadores.
+- Si el checkpoint está en el segmento activo se guarda también el número que
+  recibirá al rotarse; así se reanuda en el segmento correcto aunque se haya
+  rotado (y comprimido) varias veces desde la última consulta. Los offsets
+  son del contenido sin comprimir.
+- Si la compactación reemplazó o borró el segmento del checkpoint, o el
+  activo se rotó mientras se leía, se recalcula todo.
+- Intento es solo lo que salió de pedir un grupo (_INTENTOS); bajas y
+  rechazos previos (empalme, sin_prerrequisitos) se cuentan en resultados
+  pero no como intentos. Una baja resta del inscrito por grupo.
+- Lista de espera (utils.functions.espera): "en_espera" suma a la cola del
+  grupo y "sale_espera" resta; la promoción ("inscrito" con origen
+  lista_espera) suma al inscrito y sale de la cola, pero no es un intento.
+Contadores:
+    - inscritos por grupo_id (netos de bajas), intentos por grupo_id
+    - en espera por grupo_id y promovidos desde la lista
+    - resultados (inscrito, sin_cupo, baja, ...) y las tasas sobre los intentos
+    - intentos por minuto (últimos _MINUTOS minutos con actividad)
+"""
+
+from __future__ import annotations
+import os
+import json
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from utils.functions import segmentos
+
+_MINUTOS = 120
+_VERSION = 3  # cambia si cambia qué se cuenta: un checkpoint de otra versión se descarta
+
+# Resultados de un intento de inscripción a un grupo
+_INTENTOS = frozenset({"inscrito", "sin_cupo", "ya_inscrito", "materia_duplicada",
+                       "turno_mismatch", "grupo_no_en_turno"})
+
+
+class EnrollmentAggregator:
+    def __init__(self, path: Path, checkpoint_path: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.checkpoint_path = Path(checkpoint_path or self.path.with_name(self.path.name + ".agg.json"))
+        self._lock = threading.Lock()
+        self._reset()
+        self._load_checkpoint()
+
+    def _reset(self) -> None:
+        self.seg: Optional[str] = None
+        self.inode = 0
+        self.seq: Optional[int] = None  # número del segmento (o el que tendrá al rotarse)
+        self.offset = 0
+        self.lineas = 0
+        self.inscritos = Counter()
+        self.intentos = Counter()
+        self.resultados = Counter()
+        self.en_espera = Counter()
+        self.promovidos = 0
+        self.por_minuto: Dict[str, int] = {}
+
+    # ---- Checkpoint ----
+    def _load_checkpoint(self) -> None:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                cp = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if cp.get("v") != _VERSION:
+            return
+        self.seg, self.inode, self.offset = cp.get("seg"), cp.get("inode", 0), cp.get("offset", 0)
+        self.seq = cp.get("seq")
+        self.lineas = cp.get("lineas", 0)
+        self.inscritos = Counter(cp.get("inscritos", {}))
+        self.intentos = Counter(cp.get("intentos", {}))
+        self.resultados = Counter(cp.get("resultados", {}))
+        self.en_espera = Counter(cp.get("en_espera", {}))
+        self.promovidos = cp.get("promovidos", 0)
+        self.por_minuto = dict(cp.get("por_minuto", {}))
+
+    def _save_checkpoint(self) -> None:
+        cp = {
+            "v": _VERSION, "seg": self.seg, "inode": self.inode, "seq": self.seq, "offset": self.offset, "lineas": self.lineas,
+            "inscritos": self.inscritos, "intentos": self.intentos,
+            "resultados": self.resultados, "en_espera": self.en_espera,
+            "promovidos": self.promovidos, "por_minuto": self.por_minuto,
+        }
+        tmp = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cp, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.checkpoint_path)
+
+    def _resume_point(self) -> Optional[Tuple[str, int]]:
+        if self.seg is None:
+            return None
+        # No se compara el inode del activo: al rotar y comprimir, el archivo
+        # nuevo puede reutilizar el inode del anterior. El número de segmento sí es fiable.
+        if self.seg == self.path.name and segmentos.next_seq(self.path) == self.seq:
+            return self.seg, self.offset
+        for seg in segmentos.closed_segments(self.path):
+            if segmentos.segment_seq(self.path, seg.name) != self.seq:
+                continue
+            try:
+                reemplazado = seg.name == self.seg and os.stat(seg).st_ino != self.inode
+            except FileNotFoundError:
+                return None
+            return None if reemplazado else (seg.name, self.offset)
+        return None  # no se puede ubicar (compactación): se recalcula desde cero
+
+    # ---- Actualización incremental ----
+    def update(self) -> int:
+        with self._lock:
+            start = self._resume_point()
+            if start is None and self.seg is not None:
+                self._reset()
+            nuevas = 0
+            seg_actual = None
+            # Antes de listar: el activo que se abra tendrá este número al rotarse
+            seq_activo = segmentos.next_seq(self.path)
+            for seg, off, line in segmentos.iter_lines(self.path, start):
+                if seg != seg_actual:
+                    seg_actual = seg
+                    try:
+                        self.inode = os.stat(seg).st_ino
+                    except FileNotFoundError:
+                        self.inode = 0
+                    self.seg = seg.name
+                    self.seq = segmentos.segment_seq(self.path, seg.name)
+                    if self.seq is None:
+                        self.seq = seq_activo
+                self.offset = off + len(line)
+                nuevas += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._count(entry)
+            if nuevas and self.seg == self.path.name and segmentos.next_seq(self.path) != seq_activo:
+                # Se rotó durante la lectura: no se sabe con certeza qué
+                # archivo se leyó; el checkpoint no se podrá ubicar y la
+                # próxima consulta recalcula desde cero.
+                self.seq = -1
+            if nuevas:
+                self.lineas += nuevas
+                self._prune_minutes()
+                self._save_checkpoint()
+            return nuevas
+
+    def _count(self, entry: dict) -> None:
+        gid = entry.get("grupo_id", "")
+        resultado = entry.get("resultado", "")
+        self.resultados[resultado] += 1
+        if resultado == "inscrito" and gid:
+            self.inscritos[gid] += 1
+        elif resultado == "baja":
+            _restar(self.inscritos, gid)
+        if resultado == "en_espera" and gid:
+            self.en_espera[gid] += 1
+        elif resultado == "sale_espera":
+            _restar(self.en_espera, gid)
+        if resultado == "inscrito" and entry.get("origen") == "lista_espera":
+            # Promoción automática: nadie lo pidió en ese momento
+            _restar(self.en_espera, gid)
+            self.promovidos += 1
+            return
+        if resultado not in _INTENTOS:
+            return
+        if gid:
+            self.intentos[gid] += 1
+        minuto = str(entry.get("ts", ""))[:16]  # YYYY-MM-DDTHH:MM
+        if minuto:
+            self.por_minuto[minuto] = self.por_minuto.get(minuto, 0) + 1
+
+    def _prune_minutes(self) -> None:
+        if len(self.por_minuto) > _MINUTOS:
+            for k in sorted(self.por_minuto)[:-_MINUTOS]:
+                del self.por_minuto[k]
+
+    # ---- Consulta ----
+    def snapshot(self) -> dict:
+        self.update()
+        with self._lock:
+            # Las promociones están en resultados["inscrito"] pero no son intentos
+            total = sum(n for r, n in self.resultados.items() if r in _INTENTOS) - self.promovidos
+
+            def tasa(r):
+                return round(self.resultados.get(r, 0) / total, 4) if total else 0.0
+
+            return {
+                "total_intentos": total,
+                "inscritos_por_grupo": dict(sorted(self.inscritos.items())),
+                "intentos_por_grupo": dict(sorted(self.intentos.items())),
+                "resultados": dict(self.resultados),
+                "en_espera_por_grupo": dict(sorted(self.en_espera.items())),
+                "promovidos_lista_espera": self.promovidos,
+                "tasa_sin_cupo": tasa("sin_cupo"),
+                "tasa_turno_mismatch": tasa("turno_mismatch"),
+                "intentos_por_minuto": dict(sorted(self.por_minuto.items())),
+                "checkpoint": {"segmento": self.seg, "offset": self.offset, "lineas": self.lineas},
+            }
+
+
+def _restar(contador: Counter, clave: str) -> None:
+    if contador.get(clave, 0) > 0:
+        contador[clave] -= 1
+        if not contador[clave]:
+            del contador[clave]
+
+
+# ------------------ Registro ------------------
+_AGGS: Dict[Path, EnrollmentAggregator] = {}
+_AGGS_LOCK = threading.Lock()
+
+def get_aggregator(path: Path) -> EnrollmentAggregator:
+    key = Path(path).resolve()
+    a = _AGGS.get(key)
+    if a is None:
+        with _AGGS_LOCK:
+            a = _AGGS.get(key)
+            if a is None:
+                a = _AGGS[key] = EnrollmentAggregator(key)
+    return a
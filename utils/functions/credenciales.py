@@ -0,0 +1,332 @@
+# utils/functions/credenciales.py
+"""
+Verificación de contraseñas contra resources/data/alumnos.csv.
+
+Columnas: boleta,...,contrasena_hash  (o contrasena, en texto plano; ver abajo)
+
+- Índice boleta -> hash. El hash es PBKDF2-SHA256 con sal por alumno, en el
+  formato "pbkdf2_sha256$<iteraciones>$<sal hex>$<hash hex>": el costo va en
+  cada hash, así que subir SAES_KDF_ITERATIONS no invalida los anteriores
+  (aplica a los que se generen después).
+- Filas con contrasena en texto plano (CSV sin migrar): se hashean al cargar
+  y el texto plano no se guarda. `python -m utils.functions.credenciales
+  --migrar` reescribe el CSV con contrasena_hash.
+- El KDF corre en un pool propio de SAES_KDF_WORKERS hilos con como mucho
+  SAES_KDF_MAX_PENDING verificaciones en cola; si está lleno, verificar()
+  lanza KdfOcupado sin esperar (con los segundos sugeridos para reintentar,
+  SAES_KDF_RETRY_S). Cada verificación admitida ocupa un hilo del chat
+  mientras espera, así que el total admitido se limita además a la mitad de
+  SAES_ASYNC_WORKERS: una ráfaga de logins nunca deja al chat sin hilos.
+- Boleta inexistente: se corre el KDF contra un hash de relleno, para que el
+  tiempo de respuesta no revele qué boletas existen.
+- Intentos fallidos por boleta (en el proceso): después de
+  SAES_LOGIN_FALLOS_LIBRES fallos, cada uno más duplica la espera
+  (SAES_LOGIN_BACKOFF_S, 2x, 4x... hasta SAES_LOGIN_BACKOFF_MAX_S). Un
+  acierto la borra. Cada intento se cuenta como fallo antes de correr el
+  KDF (reservar_intento, bajo el lock) y se devuelve si acierta o si el KDF
+  estaba ocupado: una ráfaga de intentos en paralelo no puede pasar toda
+  antes de que se registre el primer fallo. El conteo por sesión lo lleva iniciarSesion en el
+  Context, con la misma curva (espera_por_fallos).
+- Si alumnos.csv cambia (mtime/tamaño, revisado como mucho cada
+  SAES_ALUMNOS_CHECK_S segundos) se vuelve a indexar.
+API:
+    - get_credenciales() -> Credenciales
+    - Credenciales.verificar(boleta, contrasena) -> bool   (KdfOcupado si el pool está lleno)
+    - Credenciales.espera(boleta) -> float   (segundos que faltan; 0 = puede intentar)
+    - Credenciales.reservar_intento(boleta) -> float   (0 = reservado; si no, la espera)
+    - Credenciales.fallo(boleta) -> float    (confirma el reservado; la espera que queda)
+    - Credenciales.devolver_intento(boleta)  (no se pudo verificar: no cuenta)
+    - Credenciales.exito(boleta)
+    - hash_contrasena(contrasena, iteraciones=None) -> str
+    - espera_por_fallos(fallos) -> float
+"""
+
+from __future__ import annotations
+import os
+import csv
+import sys
+import time
+import hmac
+import hashlib
+import secrets
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+_ALUMNOS_CSV = Path(os.environ.get(
+    "SAES_ALUMNOS_CSV",
+    Path(__file__).resolve().parents[2] / "resources" / "data" / "alumnos.csv",
+))
+_ITERACIONES = int(os.environ.get("SAES_KDF_ITERATIONS", 200_000))
+_KDF_WORKERS = int(os.environ.get("SAES_KDF_WORKERS", 2))
+_KDF_MAX_PENDING = int(os.environ.get("SAES_KDF_MAX_PENDING", 2))
+_KDF_RETRY_S = float(os.environ.get("SAES_KDF_RETRY_S", 2.0))
+_CHAT_WORKERS = int(os.environ.get("SAES_ASYNC_WORKERS", 16))
+# Verificaciones admitidas a la vez (corriendo + en cola): debajo del pool del chat
+_KDF_ADMITIDAS = max(1, min(_KDF_WORKERS + _KDF_MAX_PENDING, _CHAT_WORKERS // 2))
+_KDF_TIMEOUT_S = float(os.environ.get("SAES_KDF_TIMEOUT_S", 10.0))
+_CHECK_S = float(os.environ.get("SAES_ALUMNOS_CHECK_S", 2.0))
+
+_FALLOS_LIBRES = int(os.environ.get("SAES_LOGIN_FALLOS_LIBRES", 3))
+_BACKOFF_S = float(os.environ.get("SAES_LOGIN_BACKOFF_S", 1.0))
+_BACKOFF_MAX_S = float(os.environ.get("SAES_LOGIN_BACKOFF_MAX_S", 300.0))
+_MAX_BOLETAS_VIGILADAS = 100_000  # tope del registro de fallos por boleta
+
+_ALGORITMO = "pbkdf2_sha256"
+
+
+class KdfOcupado(RuntimeError):
+    """Demasiadas verificaciones en cola: reintentar en reintentar_s segundos."""
+
+    def __init__(self, reintentar_s: float = _KDF_RETRY_S) -> None:
+        super().__init__(f"KDF ocupado, reintentar en {reintentar_s:g} s")
+        self.reintentar_s = reintentar_s
+
+
+# ------------------ Hash ------------------
+
+def _kdf(contrasena: str, sal: bytes, iteraciones: int) -> bytes:
+    # hashlib suelta el GIL durante el PBKDF2: los hilos del pool corren en paralelo
+    return hashlib.pbkdf2_hmac("sha256", contrasena.encode("utf-8"), sal, iteraciones)
+
+
+def hash_contrasena(contrasena: str, iteraciones: Optional[int] = None) -> str:
+    iteraciones = iteraciones or _ITERACIONES
+    sal = secrets.token_bytes(16)
+    return f"{_ALGORITMO}${iteraciones}${sal.hex()}${_kdf(contrasena, sal, iteraciones).hex()}"
+
+
+def _coincide(contrasena: str, guardado: str) -> bool:
+    try:
+        algoritmo, iteraciones, sal, esperado = guardado.split("$")
+        if algoritmo != _ALGORITMO:
+            return False
+        calculado = _kdf(contrasena, bytes.fromhex(sal), int(iteraciones))
+        return hmac.compare_digest(calculado, bytes.fromhex(esperado))
+    except ValueError:
+        return False  # hash mal formado en el CSV
+
+
+def espera_por_fallos(fallos: int) -> float:
+    """0 para los primeros _FALLOS_LIBRES; después _BACKOFF_S, 2x, 4x... con tope."""
+    extra = fallos - _FALLOS_LIBRES
+    if extra <= 0:
+        return 0.0
+    return min(_BACKOFF_MAX_S, _BACKOFF_S * (2 ** min(extra - 1, 32)))
+
+
+# ------------------ Pool del KDF ------------------
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_CUPOS_KDF = threading.BoundedSemaphore(_KDF_ADMITIDAS)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=_KDF_WORKERS, thread_name_prefix="saes-kdf")
+    return _POOL
+
+
+def _en_pool(fn, *args):
+    """Corre fn en el pool del KDF y espera el resultado. KdfOcupado, sin
+    esperar, si ya hay _KDF_ADMITIDAS verificaciones corriendo o en cola."""
+    if not _CUPOS_KDF.acquire(blocking=False):
+        raise KdfOcupado()
+    try:
+        fut = _pool().submit(fn, *args)
+    except BaseException:
+        _CUPOS_KDF.release()
+        raise
+    fut.add_done_callback(lambda _: _CUPOS_KDF.release())
+    try:
+        return fut.result(timeout=_KDF_TIMEOUT_S)
+    except FuturesTimeout:
+        raise KdfOcupado() from None
+
+
+# ------------------ Índice ------------------
+
+def _leer_csv(path: Path) -> Iterable[dict]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for raw in csv.DictReader(f):
+                yield {k.strip().lower(): (v or "").strip() for k, v in raw.items() if k is not None}
+    except FileNotFoundError:
+        return
+
+
+class Credenciales:
+    def __init__(self, path: Path = _ALUMNOS_CSV, iteraciones: int = _ITERACIONES,
+                 check_s: float = _CHECK_S) -> None:
+        self.path = Path(path)
+        self.iteraciones = iteraciones
+        self.check_s = check_s
+        self._lock = threading.Lock()
+        self._firma: Optional[Tuple[int, int]] = None
+        self._hashes: Dict[str, str] = {}
+        self._proxima_revision = 0.0
+        # Hash de relleno para boletas que no existen (mismo costo)
+        self._relleno = hash_contrasena(secrets.token_hex(16), iteraciones)
+        # boleta -> (fallos, bloqueado_hasta en monotonic)
+        self._fallos: Dict[str, Tuple[int, float]] = {}
+        self._fallos_lock = threading.Lock()
+        self._recargar()
+
+    @classmethod
+    def desde_filas(cls, filas: Dict[str, str], iteraciones: int = _ITERACIONES) -> "Credenciales":
+        """Índice en memoria {boleta: contraseña}, sin CSV (simulador, pruebas)."""
+        c = cls(Path(os.devnull), iteraciones, check_s=float("inf"))
+        c._hashes = {b: hash_contrasena(p, iteraciones) for b, p in filas.items()}
+        return c
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _recargar(self) -> None:
+        firma = self._stat()
+        hashes: Dict[str, str] = {}
+        planas = 0
+        for row in _leer_csv(self.path):
+            boleta = row.get("boleta", "")
+            if not boleta:
+                continue
+            if row.get("contrasena_hash"):
+                hashes[boleta] = row["contrasena_hash"]
+            elif row.get("contrasena"):
+                hashes[boleta] = hash_contrasena(row["contrasena"], self.iteraciones)
+                planas += 1
+        if planas:
+            print(f"[credenciales] {planas} contraseñas en texto plano en {self.path.name}; "
+                  f"migra con: python -m utils.functions.credenciales --migrar")
+        self._hashes = hashes
+        self._firma = firma
+
+    def _revisar(self) -> None:
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            if self._stat() != self._firma:
+                self._recargar()
+            self._proxima_revision = ahora + self.check_s
+
+    # ---- Verificación ----
+    def verificar(self, boleta: str, contrasena: str) -> bool:
+        self._revisar()
+        guardado = self._hashes.get(str(boleta).strip())
+        ok = _en_pool(_coincide, contrasena, guardado or self._relleno)
+        return ok and guardado is not None
+
+    # ---- Intentos fallidos ----
+    def espera(self, boleta: str) -> float:
+        fallos = self._fallos.get(str(boleta).strip())
+        return max(0.0, fallos[1] - time.monotonic()) if fallos else 0.0
+
+    def reservar_intento(self, boleta: str) -> float:
+        """Si la boleta no está en espera, cuenta ya este intento como fallo
+        (con su espera) y devuelve 0; si está en espera, devuelve los segundos
+        que faltan sin contar nada. La revisión y el conteo van juntos bajo el
+        lock: los intentos simultáneos se ven entre sí."""
+        boleta = str(boleta).strip()
+        ahora = time.monotonic()
+        with self._fallos_lock:
+            n, hasta = self._fallos.get(boleta, (0, 0.0))
+            if hasta > ahora:
+                return hasta - ahora
+            if len(self._fallos) >= _MAX_BOLETAS_VIGILADAS:
+                # Se olvidan las que ya no tienen espera pendiente
+                self._fallos = {b: f for b, f in self._fallos.items() if f[1] > ahora}
+            self._fallos[boleta] = (n + 1, ahora + espera_por_fallos(n + 1))
+        return 0.0
+
+    def fallo(self, boleta: str) -> float:
+        """Confirma como fallo el intento reservado: devuelve la espera que queda."""
+        return self.espera(boleta)
+
+    def devolver_intento(self, boleta: str) -> None:
+        """El intento reservado no llegó a verificarse (KDF ocupado): no cuenta."""
+        boleta = str(boleta).strip()
+        with self._fallos_lock:
+            n = self._fallos.get(boleta, (0, 0.0))[0] - 1
+            if n > 0:
+                # La espera anterior ya había pasado (por eso se pudo reservar)
+                self._fallos[boleta] = (n, 0.0)
+            else:
+                self._fallos.pop(boleta, None)
+
+    def exito(self, boleta: str) -> None:
+        with self._fallos_lock:
+            self._fallos.pop(str(boleta).strip(), None)
+
+
+# ------------------ Singleton ------------------
+_CREDENCIALES: Optional[Credenciales] = None
+_CREDENCIALES_LOCK = threading.Lock()
+
+def get_credenciales() -> Credenciales:
+    global _CREDENCIALES
+    if _CREDENCIALES is None:
+        with _CREDENCIALES_LOCK:
+            if _CREDENCIALES is None:
+                _CREDENCIALES = Credenciales()
+    return _CREDENCIALES
+
+
+# ------------------ Migración ------------------
+
+def migrar(path: Path = _ALUMNOS_CSV, iteraciones: int = _ITERACIONES) -> int:
+    """Reescribe el CSV cambiando contrasena por contrasena_hash. Devuelve
+    cuántas filas hasheó (las que ya tenían hash se dejan igual)."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        columnas = [c for c in (reader.fieldnames or []) if c.strip().lower() != "contrasena"]
+        filas = list(reader)
+    if "contrasena_hash" not in (c.strip().lower() for c in columnas):
+        columnas.append("contrasena_hash")
+    col_hash = next(c for c in columnas if c.strip().lower() == "contrasena_hash")
+
+    hasheadas = 0
+    for row in filas:
+        plana = next((v for k, v in row.items() if k and k.strip().lower() == "contrasena"), "")
+        if not (row.get(col_hash) or "").strip() and (plana or "").strip():
+            row[col_hash] = hash_contrasena(plana.strip(), iteraciones)
+            hasheadas += 1
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=columnas, extrasaction="ignore", lineterminator="\n")
+        w.writeheader()
+        w.writerows(filas)
+    os.replace(tmp, path)
+    return hasheadas
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Contraseñas de alumnos.csv")
+    p.add_argument("--migrar", action="store_true", help="reemplaza contrasena por contrasena_hash")
+    p.add_argument("--hash", metavar="CONTRASENA", help="imprime el hash de una contraseña")
+    p.add_argument("--csv", default=str(_ALUMNOS_CSV))
+    args = p.parse_args(argv)
+    if args.hash:
+        print(hash_contrasena(args.hash))
+    elif args.migrar:
+        print(f"{migrar(Path(args.csv))} contraseñas hasheadas en {args.csv}")
+    else:
+        p.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
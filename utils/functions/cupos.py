@@ -0,0 +1,382 @@
+# utils/functions/cupos.py
+"""
+Cupo en memoria por (grupo_id, materia_id), sin sobrecupo.
+
+- Se inicializa con capacidad/inscritos de grupos.csv y después se
+  reproducen las inscripciones del log (resources/logs/inscripciones.ndjson,
+  todos sus segmentos): el log es lo que persiste, el ledger es su estado.
+- Varios procesos (o workers) comparten el cupo a través del log: toda
+  reservación o baja corre dentro de exclusivo(), que toma el lock de
+  escritura del log entre procesos (utils.functions.eventlog) y, antes de
+  revisar cupo, aplica lo que otros procesos escribieron desde la última
+  lectura (la cola del log, desde la posición donde se quedó). La entrada
+  se escribe ahí mismo, en disco, y solo entonces se confirma: o se apartan
+  todas las materias del grupo o ninguna, y nunca hay sobrecupo aunque
+  inscriban varios procesos a la vez. Entre hilos del mismo proceso, un
+  RLock (reentrante: una baja promueve de la lista de espera sin soltarlo).
+- Por boleta se recuerda qué grupo tiene en cada materia: repetir la misma
+  reservación no ocupa otro lugar, y no se puede tener una materia en dos
+  grupos a la vez.
+- liberar_grupo() (baja, registrada en el log como resultado "baja") devuelve los
+  lugares y avisa a quien se haya suscrito con al_liberar(fn): así la lista
+  de espera (utils.functions.espera) promueve sin que nadie consulte.
+- al_leer(aplicar, reiniciar) suscribe a otro estado derivado del mismo log
+  (la lista de espera): recibe el log completo, luego cada entrada nueva,
+  de este proceso o de otros.
+- Las consultas (disponibles, snapshot...) no toman el lock; al_dia() se
+  pone al día antes, y solo toma el lock si el log cambió.
+Resultados de reservar():
+    "inscrito", "ya_inscrito", "sin_cupo", "materia_duplicada", "no_existe"
+Resultados de liberar():
+    "baja", "no_inscrito"
+API:
+    - get_ledger() -> SeatLedger
+    - usar_log(log_path) -> SeatLedger   (simulaciones: el ledger del proceso sobre otro log)
+    - SeatLedger.reservar_grupo(boleta, grupo_id, registrar=None) -> (resultado, detalle)
+    - SeatLedger.reservar(boleta, [(grupo_id, materia_id), ...], registrar=None) -> (resultado, detalle)
+    - SeatLedger.liberar_grupo(boleta, grupo_id, registrar=None) -> (resultado, detalle)
+        registrar(detalle) -> entrada del log (se escribe antes de confirmar)
+    - with SeatLedger.exclusivo() as escribir: ... escribir(entry)
+    - SeatLedger.al_liberar(fn)  fn(grupo_id) tras cada baja
+    - SeatLedger.al_leer(aplicar, reiniciar)
+    - SeatLedger.al_dia()
+    - SeatLedger.disponibles(grupo_id, materia_id) -> int
+    - SeatLedger.snapshot() -> {"GRUPO/MATERIA": {capacidad, inscritos}}
+"""
+
+from __future__ import annotations
+import os
+import csv
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.functions import segmentos
+from utils.functions.eventlog import get_writer
+
+_GRUPOS_CSV = Path(__file__).resolve().parents[2] / "resources" / "data" / "grupos.csv"
+_INSCRIPCIONES_LOG = Path(__file__).resolve().parents[2] / "resources" / "logs" / "inscripciones.ndjson"
+
+Clave = Tuple[str, str]  # (grupo_id, materia_id)
+Registrar = Callable[[dict], dict]
+
+
+def _int(v, default=0):
+    try:
+        return int(str(v).strip())
+    except Exception:
+        return default
+
+
+class _Lugar:
+    __slots__ = ("capacidad", "inscritos")
+
+    def __init__(self, capacidad: int, inscritos: int) -> None:
+        self.capacidad = capacidad
+        self.inscritos = inscritos
+
+
+class SeatLedger:
+    def __init__(self, grupos_csv: Path = _GRUPOS_CSV, log_path: Optional[Path] = _INSCRIPCIONES_LOG) -> None:
+        self.grupos_csv = Path(grupos_csv)
+        self.log_path = Path(log_path) if log_path else None
+        self._lock = threading.RLock()
+        self._escribir: Optional[Callable[[dict], None]] = None  # solo dentro de exclusivo()
+        self._pos: Optional[Tuple[int, int]] = None  # (número del segmento activo, offset) ya aplicado
+        self._boletas_lock = threading.Lock()
+        self._al_liberar: List[Callable[[str], None]] = []
+        self._lectores: List[Tuple[Callable[[dict], None], Callable[[], None]]] = []
+        self._cargar_csv()
+        self.al_dia()
+
+    # ---- Carga ----
+    def _cargar_csv(self) -> None:
+        lugares: Dict[Clave, _Lugar] = {}
+        por_grupo: Dict[str, List[Clave]] = {}
+        periodo: Dict[str, str] = {}
+        try:
+            with open(self.grupos_csv, "r", encoding="utf-8-sig", newline="") as f:
+                for raw in csv.DictReader(f):
+                    row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                    gid, mid = row.get("grupo_id", "").upper(), row.get("materia_id", "").upper()
+                    if not gid or not mid:
+                        continue
+                    lugares[(gid, mid)] = _Lugar(_int(row.get("capacidad")), _int(row.get("inscritos")))
+                    por_grupo.setdefault(gid, []).append((gid, mid))
+                    periodo.setdefault(gid, row.get("periodo_id", ""))
+        except FileNotFoundError:
+            pass
+        self._lugares, self._por_grupo, self._periodo = lugares, por_grupo, periodo
+        with self._boletas_lock:
+            self._por_boleta: Dict[str, Dict[str, str]] = {}  # boleta -> {materia_id: grupo_id}
+
+    # ---- Lectura del log ----
+    def _tam_activo(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _inicio(self, seq_activo: int) -> Optional[Tuple[str, int]]:
+        """Dónde sigue la lectura; None si no hay posición o ya no se puede ubicar."""
+        if self._pos is None:
+            return None
+        seq, off = self._pos
+        if seq == seq_activo:
+            return self.log_path.name, off
+        # Se rotó desde la última lectura: se sigue en el segmento que era el activo
+        for seg in segmentos.closed_segments(self.log_path):
+            if segmentos.segment_seq(self.log_path, seg.name) == seq:
+                return seg.name, off
+        return None
+
+    def _entradas(self, inicio: Optional[Tuple[str, int]] = None) -> Iterator[dict]:
+        for _, _, line in segmentos.iter_lines(self.log_path, inicio):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                yield entry
+
+    def _al_dia(self) -> None:
+        """Aplica lo escrito desde la última lectura (se llama con el lock del log)."""
+        seq_activo = segmentos.next_seq(self.log_path)
+        inicio = self._inicio(seq_activo)
+        if inicio is None and self._pos is not None:
+            # El segmento donde íbamos se compactó: se reconstruye desde cero
+            self._cargar_csv()
+            for _, reiniciar in self._lectores:
+                reiniciar()
+        for entry in self._entradas(inicio):
+            self._aplicar(entry)
+            for aplicar, _ in self._lectores:
+                aplicar(entry)
+        self._pos = (seq_activo, self._tam_activo())
+
+    def _aplicar(self, entry: dict) -> None:
+        """Una entrada del log, con las mismas reglas que en vivo."""
+        if entry.get("resultado") not in ("inscrito", "baja"):
+            return
+        boleta = str(entry.get("boleta", "")).strip()
+        gid = str(entry.get("grupo_id", "")).strip().upper()
+        mids = [str(m.get("materia_id", "")).upper() for m in entry.get("materias") or [] if isinstance(m, dict)]
+        claves = [(gid, mid) for mid in mids if mid] or self._por_grupo.get(gid, [])
+        if not boleta or not claves:
+            return
+        if entry["resultado"] == "baja":
+            # Sin avisar: las promociones que siguieron ya están en el log
+            self._liberar(boleta, claves)
+        else:
+            # Lo registrado ya se le confirmó al alumno: se acepta aunque no haya cupo
+            self._reservar(boleta, claves, forzar=True)
+
+    @contextmanager
+    def exclusivo(self) -> Iterator[Callable[[dict], None]]:
+        """Lock del log entre procesos (y entre hilos), con el ledger al día.
+        escribir(entry) deja la entrada en disco (OSError si no se pudo) y se
+        la pasa a los suscritos con al_leer(). Anidado en el mismo hilo
+        reutiliza el lock que ya se tiene."""
+        with self._lock:
+            if self._escribir is not None:
+                yield self._escribir
+                return
+            if self.log_path is None:
+                self._escribir = self._avisar
+                try:
+                    yield self._escribir
+                finally:
+                    self._escribir = None
+                return
+            with get_writer(self.log_path).exclusivo() as escribir:
+                self._al_dia()
+
+                def escribir_propio(entry: dict) -> None:
+                    escribir(entry)
+                    # Nadie más escribe mientras tenemos el lock: lo propio no se vuelve a leer
+                    self._pos = (segmentos.next_seq(self.log_path), self._tam_activo())
+                    self._avisar(entry)
+
+                self._escribir = escribir_propio
+                try:
+                    yield escribir_propio
+                finally:
+                    self._escribir = None
+
+    def _avisar(self, entry: dict) -> None:
+        for aplicar, _ in self._lectores:
+            aplicar(entry)
+
+    def al_dia(self) -> None:
+        """Aplica lo que otros procesos registraron; si el log no cambió, no toma el lock."""
+        if self.log_path is None:
+            return
+        pos = self._pos
+        if pos is not None and self._tam_activo() == pos[1]:
+            return
+        with self.exclusivo():
+            pass
+
+    def al_leer(self, aplicar: Callable[[dict], None], reiniciar: Callable[[], None]) -> None:
+        """aplicar(entry) recibe ya todo el log y, desde ahí, cada entrada
+        nueva; reiniciar() avisa que el log se va a volver a entregar completo."""
+        with self.exclusivo():
+            if self.log_path is not None:
+                for entry in self._entradas():
+                    aplicar(entry)
+            self._lectores.append((aplicar, reiniciar))
+
+    # ---- Consultas ----
+    def disponibles(self, grupo_id: str, materia_id: str) -> int:
+        lugar = self._lugares.get((grupo_id.upper(), materia_id.upper()))
+        return lugar.capacidad - lugar.inscritos if lugar else 0
+
+    def inscritos(self, grupo_id: str, materia_id: str) -> int:
+        lugar = self._lugares.get((grupo_id.upper(), materia_id.upper()))
+        return lugar.inscritos if lugar else 0
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        self.al_dia()
+        return {f"{g}/{m}": {"capacidad": l.capacidad, "inscritos": l.inscritos}
+                for (g, m), l in sorted(self._lugares.items())}
+
+    def materias_de(self, boleta: str) -> Dict[str, str]:
+        with self._boletas_lock:
+            return dict(self._por_boleta.get(str(boleta).strip(), {}))
+
+    def materias_del_grupo(self, grupo_id: str) -> List[str]:
+        return [mid for _, mid in self._por_grupo.get(grupo_id.strip().upper(), [])]
+
+    def periodo_de(self, grupo_id: str) -> str:
+        return self._periodo.get(grupo_id.strip().upper(), "")
+
+    # ---- Reservación ----
+    def reservar_grupo(self, boleta: str, grupo_id: str,
+                       registrar: Optional[Registrar] = None) -> Tuple[str, dict]:
+        return self.reservar(boleta, self._por_grupo.get(grupo_id.strip().upper(), []), registrar)
+
+    def reservar(self, boleta: str, claves: Iterable[Clave],
+                 registrar: Optional[Registrar] = None) -> Tuple[str, dict]:
+        """Aparta un lugar en cada (grupo_id, materia_id), todos o ninguno.
+        Si queda "inscrito", registrar(detalle) da la entrada del log, que se
+        escribe antes de volver; si no se pudo escribir se deshace la
+        reservación y sube el OSError. Sin registrar no queda en el log (los
+        demás procesos no la ven)."""
+        with self.exclusivo() as escribir:
+            resultado, detalle, nuevas = self._reservar(boleta, claves)
+            if resultado == "inscrito" and registrar is not None:
+                try:
+                    escribir(registrar(detalle))
+                except BaseException:
+                    self._quitar(boleta, nuevas)
+                    raise
+            return resultado, detalle
+
+    def _reservar(self, boleta: str, claves: Iterable[Clave],
+                  forzar: bool = False) -> Tuple[str, dict, List[Clave]]:
+        """(resultado, detalle, claves que se ocuparon). forzar=True (solo
+        al leer el log) acepta aunque ya no haya cupo. Se llama con el lock."""
+        boleta = str(boleta).strip()
+        claves = sorted({(g.upper(), m.upper()) for g, m in claves})
+        if not claves or any(c not in self._lugares for c in claves):
+            return "no_existe", {"claves": [c for c in claves if c not in self._lugares]}, []
+
+        with self._boletas_lock:
+            actuales = self._por_boleta.get(boleta, {})
+            if all(actuales.get(mid) == gid for gid, mid in claves):
+                return "ya_inscrito", {"disponibles": self._disp_de(claves)}, []
+            otros = {mid: actuales[mid] for gid, mid in claves if mid in actuales and actuales[mid] != gid}
+            if otros:
+                return "materia_duplicada", {"materias": otros}, []
+
+        llenos = [c for c in claves if self._lugares[c].inscritos >= self._lugares[c].capacidad]
+        if llenos and not forzar:
+            return "sin_cupo", {"llenos": llenos, "disponibles": self._disp_de(claves)}, []
+
+        nuevas = []
+        with self._boletas_lock:
+            propias = self._por_boleta.setdefault(boleta, {})
+            for gid, mid in claves:
+                if propias.get(mid) != gid:
+                    self._lugares[(gid, mid)].inscritos += 1
+                    propias[mid] = gid
+                    nuevas.append((gid, mid))
+        return "inscrito", {"disponibles": self._disp_de(claves)}, nuevas
+
+    def _quitar(self, boleta: str, claves: List[Clave]) -> None:
+        """Deshace una reservación que no se pudo registrar."""
+        with self._boletas_lock:
+            propias = self._por_boleta.get(boleta, {})
+            for gid, mid in claves:
+                self._lugares[(gid, mid)].inscritos -= 1
+                propias.pop(mid, None)
+
+    # ---- Baja ----
+    def al_liberar(self, fn: Callable[[str], None]) -> None:
+        self._al_liberar.append(fn)
+
+    def liberar_grupo(self, boleta: str, grupo_id: str,
+                      registrar: Optional[Registrar] = None) -> Tuple[str, dict]:
+        """registrar(detalle) da la entrada de la baja, que se escribe antes de
+        avisar a los suscriptores: la baja queda en el log antes que las
+        promociones que provoca. Si no se pudo escribir, la baja no ocurre."""
+        gid = grupo_id.strip().upper()
+        boleta = str(boleta).strip()
+        with self.exclusivo() as escribir:
+            resultado, detalle = self._liberar(boleta, self._por_grupo.get(gid, []))
+            if resultado == "baja":
+                if registrar is not None:
+                    try:
+                        escribir(registrar(detalle))
+                    except BaseException:
+                        self._reservar(boleta, [(gid, mid) for mid in detalle["materias"]], forzar=True)
+                        raise
+                for fn in list(self._al_liberar):
+                    fn(gid)
+            return resultado, detalle
+
+    def _liberar(self, boleta: str, claves: Iterable[Clave]) -> Tuple[str, dict]:
+        """Devuelve los lugares que la boleta tiene en esas claves (las demás
+        se ignoran). Se llama con el lock."""
+        boleta = str(boleta).strip()
+        claves = sorted({(g.upper(), m.upper()) for g, m in claves if (g.upper(), m.upper()) in self._lugares})
+        with self._boletas_lock:
+            propias = self._por_boleta.get(boleta, {})
+            suyas = [c for c in claves if propias.get(c[1]) == c[0]]
+            if not suyas:
+                return "no_inscrito", {}
+            for gid, mid in suyas:
+                self._lugares[(gid, mid)].inscritos -= 1
+                del propias[mid]
+        return "baja", {"materias": [mid for _, mid in suyas], "disponibles": self._disp_de(claves)}
+
+    def _disp_de(self, claves: List[Clave]) -> Dict[str, int]:
+        return {mid: self._lugares[(gid, mid)].capacidad - self._lugares[(gid, mid)].inscritos for gid, mid in claves}
+
+
+# ------------------ Singleton ------------------
+_LEDGER: Optional[SeatLedger] = None
+_LEDGER_LOCK = threading.Lock()
+_LEDGER_PID: Optional[int] = None
+
+def get_ledger() -> SeatLedger:
+    global _LEDGER, _LEDGER_PID
+    # Tras un fork el RLock del padre pudo quedar tomado por otro hilo: el
+    # hijo arma el suyo (se pone al día desde el log)
+    if _LEDGER is None or _LEDGER_PID != os.getpid():
+        with _LEDGER_LOCK:
+            if _LEDGER is None or _LEDGER_PID != os.getpid():
+                _LEDGER = SeatLedger()
+                _LEDGER_PID = os.getpid()
+    return _LEDGER
+
+def usar_log(log_path: Path) -> SeatLedger:
+    """Reemplaza el ledger del proceso por uno sobre log_path (p. ej. el
+    simulador, para no tocar resources/logs). get_espera() lo sigue solo."""
+    global _LEDGER, _LEDGER_PID
+    with _LEDGER_LOCK:
+        _LEDGER = SeatLedger(log_path=log_path)
+        _LEDGER_PID = os.getpid()
+    return _LEDGER
@@ -0,0 +1,152 @@
+# utils/functions/espera.py
+"""
+Lista de espera FIFO por grupo, con promoción automática.
+
+- Quien no alcanza lugar en un grupo se forma en su cola (una vez por
+  grupo); puede consultar su posición sin volver a intentar la inscripción.
+- La lista se suscribe al ledger de cupo (utils.functions.cupos): cada baja
+  dispara promover(grupo_id), que inscribe a los primeros de la cola
+  mientras haya lugar. Quien ya no puede tomar el grupo (por ejemplo, ya lo
+  inscribió en otro) sale de la cola y se sigue con el siguiente.
+- Persistencia en el log de inscripciones: "en_espera" al formarse,
+  "sale_espera" al salir, y la promoción es un "inscrito" normal con
+  origen "lista_espera" (así el ledger la reproduce como cualquier otra).
+  Las colas son solo eso, lo que dice el log: se arman al arrancar con
+  SeatLedger.al_leer() y después cada cambio se escribe primero (con el
+  lock del log, ver cupos.SeatLedger.exclusivo) y se aplica al leerlo de
+  vuelta. Así varios procesos ven las mismas colas, y nadie se forma dos
+  veces ni se promueve dos veces. Al arrancar se promueve lo que haya
+  quedado pendiente.
+API:
+    - get_espera() -> ListaEspera
+    - ListaEspera.formar(boleta, grupo_id) -> posición (1 = el siguiente)
+    - ListaEspera.posicion(boleta, grupo_id) -> int | None
+    - ListaEspera.posiciones(boleta) -> {grupo_id: posición}
+    - ListaEspera.salir(boleta, grupo_id) -> bool
+    - ListaEspera.promover(grupo_id) -> [boletas promovidas]
+"""
+
+from __future__ import annotations
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from utils.functions.cupos import SeatLedger, get_ledger
+from utils.functions.folios import nuevo_folio
+
+
+class ListaEspera:
+    def __init__(self, ledger: SeatLedger) -> None:
+        self.ledger = ledger
+        self._colas: Dict[str, Deque[str]] = {}
+        ledger.al_leer(self._aplicar, self._colas.clear)
+        ledger.al_liberar(self.promover)
+        for gid in [g for g, cola in list(self._colas.items()) if cola]:
+            self.promover(gid)
+
+    def _aplicar(self, entry: dict) -> None:
+        """Una entrada del log (de este proceso o de otro), con el lock del ledger."""
+        resultado = entry.get("resultado")
+        if resultado not in ("en_espera", "sale_espera", "inscrito"):
+            return
+        boleta = str(entry.get("boleta", "")).strip()
+        gid = str(entry.get("grupo_id", "")).strip().upper()
+        if not boleta or not gid:
+            return
+        cola = self._colas.setdefault(gid, deque())
+        if resultado == "en_espera":
+            if boleta not in cola:
+                cola.append(boleta)
+        elif boleta in cola:
+            cola.remove(boleta)
+
+    def _entrada(self, boleta: str, gid: str, resultado: str, **extra) -> dict:
+        entry = {
+            "folio": nuevo_folio("INS"),
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "periodo": self.ledger.periodo_de(gid),
+            "boleta": boleta,
+            "grupo_id": gid,
+            "resultado": resultado,
+        }
+        entry.update(extra)
+        return entry
+
+    def _cola(self, gid: str) -> List[str]:
+        # Copia: otro hilo puede estar aplicando entradas
+        return list(self._colas.get(gid) or ())
+
+    # ---- API ----
+    def formar(self, boleta: str, grupo_id: str) -> int:
+        boleta, gid = str(boleta).strip(), grupo_id.strip().upper()
+        with self.ledger.exclusivo() as escribir:
+            cola = self._cola(gid)
+            if boleta not in cola:
+                escribir(self._entrada(boleta, gid, "en_espera", posicion=len(cola) + 1))
+            pos = self._cola(gid).index(boleta) + 1
+            # Por si se liberó un lugar entre el intento y formarse
+            if boleta in self.promover(gid):
+                return 0
+        return pos
+
+    def posicion(self, boleta: str, grupo_id: str) -> Optional[int]:
+        self.ledger.al_dia()
+        cola = self._cola(grupo_id.strip().upper())
+        boleta = str(boleta).strip()
+        return cola.index(boleta) + 1 if boleta in cola else None
+
+    def posiciones(self, boleta: str) -> Dict[str, int]:
+        self.ledger.al_dia()
+        boleta = str(boleta).strip()
+        out = {}
+        for gid in sorted(list(self._colas)):
+            cola = self._cola(gid)
+            if boleta in cola:
+                out[gid] = cola.index(boleta) + 1
+        return out
+
+    def salir(self, boleta: str, grupo_id: str) -> bool:
+        boleta, gid = str(boleta).strip(), grupo_id.strip().upper()
+        with self.ledger.exclusivo() as escribir:
+            if boleta not in self._cola(gid):
+                return False
+            escribir(self._entrada(boleta, gid, "sale_espera", motivo="cancelada"))
+        return True
+
+    def promover(self, grupo_id: str) -> List[str]:
+        gid = grupo_id.strip().upper()
+        promovidos = []
+        with self.ledger.exclusivo() as escribir:
+            while self._cola(gid):
+                boleta = self._cola(gid)[0]
+
+                def registrar(detalle, boleta=boleta):
+                    return self._entrada(boleta, gid, "inscrito", origen="lista_espera", materias=[
+                        {"materia_id": mid, "disponibles": max(disp, 0)}
+                        for mid, disp in detalle.get("disponibles", {}).items()])
+
+                # Al escribirse, el "inscrito" (o el "sale_espera") la saca de la cola
+                resultado, _ = self.ledger.reservar_grupo(boleta, gid, registrar=registrar)
+                if resultado == "sin_cupo":
+                    break
+                if resultado == "inscrito":
+                    promovidos.append(boleta)
+                else:
+                    escribir(self._entrada(boleta, gid, "sale_espera", motivo=resultado))
+        return promovidos
+
+
+# ------------------ Singleton ------------------
+_ESPERA: Optional[ListaEspera] = None
+_ESPERA_LOCK = threading.Lock()
+
+def get_espera() -> ListaEspera:
+    global _ESPERA
+    ledger = get_ledger()
+    # Tras un fork el ledger se reconstruye: la lista debe seguir al nuevo
+    if _ESPERA is None or _ESPERA.ledger is not ledger:
+        with _ESPERA_LOCK:
+            if _ESPERA is None or _ESPERA.ledger is not ledger:
+                _ESPERA = ListaEspera(ledger)
+    return _ESPERA
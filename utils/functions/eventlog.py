@@ -0,0 +1,333 @@
+# utils/functions/eventlog.py
+"""
+Escritor NDJSON con buffer en memoria y un hilo de fondo por archivo.
+
+- append(entry) solo encola: el request ya no espera al disco.
+- El hilo junta lo encolado en lotes (hasta _MAX_BATCH líneas o
+  _FLUSH_INTERVAL_S segundos) y los escribe con un solo write().
+- Política de fsync (SAES_LOG_FSYNC):
+    * "none":     nunca se llama fsync (el SO decide).
+    * "batch":    fsync después de cada lote (por defecto).
+    * "interval": fsync como mucho cada SAES_LOG_FSYNC_INTERVAL_S segundos.
+- Antes de cada lote se revisa si toca rotar el segmento activo (tamaño o
+  antigüedad, ver utils.functions.segmentos); la rotación corre en este
+  mismo hilo, nunca en el del request. La compactación que pueda seguir a
+  una rotación corre en otro hilo y sin el lock de escritura (solo lo toma
+  para publicar el resultado), y un solo proceso a la vez la hace
+  (<log>.compact.lock): los lotes siguen escribiéndose mientras tanto.
+- Varios procesos pueden escribir el mismo log: cada lote (y cada
+  rotación) se hace con un lock advisory (flock) sobre <log>.lock, y el lote
+  se escribe completo con O_APPEND. Nunca se intercalan líneas a medias.
+  El lock file guarda además cuándo empezó el segmento activo, para que la
+  rotación por tiempo sea la misma en todos los procesos.
+- Si un write() falla a medio lote, el archivo se trunca al tamaño que
+  tenía antes del lote y se reintenta completo: nunca quedan líneas
+  duplicadas ni partidas.
+- Al salir del proceso (atexit, o SIGTERM desde el hilo principal) se
+  vacían todas las colas; el SIGTERM sigue luego al manejador que hubiera.
+- exclusivo() es para un check-then-append entre procesos: mientras dura
+  nadie escribe el log, y la entrada se escribe ahí mismo (sin cola) y con
+  fsync también con "interval" (con "none", no): es lo que se le confirma
+  al usuario (una inscripción, una carta) y no puede perderse si el
+  proceso o la máquina caen.
+API:
+    - get_writer(path) -> EventLogWriter (uno por archivo)
+    - EventLogWriter.append(entry) / flush(timeout) -> bool
+    - with EventLogWriter.exclusivo() as escribir: ... escribir(entry)
+    - flush_all() / close_all() / stats_all()
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import queue
+import atexit
+import signal
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.functions import segmentos
+
+try:
+    import fcntl  # POSIX
+except ImportError:  # Windows: un solo proceso escritor por log
+    fcntl = None
+
+_FLUSH_INTERVAL_S = float(os.environ.get("SAES_LOG_FLUSH_INTERVAL_S", 0.2))
+_MAX_BATCH = int(os.environ.get("SAES_LOG_MAX_BATCH", 512))
+_QUEUE_MAX = int(os.environ.get("SAES_LOG_QUEUE_MAX", 100_000))
+_FSYNC = os.environ.get("SAES_LOG_FSYNC", "batch").strip().lower()
+_FSYNC_INTERVAL_S = float(os.environ.get("SAES_LOG_FSYNC_INTERVAL_S", 1.0))
+
+_STOP = object()
+
+
+class EventLogWriter:
+    def __init__(self, path: Path, fsync: str = _FSYNC,
+                 flush_interval_s: float = _FLUSH_INTERVAL_S, max_batch: int = _MAX_BATCH) -> None:
+        self.path = Path(path)
+        self.fsync = fsync
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self._q: "queue.Queue" = queue.Queue(maxsize=_QUEUE_MAX)
+        self._cond = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._last_fsync = 0.0
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock_fd: Optional[int] = None
+        self._compactar = False
+        self._compactando: Optional[threading.Thread] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"eventlog-{self.path.name}", daemon=True)
+        self._thread.start()
+
+    # ---- API ----
+    def append(self, entry: dict) -> None:
+        """Encola una entrada. Si la cola está llena, espera (backpressure)."""
+        if self._closed:
+            raise RuntimeError(f"EventLogWriter cerrado: {self.path}")
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._cond:
+            self._enqueued += 1
+        self._q.put(line)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todo lo encolado hasta ahora esté escrito."""
+        with self._cond:
+            target = self._enqueued
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    @contextmanager
+    def exclusivo(self) -> Iterator[Callable[[dict], None]]:
+        """Toma el lock de escritura entre procesos y entrega escribir(entry),
+        que deja la línea en disco antes de volver (OSError si no se pudo).
+        Lo que se lea del log dentro no cambia hasta salir."""
+        with self._lock_aparte() as fd:
+            yield lambda entry: self._escribir_ya(entry, fd)
+        if self._compactar:
+            self._compactar = False
+            self._lanzar_compactacion()
+
+    def stats(self) -> dict:
+        return {"enqueued": self._enqueued, "written": self._written, "pending": self._enqueued - self._written}
+
+    # ---- Hilo de fondo ----
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        pending: List[str] = []
+        stop = False
+        while not stop:
+            if not pending:
+                try:
+                    item = self._q.get(timeout=self.flush_interval_s)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    stop = True
+                else:
+                    pending.append(item)
+            while not stop and len(pending) < self.max_batch:
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    pending.append(item)
+            if not pending:
+                continue
+            try:
+                self._write_batch(pending)
+            except OSError as e:
+                print(f"Error escribiendo {self.path}: {e}")
+                time.sleep(self.flush_interval_s)
+                continue  # se reintenta el mismo lote
+            with self._cond:
+                self._written += len(pending)
+                self._cond.notify_all()
+            pending = []
+            if self._compactar:
+                self._compactar = False
+                self._lanzar_compactacion()
+
+    # ---- Lock entre procesos ----
+    def _lock(self) -> None:
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _unlock(self) -> None:
+        if fcntl is not None and self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _segment_opened(self, fd: int) -> float:
+        """Inicio del segmento activo, compartido vía el lock file (se llama con el lock)."""
+        try:
+            raw = os.pread(fd, 32, 0).decode("ascii").strip()
+            if raw:
+                return float(raw)
+        except (OSError, ValueError, TypeError):
+            pass
+        now = time.time()
+        self._set_segment_opened(fd, now)
+        return now
+
+    def _set_segment_opened(self, fd: int, ts: float) -> None:
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, f"{ts:.3f}".encode("ascii"))
+
+    def _maybe_rotate(self, fd: int) -> None:
+        if not segmentos.should_rotate(self.path, self._segment_opened(fd)):
+            return
+        try:
+            segmentos.rotate(self.path)
+            self._set_segment_opened(fd, time.time())
+            # Se compacta después de soltar el lock, fuera de este hilo
+            self._compactar = segmentos.needs_compaction(self.path)
+        except OSError as e:
+            # Un fallo al rotar no debe frenar la escritura: se reintenta en el próximo lote
+            print(f"Error rotando {self.path}: {e}")
+
+    # ---- Compactación ----
+    @contextmanager
+    def _lock_aparte(self) -> Iterator[int]:
+        """El lock de escritura con un fd propio: flock no excluye entre
+        hilos que comparten el mismo fd."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _lanzar_compactacion(self) -> None:
+        if self._compactando is not None and self._compactando.is_alive():
+            return
+        self._compactando = threading.Thread(target=self._compactar_segmentos,
+                                             name=f"eventlog-compact-{self.path.name}", daemon=True)
+        self._compactando.start()
+
+    def _compactar_segmentos(self) -> None:
+        fd = os.open(self.path.with_name(self.path.name + ".compact.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return  # otro proceso ya está compactando
+            if segmentos.needs_compaction(self.path):
+                segmentos.compact(self.path, swap_lock=self._lock_aparte)
+        except OSError as e:
+            print(f"Error compactando {self.path}: {e}")
+        finally:
+            os.close(fd)
+
+    def _write_batch(self, lines: List[str]) -> None:
+        self._lock()
+        try:
+            self._maybe_rotate(self._lock_fd)
+            self._append_bytes("".join(lines).encode("utf-8"))
+        finally:
+            self._unlock()
+
+    def _escribir_ya(self, entry: dict, lock_fd: int) -> None:
+        """Escritura directa, con el lock ya tomado (ver exclusivo())."""
+        self._maybe_rotate(lock_fd)
+        self._append_bytes((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"),
+                           durable=self.fsync != "none")
+        with self._cond:
+            self._enqueued += 1
+            self._written += 1
+
+    def _append_bytes(self, data: bytes, durable: bool = False) -> None:
+        """Agrega data al segmento activo, completo o nada (se llama con el lock).
+        durable=True hace fsync aunque la política no lo pida."""
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Con el lock nadie más escribe: si el lote falla a medias se
+            # deshace lo escrito para que el reintento no duplique líneas
+            inicio = os.fstat(fd).st_size
+            try:
+                view = memoryview(data)
+                while view:
+                    n = os.write(fd, view)
+                    view = view[n:]
+            except OSError:
+                os.ftruncate(fd, inicio)
+                raise
+            if durable or self._should_fsync():
+                os.fsync(fd)
+                self._last_fsync = time.monotonic()
+        finally:
+            os.close(fd)
+
+    def _should_fsync(self) -> bool:
+        if self.fsync == "batch":
+            return True
+        if self.fsync == "interval":
+            return time.monotonic() - self._last_fsync >= _FSYNC_INTERVAL_S
+        return False
+
+
+# ------------------ Registro ------------------
+_WRITERS: Dict[Path, EventLogWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+def get_writer(path: Path) -> EventLogWriter:
+    key = Path(path).resolve()
+    w = _WRITERS.get(key)
+    if w is None:
+        with _WRITERS_LOCK:
+            w = _WRITERS.get(key)
+            if w is None:
+                w = _WRITERS[key] = EventLogWriter(key)
+    return w
+
+def flush_all(timeout: Optional[float] = None) -> None:
+    for w in list(_WRITERS.values()):
+        w.flush(timeout)
+
+def stats_all() -> Dict[str, dict]:
+    return {w.path.name: w.stats() for w in list(_WRITERS.values())}
+
+def close_all() -> None:
+    for w in list(_WRITERS.values()):
+        w.close()
+
+atexit.register(close_all)
+
+
+def _al_sigterm(signum, frame) -> None:
+    close_all()
+    previo = _SIGTERM_PREVIO
+    if callable(previo):
+        previo(signum, frame)
+    else:
+        # SIG_DFL: terminar igual que sin este manejador
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+_SIGTERM_PREVIO = None
+try:
+    _SIGTERM_PREVIO = signal.getsignal(signal.SIGTERM)
+    if _SIGTERM_PREVIO is not signal.SIG_IGN:
+        signal.signal(signal.SIGTERM, _al_sigterm)
+except (ValueError, AttributeError):
+    pass  # importado fuera del hilo principal: queda solo atexit
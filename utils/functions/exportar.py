@@ -0,0 +1,162 @@
+# utils/functions/exportar.py
+"""
+Exportación masiva de solicitudes para servicios escolares, en streaming.
+
+- dictamen: la versión vigente de cada folio (la última línea del folio en
+  dictamen.ndjson). inscripciones: cada intento registrado (inscrito,
+  sin_cupo, espera, baja...), tal como quedó en el log.
+- Filtros, todos por el índice del log (utils.functions.logstore), nunca
+  recorriendo el archivo completo:
+    * periodo: periodo_actual en dictamen, periodo en inscripciones;
+    * estatus: uno o varios; estatus en dictamen, resultado en inscripciones.
+      En dictamen se aplica a la versión vigente: una solicitud que ya pasó
+      a en_revision no sale como pendiente;
+    * desde/hasta: fechas YYYY-MM-DD (o fecha y hora ISO) sobre ts, las dos
+      inclusivas.
+- Salida csv (columnas fijas por tipo, los campos anidados se aplanan) o
+  jsonl (la línea completa). Se genera renglón por renglón: memoria
+  constante sin importar cuántas solicitudes haya.
+Uso desde consola:
+    python -m utils.functions.exportar dictamen --periodo 2025-1 --estatus pendiente -o dictamen.csv
+API:
+    - exportar(tipo, formato="csv", periodo="", estatus=(), desde="", hasta="") -> Iterator[str]
+    - TIPOS, FORMATOS
+"""
+
+from __future__ import annotations
+import io
+import csv
+import json
+import argparse
+import sys
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from utils.functions.logstore import get_store
+
+_LOGS_DIR = Path(__file__).resolve().parents[2] / "resources" / "logs"
+
+
+@dataclass(frozen=True)
+class _Tipo:
+    log: Path
+    campo_periodo: str
+    campo_estatus: str
+    ultimo_por: Optional[str]  # None: se exportan todas las líneas
+    columnas: Tuple[str, ...]
+
+
+TIPOS = {
+    "dictamen": _Tipo(_LOGS_DIR / "dictamen.ndjson", "periodo_actual", "estatus", "folio",
+                      ("folio", "ts", "periodo_actual", "boleta", "materia", "semestre_cursado",
+                       "calificacion", "grupo_original", "profesor_original",
+                       "semestres_transcurridos", "estatus", "carta_motivos")),
+    "inscripciones": _Tipo(_LOGS_DIR / "inscripciones.ndjson", "periodo", "resultado", None,
+                           ("folio", "ts", "periodo", "boleta", "turno", "grupo_id",
+                            "resultado", "materias")),
+}
+FORMATOS = ("csv", "jsonl")
+_PEDAZO = 64 * 1024
+
+
+def _fin_exclusivo(hasta: str) -> str:
+    """Límite superior para comparar ts como texto: una fecha sola incluye
+    todo ese día."""
+    hasta = hasta.strip()
+    if not hasta:
+        return ""
+    try:
+        return (date.fromisoformat(hasta) + timedelta(days=1)).isoformat()
+    except ValueError:
+        return hasta + "\uffff"  # fecha y hora: incluye ese instante
+
+
+def _celda(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, dict):
+        # turno: {"code": "M", "label": "Matutino"}
+        return str(v.get("label") or v.get("code") or "")
+    if isinstance(v, list):
+        # materias: [{"materia_id": ...}, ...]
+        return ";".join(str(m.get("materia_id", "")) if isinstance(m, dict) else str(m) for m in v)
+    return str(v)
+
+
+def _en_pedazos(renglones: Iterable[str]) -> Iterator[str]:
+    """Junta renglones hasta ~_PEDAZO caracteres: menos escrituras al socket."""
+    buf, n = [], 0
+    for r in renglones:
+        buf.append(r)
+        n += len(r)
+        if n >= _PEDAZO:
+            yield "".join(buf)
+            buf, n = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def _csv(columnas: Tuple[str, ...], entradas: Iterable[dict]) -> Iterator[str]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(columnas)
+    yield buf.getvalue()
+    for entry in entradas:
+        buf.seek(0)
+        buf.truncate()
+        w.writerow([_celda(entry.get(c)) for c in columnas])
+        yield buf.getvalue()
+
+
+def _jsonl(entradas: Iterable[dict]) -> Iterator[str]:
+    for entry in entradas:
+        yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+
+def exportar(tipo: str, formato: str = "csv", periodo: str = "", estatus: Iterable[str] = (),
+             desde: str = "", hasta: str = "") -> Iterator[str]:
+    """Pedazos de texto del archivo exportado, en orden de escritura del log.
+    ValueError si el tipo o el formato no existen."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo desconocido: {tipo!r} (válidos: {', '.join(TIPOS)})")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r} (válidos: {', '.join(FORMATOS)})")
+    t = TIPOS[tipo]
+
+    iguales = {}
+    if periodo.strip():
+        iguales[t.campo_periodo] = periodo.strip()
+    estatus = [e.strip() for e in estatus if e and e.strip()]
+    if estatus:
+        iguales[t.campo_estatus] = estatus
+    rango = ("ts", desde.strip(), _fin_exclusivo(hasta)) if (desde.strip() or hasta.strip()) else None
+
+    entradas = get_store(t.log).select(iguales, rango, t.ultimo_por)
+    return _en_pedazos(_csv(t.columnas, entradas) if formato == "csv" else _jsonl(entradas))
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Exporta solicitudes de dictamen o inscripción.")
+    p.add_argument("tipo", choices=sorted(TIPOS))
+    p.add_argument("--formato", choices=FORMATOS, default="csv")
+    p.add_argument("--periodo", default="")
+    p.add_argument("--estatus", action="append", default=[],
+                   help="se puede repetir (pendiente, en_revision, inscrito, sin_cupo...)")
+    p.add_argument("--desde", default="", help="YYYY-MM-DD")
+    p.add_argument("--hasta", default="", help="YYYY-MM-DD, inclusive")
+    p.add_argument("-o", "--salida", default="-", help="archivo (por defecto, salida estándar)")
+    args = p.parse_args(argv)
+
+    partes = exportar(args.tipo, args.formato, args.periodo, args.estatus, args.desde, args.hasta)
+    if args.salida == "-":
+        sys.stdout.writelines(partes)
+    else:
+        with open(args.salida, "w", encoding="utf-8", newline="") as f:
+            f.writelines(partes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
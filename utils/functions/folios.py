@@ -0,0 +1,139 @@
+# utils/functions/folios.py
+"""
+Folios únicos y ordenables por tiempo, sin candado central.
+
+Formato:  <PREFIJO>-<YYYYMMDDHHMMSSmmm>-W<worker>-<seq>
+    INS-20250916144829123-W003-00000A7
+
+- worker: id de 3 dígitos reclamado al arrancar con un lock de archivo en
+  resources/folios/ (o SAES_WORKER_ID). Dos procesos vivos nunca comparten id.
+- seq:    contador del proceso (itertools.count, atómico bajo el GIL), en
+  base 36 con ancho fijo. No se reinicia por milisegundo: la unicidad dentro
+  del proceso no depende del reloj.
+- Reinicios: el archivo del worker guarda un "lease" de tiempo (marca alta).
+  Al arrancar, los timestamps empiezan después de esa marca, así que un
+  proceso reiniciado no puede repetir (timestamp, worker, seq) anteriores.
+  El lease se renueva como mucho una vez cada _LEASE_MS.
+API:
+    - nuevo_folio(prefijo) -> str
+"""
+
+from __future__ import annotations
+import os
+import time
+import itertools
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl  # POSIX
+except ImportError:  # Windows: sin reclamo automático, se usa SAES_WORKER_ID / pid
+    fcntl = None
+
+_FOLIOS_DIR = Path(__file__).resolve().parents[2] / "resources" / "folios"
+_MAX_WORKERS = 1000
+_LEASE_MS = 5000
+_SEQ_WIDTH = 7
+_B36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _base36(n: int, width: int) -> str:
+    out = []
+    while n:
+        n, r = divmod(n, 36)
+        out.append(_B36[r])
+    return "".join(reversed(out)).rjust(width, "0")
+
+
+class FolioAllocator:
+    def __init__(self, folios_dir: Path = _FOLIOS_DIR, worker_id: Optional[int] = None) -> None:
+        self.dir = Path(folios_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._fd = None
+        self.worker_id = self._claim_worker(worker_id)
+        self._seq = itertools.count()
+        self._lease_lock = threading.Lock()
+        # Marca baja: nada emitido por una vida anterior de este worker queda por encima
+        self._floor_ms = self._read_lease() + 1
+        self._lease_until = 0
+        self._renew_lease(max(self._now_ms(), self._floor_ms))
+
+    # ---- Worker id ----
+    def _claim_worker(self, worker_id: Optional[int]) -> int:
+        env = os.environ.get("SAES_WORKER_ID")
+        if worker_id is None and env:
+            worker_id = int(env)
+        candidatos = [worker_id] if worker_id is not None else range(_MAX_WORKERS)
+        if fcntl is None:
+            wid = worker_id if worker_id is not None else os.getpid() % _MAX_WORKERS
+            self._fd = os.open(self._lease_path(wid), os.O_RDWR | os.O_CREAT, 0o644)
+            return wid
+        for wid in candidatos:
+            fd = os.open(self._lease_path(wid), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._fd = fd  # se mantiene abierto (y bloqueado) mientras viva el proceso
+            return wid
+        raise RuntimeError(f"No hay worker id libre para folios en {self.dir}")
+
+    def _lease_path(self, wid: int) -> Path:
+        return self.dir / f"worker-{wid:03d}.lease"
+
+    # ---- Lease ----
+    def _read_lease(self) -> int:
+        try:
+            raw = os.pread(self._fd, 32, 0).decode("ascii").strip()
+            return int(raw) if raw else 0
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def _renew_lease(self, ts_ms: int) -> None:
+        with self._lease_lock:
+            if ts_ms <= self._lease_until:
+                return
+            until = ts_ms + _LEASE_MS
+            data = str(until).rjust(20).encode("ascii")
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+            self._lease_until = until
+
+    @staticmethod
+    def _now_ms() -> int:
+        return time.time_ns() // 1_000_000
+
+    # ---- Hot path ----
+    def next(self, prefijo: str) -> str:
+        ts_ms = self._now_ms()
+        if ts_ms < self._floor_ms:  # reloj atrasado respecto a la vida anterior
+            ts_ms = self._floor_ms
+        if ts_ms > self._lease_until:
+            self._renew_lease(ts_ms)
+        seq = next(self._seq)
+        secs, ms = divmod(ts_ms, 1000)
+        stamp = datetime.fromtimestamp(secs).strftime("%Y%m%d%H%M%S")
+        return f"{prefijo}-{stamp}{ms:03d}-W{self.worker_id:03d}-{_base36(seq, _SEQ_WIDTH)}"
+
+
+# ------------------ Singleton ------------------
+_ALLOCATOR: Optional[FolioAllocator] = None
+_ALLOCATOR_LOCK = threading.Lock()
+_ALLOCATOR_PID: Optional[int] = None
+
+def get_allocator() -> FolioAllocator:
+    global _ALLOCATOR, _ALLOCATOR_PID
+    # Tras un fork el hijo necesita su propio worker id
+    if _ALLOCATOR is None or _ALLOCATOR_PID != os.getpid():
+        with _ALLOCATOR_LOCK:
+            if _ALLOCATOR is None or _ALLOCATOR_PID != os.getpid():
+                _ALLOCATOR = FolioAllocator()
+                _ALLOCATOR_PID = os.getpid()
+    return _ALLOCATOR
+
+def nuevo_folio(prefijo: str) -> str:
+    return get_allocator().next(prefijo)
@@ -0,0 +1,104 @@
+# utils/functions/horarios.py
+"""
+Horarios como máscaras de bits (día × hora) para detectar empalmes.
+
+- La columna `slots` de grupos.csv ("LU-07;LU-08;MI-07;MI-08") se codifica
+  una sola vez al cargar: cada hora de la semana es un bit
+  (bit = día * 24 + hora). Dos horarios se empalman si a & b != 0.
+- Índice por (grupo_id, materia_id) y por grupo completo (OR de sus materias).
+- La carga de un alumno es el OR de los lugares que tiene apartados en el
+  ledger de cupo (utils.functions.cupos).
+API:
+    - encode_slots(texto) -> int, decode_slots(mask) -> list[str]
+    - empalma(a, b) -> bool
+    - get_slots() -> SlotIndex
+    - SlotIndex.mask(grupo_id, materia_id=None) -> int
+    - SlotIndex.carga(boleta, excluir=()) -> int
+"""
+
+from __future__ import annotations
+import csv
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.functions.cupos import get_ledger
+
+_GRUPOS_CSV = Path(__file__).resolve().parents[2] / "resources" / "data" / "grupos.csv"
+
+DIAS = ("LU", "MA", "MI", "JU", "VI", "SA", "DO")
+_DIA_IDX = {d: i for i, d in enumerate(DIAS)}
+_HORAS = 24
+
+
+def encode_slots(texto: str) -> int:
+    """'LU-07;MI-08' -> máscara. Los slots que no se entienden se ignoran."""
+    mask = 0
+    for slot in (texto or "").split(";"):
+        dia, _, hora = slot.strip().upper().partition("-")
+        if dia in _DIA_IDX and hora.isdigit() and int(hora) < _HORAS:
+            mask |= 1 << (_DIA_IDX[dia] * _HORAS + int(hora))
+    return mask
+
+
+def decode_slots(mask: int) -> List[str]:
+    out = []
+    while mask:
+        bit = (mask & -mask).bit_length() - 1
+        dia, hora = divmod(bit, _HORAS)
+        out.append(f"{DIAS[dia]}-{hora:02d}")
+        mask &= mask - 1
+    return out
+
+
+def empalma(a: int, b: int) -> bool:
+    return bool(a & b)
+
+
+class SlotIndex:
+    def __init__(self, grupos_csv: Path = _GRUPOS_CSV) -> None:
+        self._por_lugar: Dict[Tuple[str, str], int] = {}
+        self._por_grupo: Dict[str, int] = {}
+        try:
+            with open(grupos_csv, "r", encoding="utf-8-sig", newline="") as f:
+                for raw in csv.DictReader(f):
+                    row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                    gid, mid = row.get("grupo_id", "").upper(), row.get("materia_id", "").upper()
+                    if not gid or not mid:
+                        continue
+                    mask = encode_slots(row.get("slots", ""))
+                    self._por_lugar[(gid, mid)] = mask
+                    self._por_grupo[gid] = self._por_grupo.get(gid, 0) | mask
+        except FileNotFoundError:
+            pass
+
+    def mask(self, grupo_id: str, materia_id: Optional[str] = None) -> int:
+        gid = (grupo_id or "").strip().upper()
+        if materia_id is None:
+            return self._por_grupo.get(gid, 0)
+        return self._por_lugar.get((gid, materia_id.strip().upper()), 0)
+
+    def mask_de(self, lugares: Iterable[Tuple[str, str]]) -> int:
+        mask = 0
+        for gid, mid in lugares:
+            mask |= self.mask(gid, mid)
+        return mask
+
+    def carga(self, boleta: str, excluir: Iterable[str] = ()) -> int:
+        """Horario que el alumno ya tiene apartado, sin las materias en `excluir`."""
+        excluir = {m.upper() for m in excluir}
+        return self.mask_de((gid, mid) for mid, gid in get_ledger().materias_de(boleta).items()
+                            if mid not in excluir)
+
+
+# ------------------ Singleton ------------------
+_SLOTS: Optional[SlotIndex] = None
+_SLOTS_LOCK = threading.Lock()
+
+def get_slots() -> SlotIndex:
+    global _SLOTS
+    if _SLOTS is None:
+        with _SLOTS_LOCK:
+            if _SLOTS is None:
+                _SLOTS = SlotIndex()
+    return _SLOTS
@@ -0,0 +1,376 @@
+# utils/functions/logstore.py
+"""
+Índice persistente sobre los logs NDJSON (resources/logs/*.ndjson).
+
+- Junto a cada log vive un índice SQLite (<log>.idx) con filas
+  (clave, valor, segmento, offset): por ejemplo ('folio', 'DIC-...',
+  'dictamen.ndjson', 1234). Con eso, buscar un folio o las solicitudes de
+  una boleta es una consulta por índice + un seek, sin recorrer el log.
+- Cubre todos los segmentos del log (ver utils.functions.segmentos): los
+  cerrados, comprimidos o no, y el activo.
+- El índice es incremental: por segmento guarda número, inode, tamaño y
+  hasta qué byte indexó. Antes de cada consulta solo lee lo agregado desde
+  entonces (líneas completas), así que ve también lo que escribió otro
+  proceso.
+- Los segmentos se siguen por número, no por inode (al rotar y comprimir, el
+  activo nuevo puede reutilizar el inode del anterior). El activo se guarda
+  con el número que recibirá al rotarse: si el log ya va en otro número, sus
+  filas pasan al segmento cerrado con ese número (plano o .gz, los offsets
+  son del contenido sin comprimir) sin releerlo. La compactación produce un
+  número nuevo, así que sus filas se indexan desde cero y las de los
+  segmentos fundidos se borran.
+- Además de campos sueltos hay claves compuestas (una tupla de campos): se
+  guardan como 'boleta+materia+periodo_actual' con valor 'a|b|c' (sin
+  espacios de más y en minúsculas). Una entrada sin alguno de los campos
+  no entra en esa clave. Así se encuentran las solicitudes de dictamen de
+  una boleta para una materia y periodo, incluidas las ya escritas.
+- select() recorre el log filtrando por el índice (igualdad, rango sobre el
+  valor, "solo la última línea de cada folio") y lee las líneas que pasan en
+  orden de escritura, de una en una: para exportar sin cargar el log. El
+  orden y la deduplicación los resuelve SQLite con el número de segmento.
+API:
+    - get_store(path) -> LogStore (uno por archivo)
+    - LogStore.by_folio(folio) -> dict | None  (la última versión del folio)
+    - LogStore.by_boleta(boleta) -> list[dict]  (en orden de escritura)
+    - LogStore.by_keys(**campos) -> list[dict]  (clave compuesta, en orden de escritura)
+    - LogStore.select(iguales=None, rango=None, ultimo_por=None) -> Iterator[dict]
+"""
+
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from utils.functions import segmentos
+
+Clave = Union[str, Tuple[str, ...]]
+
+# (boleta, materia, periodo_actual): solicitudes de dictamen abiertas.
+# periodo*/estatus/resultado/ts: filtros de la exportación (utils.functions.exportar)
+_INDEX_KEYS: Tuple[Clave, ...] = ("folio", "boleta", ("boleta", "materia", "periodo_actual"),
+                                  "periodo", "periodo_actual", "estatus", "resultado", "ts")
+_BATCH = 5000  # filas por executemany al ponerse al día
+_SCHEMA_VERSION = 5  # el índice es derivado: si cambia el esquema se reconstruye
+
+
+def _nombre(clave: Clave) -> str:
+    return clave if isinstance(clave, str) else "+".join(clave)
+
+
+def _valor_compuesto(valores: Iterable) -> str:
+    return "|".join(str(v).strip().lower() for v in valores)
+
+
+class LogStore:
+    def __init__(self, path: Path, keys: Iterable[Clave] = _INDEX_KEYS) -> None:
+        self.path = Path(path)
+        self.keys = tuple(keys)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self._local = threading.local()
+        conn = self._conn()
+        if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS idx")
+            conn.execute("DROP TABLE IF EXISTS segs")
+            conn.execute("DROP TABLE IF EXISTS meta")
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        conn.execute("CREATE TABLE IF NOT EXISTS idx ("
+                     " k TEXT NOT NULL, v TEXT NOT NULL, seg TEXT NOT NULL, off INTEGER NOT NULL,"
+                     " PRIMARY KEY (k, v, seg, off)) WITHOUT ROWID")
+        # Por posición: borrar un segmento y revisar las demás claves de una línea
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pos ON idx(seg, off, k, v)")
+        conn.execute("CREATE TABLE IF NOT EXISTS segs ("
+                     " name TEXT PRIMARY KEY, seq INTEGER NOT NULL, inode INTEGER NOT NULL,"
+                     " size INTEGER NOT NULL, offset INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.index_path), timeout=10.0, isolation_level=None,
+                               check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---- Indexado incremental ----
+    def _snapshot(self) -> Dict[str, os.stat_result]:
+        out = {}
+        for seg in segmentos.segments(self.path):
+            try:
+                out[seg.name] = os.stat(seg)
+            except FileNotFoundError:
+                continue
+        return out
+
+    def _seq_of(self, name: str, next_seq: int) -> int:
+        seq = segmentos.segment_seq(self.path, name)
+        return next_seq if seq is None else seq
+
+    def refresh(self) -> int:
+        """Indexa lo agregado al log desde la última vez. Devuelve líneas nuevas."""
+        actual = self._snapshot()
+        next_seq = segmentos.next_seq(self.path)
+        conn = self._conn()
+        conocidos = {r[0]: (r[1], r[2], r[3]) for r in conn.execute("SELECT name, seq, inode, size FROM segs")}
+        # Chequeo barato sin transacción: ¿cambió algo?
+        if conocidos.keys() == actual.keys() and all(
+                conocidos[n] == (self._seq_of(n, next_seq), st.st_ino, st.st_size) for n, st in actual.items()):
+            return 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            nuevas = self._sync(conn, actual, segmentos.next_seq(self.path))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return nuevas
+
+    def _sync(self, conn, actual: Dict[str, os.stat_result], next_seq: int) -> int:
+        filas = {r[0]: [r[1], r[2], r[3], r[4]]
+                 for r in conn.execute("SELECT name, seq, inode, size, offset FROM segs")}
+        por_seq = {self._seq_of(n, next_seq): n for n in actual}
+
+        # Segmentos que cambiaron de nombre (rotación del activo, compresión):
+        # mismo número => mismo contenido lógico, se conserva lo indexado.
+        for name, fila in list(filas.items()):
+            nuevo = por_seq.get(fila[0])
+            if nuevo and nuevo != name and nuevo not in filas:
+                conn.execute("UPDATE idx SET seg = ? WHERE seg = ?", (nuevo, name))
+                conn.execute("DELETE FROM segs WHERE name = ?", (name,))
+                fila[1], fila[2] = actual[nuevo].st_ino, -1  # forzar ponerse al día desde offset
+                filas[nuevo] = filas.pop(name)
+
+        # Segmentos que ya no existen, o reemplazados bajo el mismo nombre
+        for name, (seq, ino, size, _) in list(filas.items()):
+            st = actual.get(name)
+            reemplazado = st is not None and (
+                seq != self._seq_of(name, next_seq)
+                or (name != self.path.name and st.st_ino != ino)
+                or st.st_size < size)
+            if st is None or reemplazado:
+                conn.execute("DELETE FROM idx WHERE seg = ?", (name,))
+                conn.execute("DELETE FROM segs WHERE name = ?", (name,))
+                del filas[name]
+
+        nuevas = 0
+        for name, st in actual.items():
+            _, _, size, offset = filas.get(name, (0, st.st_ino, -1, 0))
+            if size == st.st_size:
+                continue
+            n, offset = self._index_segment(conn, self.path.with_name(name), offset)
+            nuevas += n
+            conn.execute("INSERT OR REPLACE INTO segs (name, seq, inode, size, offset) VALUES (?, ?, ?, ?, ?)",
+                         (name, self._seq_of(name, next_seq), st.st_ino, st.st_size, offset))
+        return nuevas
+
+    def _index_segment(self, conn, seg: Path, offset: int) -> Tuple[int, int]:
+        nuevas = 0
+        lote = []
+        with segmentos.open_segment(seg) as f:
+            if offset:
+                f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # línea que todavía se está escribiendo: se indexa después
+                lote.extend(self._keys_of(line, seg.name, offset))
+                offset += len(line)
+                nuevas += 1
+                if len(lote) >= _BATCH:
+                    conn.executemany("INSERT OR IGNORE INTO idx (k, v, seg, off) VALUES (?, ?, ?, ?)", lote)
+                    lote = []
+        if lote:
+            conn.executemany("INSERT OR IGNORE INTO idx (k, v, seg, off) VALUES (?, ?, ?, ?)", lote)
+        return nuevas, offset
+
+    def _keys_of(self, line: bytes, seg: str, off: int) -> List[Tuple[str, str, str, int]]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return []
+        if not isinstance(entry, dict):
+            return []
+        out = []
+        for k in self.keys:
+            if isinstance(k, str):
+                if entry.get(k) not in (None, ""):
+                    out.append((k, str(entry[k]), seg, off))
+            elif all(entry.get(c) not in (None, "") for c in k):
+                out.append((_nombre(k), _valor_compuesto(entry[c] for c in k), seg, off))
+        return out
+
+    # ---- Consultas ----
+    def _read_at(self, refs: List[Tuple[str, int]]) -> List[dict]:
+        out = []
+        refs = sorted(refs, key=lambda r: (segmentos.segment_order(self.path, r[0]), r[1]))
+        f, abierto = None, None
+        try:
+            for seg, off in refs:
+                if seg != abierto:
+                    if f is not None:
+                        f.close()
+                    f, abierto = segmentos.open_segment(self.path.with_name(seg)), seg
+                f.seek(off)
+                try:
+                    out.append(json.loads(f.readline()))
+                except ValueError:
+                    continue
+        finally:
+            if f is not None:
+                f.close()
+        return out
+
+    def lookup(self, key: str, value: str) -> List[dict]:
+        for intento in range(2):
+            self.refresh()
+            refs = self._conn().execute(
+                "SELECT seg, off FROM idx WHERE k = ? AND v = ?", (key, str(value))).fetchall()
+            try:
+                return self._read_at(refs)
+            except FileNotFoundError:
+                # El segmento desapareció entre la consulta y la lectura
+                # (rotación/compactación): se refresca y se reintenta una vez.
+                if intento:
+                    raise
+        return []
+
+    def by_folio(self, folio: str) -> Optional[dict]:
+        res = self.lookup("folio", folio)
+        return res[-1] if res else None
+
+    def by_boleta(self, boleta: str) -> List[dict]:
+        return self.lookup("boleta", boleta)
+
+    def by_keys(self, **campos) -> List[dict]:
+        for k in self.keys:
+            if not isinstance(k, str) and set(k) == set(campos):
+                return self.lookup(_nombre(k), _valor_compuesto(campos[c] for c in k))
+        raise KeyError(f"{self.path.name} no indexa la clave {'+'.join(sorted(campos))}")
+
+    def _sql_select(self, iguales: Dict[str, Sequence[str]], rango: Optional[Tuple[str, str, str]],
+                    ultimo_por: Optional[str], desde: Optional[Tuple[int, int]]) -> Tuple[str, list]:
+        for k in list(iguales) + ([rango[0]] if rango else []) + ([ultimo_por] if ultimo_por else []):
+            if k not in self.keys:
+                raise KeyError(f"{self.path.name} no indexa la clave {k}")
+
+        def en(valores):
+            return "(" + ", ".join("?" * len(valores)) + ")"
+
+        def rango_sql(alias):
+            clave, minimo, maximo = rango
+            sql, params = f"{alias}.k = ?", [clave]
+            if minimo:
+                sql, params = sql + f" AND {alias}.v >= ?", params + [minimo]
+            if maximo:
+                sql, params = sql + f" AND {alias}.v < ?", params + [maximo]
+            return sql, params
+
+        # La primera condición elige las filas base (búsqueda por clave
+        # primaria); las demás se revisan por posición (idx_pos).
+        conds, params = [], []
+        iguales = list(iguales.items())
+        if iguales:
+            k, vs = iguales.pop(0)
+            base = "idx r"
+            conds.append(f"r.k = ? AND r.v IN {en(vs)}")
+            params += [k, *vs]
+        elif rango:
+            base = "idx r"
+            sql, ps = rango_sql("r")
+            conds.append(sql)
+            params += ps
+            rango = None
+        else:
+            base = "(SELECT DISTINCT seg, off FROM idx) r"
+        for k, vs in iguales:
+            conds.append(f"EXISTS (SELECT 1 FROM idx c WHERE c.seg = r.seg AND c.off = r.off"
+                         f" AND c.k = ? AND c.v IN {en(vs)})")
+            params += [k, *vs]
+        if rango:
+            sql, ps = rango_sql("c")
+            conds.append(f"EXISTS (SELECT 1 FROM idx c WHERE c.seg = r.seg AND c.off = r.off AND {sql})")
+            params += ps
+        if ultimo_por:
+            # No hay otra línea posterior con el mismo valor de la clave (el
+            # valor se saca primero por posición; sin la clave queda NULL y pasa)
+            conds.append("NOT EXISTS (SELECT 1 FROM idx u2 JOIN segs s2 ON s2.name = u2.seg"
+                         " WHERE u2.k = ? AND u2.v = (SELECT u.v FROM idx u"
+                         " WHERE u.seg = r.seg AND u.off = r.off AND u.k = ?)"
+                         " AND (s2.seq > s.seq OR (s2.seq = s.seq AND u2.off > r.off)))")
+            params += [ultimo_por, ultimo_por]
+        if desde:
+            conds.append("(s.seq > ? OR (s.seq = ? AND r.off > ?))")
+            params += [desde[0], desde[0], desde[1]]
+        where = " AND ".join(conds) or "1"
+        return (f"SELECT s.seq, r.seg, r.off FROM {base} JOIN segs s ON s.name = r.seg"
+                f" WHERE {where} ORDER BY s.seq, r.off"), params
+
+    def select(self, iguales: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+               rango: Optional[Tuple[str, Optional[str], Optional[str]]] = None,
+               ultimo_por: Optional[str] = None) -> Iterator[dict]:
+        """Líneas del log en orden de escritura, leídas de una en una.
+
+        iguales: {clave: valor o valores}, la línea tiene alguno de ellos.
+        rango: (clave, mínimo, máximo) con mínimo <= valor < máximo,
+               comparando texto (None o "" = sin límite).
+        ultimo_por: clave; de cada valor solo pasa su última línea (la
+               versión vigente de un folio). Las líneas sin esa clave pasan.
+        Usa su propia conexión: el cursor queda abierto mientras se consume,
+        y se puede consumir desde otro hilo (un pedazo por tarea del pool).
+        """
+        iguales = {k: [str(v)] if isinstance(v, str) else [str(x) for x in v]
+                   for k, v in (iguales or {}).items()}
+        if any(not vs for vs in iguales.values()):
+            return
+        pos = None
+        for intento in range(2):
+            self.refresh()
+            sql, params = self._sql_select(iguales, rango, ultimo_por, pos)
+            conn = self._connect(check_same_thread=False)
+            f, abierto = None, None
+            try:
+                for seq, seg, off in conn.execute(sql, params):
+                    if seg != abierto:
+                        if f is not None:
+                            f.close()
+                        f, abierto = segmentos.open_segment(self.path.with_name(seg)), seg
+                    f.seek(off)
+                    line = f.readline()
+                    pos = (seq, off)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    yield entry
+                return
+            except FileNotFoundError:
+                # Rotación/compactación a media lectura: se refresca y se sigue
+                # desde la última línea entregada (una vez).
+                if intento:
+                    raise
+            finally:
+                if f is not None:
+                    f.close()
+                conn.close()
+
+
+# ------------------ Registro ------------------
+_STORES: Dict[Path, LogStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(path: Path) -> LogStore:
+    key = Path(path).resolve()
+    s = _STORES.get(key)
+    if s is None:
+        with _STORES_LOCK:
+            s = _STORES.get(key)
+            if s is None:
+                s = _STORES[key] = LogStore(key)
+    return s
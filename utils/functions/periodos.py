@@ -0,0 +1,164 @@
+# utils/functions/periodos.py
+"""
+Calendario escolar (resources/data/periodos.csv) y grupos por periodo.
+
+Columnas: periodo_id,descripcion,fecha_inicio,fecha_fin  (fechas YYYY-MM-DD)
+
+- periodos.csv se lee una vez. El periodo actual sale de la fecha: el que
+  la contiene; entre periodos, el siguiente en empezar (lo que toca
+  inscribir); después del último, el último. Si ese periodo todavía no tiene
+  grupos en grupos.csv (calendario publicado antes que la oferta), se usa el
+  más reciente anterior que sí tenga. SAES_PERIODO lo fija a mano (pruebas,
+  cierre de periodo atrasado).
+- Cada periodo tiene un número ordinal (año * 2 + semestre), precalculado
+  para los del CSV; los que aparecen después (kardex de años anteriores) se
+  calculan una vez y se guardan. "¿Cuántos semestres han pasado?" es una
+  resta de dos lookups.
+- grupos.csv se indexa por periodo y por (periodo, materia): filtrar grupos
+  del periodo es un lookup, no un recorrido del CSV.
+API:
+    - get_calendario() -> Calendario
+    - Calendario.actual(hoy=None) -> periodo_id
+    - Calendario.periodo(periodo_id) -> Periodo | None
+    - Calendario.ordinal(periodo_id) -> int | None
+    - Calendario.diferencia(desde, hasta=None) -> int  (semestres)
+    - Calendario.grupos(periodo_id=None, materia_id=None) -> list[dict]
+"""
+
+from __future__ import annotations
+import os
+import csv
+import bisect
+import threading
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_DATA_DIR = Path(__file__).resolve().parents[2] / "resources" / "data"
+_PERIODOS_CSV = _DATA_DIR / "periodos.csv"
+_GRUPOS_CSV = _DATA_DIR / "grupos.csv"
+_PERIODO_FIJO = os.environ.get("SAES_PERIODO", "").strip()
+
+
+@dataclass(frozen=True)
+class Periodo:
+    periodo_id: str
+    descripcion: str
+    inicio: date
+    fin: date
+
+
+def _leer_csv(path: Path) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return [{(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                    for raw in csv.DictReader(f)]
+    except FileNotFoundError:
+        return []
+
+
+def _ordinal_de_id(periodo_id: str) -> Optional[int]:
+    """'2024-2' -> 2024 * 2 + 2. None si no tiene esa forma."""
+    try:
+        anio, sem = str(periodo_id).strip().split("-")
+        return int(anio) * 2 + int(sem)
+    except (ValueError, AttributeError):
+        return None
+
+
+class Calendario:
+    def __init__(self, periodos_csv: Path = _PERIODOS_CSV, grupos_csv: Path = _GRUPOS_CSV,
+                 fijo: str = _PERIODO_FIJO) -> None:
+        periodos = []
+        for row in _leer_csv(periodos_csv):
+            try:
+                periodos.append(Periodo(row["periodo_id"], row.get("descripcion", ""),
+                                        date.fromisoformat(row["fecha_inicio"]),
+                                        date.fromisoformat(row["fecha_fin"])))
+            except (KeyError, ValueError):
+                continue
+        periodos.sort(key=lambda p: p.inicio)
+        self._periodos = periodos
+        self._por_id = {p.periodo_id: p for p in periodos}
+        self._inicios = [p.inicio for p in periodos]
+        self._fijo = fijo
+
+        self._ordinal: Dict[str, Optional[int]] = {p.periodo_id: _ordinal_de_id(p.periodo_id) for p in periodos}
+
+        self._grupos: Dict[str, List[dict]] = {}
+        self._grupos_materia: Dict[Tuple[str, str], List[dict]] = {}
+        for row in _leer_csv(grupos_csv):
+            pid, mid = row.get("periodo_id", ""), row.get("materia_id", "").upper()
+            if not row.get("grupo_id"):
+                continue
+            self._grupos.setdefault(pid, []).append(row)
+            if mid:
+                self._grupos_materia.setdefault((pid, mid), []).append(row)
+        # Periodos con oferta, del más reciente al más viejo
+        self._con_grupos = sorted((pid for pid in self._grupos if self.ordinal(pid) is not None),
+                                  key=self.ordinal, reverse=True)
+
+    # ---- Periodos ----
+    def actual(self, hoy: Optional[date] = None) -> str:
+        if self._fijo:
+            return self._fijo
+        if not self._periodos:
+            return ""
+        hoy = hoy or date.today()
+        i = bisect.bisect_right(self._inicios, hoy) - 1
+        if i < 0:
+            return self._periodos[0].periodo_id
+        if hoy > self._periodos[i].fin and i + 1 < len(self._periodos):
+            i += 1  # vacaciones: ya toca el siguiente
+        return self._con_oferta(self._periodos[i].periodo_id)
+
+    def _con_oferta(self, pid: str) -> str:
+        """pid si tiene grupos; si no, el más reciente anterior que tenga."""
+        if pid in self._grupos or not self._con_grupos:
+            return pid
+        n = self.ordinal(pid)
+        if n is None:
+            return pid
+        for otro in self._con_grupos:
+            if self._ordinal[otro] <= n:
+                return otro
+        return pid
+
+    def periodo(self, periodo_id: str) -> Optional[Periodo]:
+        return self._por_id.get(str(periodo_id).strip())
+
+    def ordinal(self, periodo_id: str) -> Optional[int]:
+        pid = str(periodo_id).strip()
+        try:
+            return self._ordinal[pid]
+        except KeyError:
+            # Asignación atómica: otro hilo a lo mucho calcula lo mismo
+            n = self._ordinal[pid] = _ordinal_de_id(pid)
+            return n
+
+    def diferencia(self, desde: str, hasta: Optional[str] = None) -> int:
+        """Semestres de `desde` a `hasta` (por defecto el actual). 0 si alguno
+        no se reconoce: se trata como reciente."""
+        a, b = self.ordinal(desde), self.ordinal(hasta or self.actual())
+        return b - a if a is not None and b is not None else 0
+
+    # ---- Grupos ----
+    def grupos(self, periodo_id: Optional[str] = None, materia_id: Optional[str] = None) -> List[dict]:
+        pid = periodo_id or self.actual()
+        if materia_id is None:
+            return self._grupos.get(pid, [])
+        return self._grupos_materia.get((pid, materia_id.strip().upper()), [])
+
+
+# ------------------ Singleton ------------------
+_CALENDARIO: Optional[Calendario] = None
+_CALENDARIO_LOCK = threading.Lock()
+
+def get_calendario() -> Calendario:
+    global _CALENDARIO
+    if _CALENDARIO is None:
+        with _CALENDARIO_LOCK:
+            if _CALENDARIO is None:
+                _CALENDARIO = Calendario()
+    return _CALENDARIO
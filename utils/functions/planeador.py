@@ -0,0 +1,141 @@
+# utils/functions/planeador.py
+"""
+Armado de horarios: combinaciones de grupos sin empalmes.
+
+- Candidatos por materia: las secciones de grupos.csv (del periodo pedido,
+  o del actual, vía el índice del calendario) con cupo (ledger de cupo) que no chocan
+  con la carga que el alumno ya tiene. Cada sección trae
+  su máscara de horario (utils.functions.horarios). Con boleta, las materias
+  cuyos prerrequisitos no ha aprobado se quedan fuera (info["sin_prerrequisitos"]).
+- Búsqueda en profundidad empezando por la materia con menos secciones; una
+  rama se corta en cuanto su máscara choca con lo ya elegido (un AND), o
+  cuando ya no puede superar al peor de los top-N (cota: las horas muertas
+  solo bajan si las materias restantes las llenan; fuera de turno y cupo
+  mínimo solo empeoran).
+- Presupuesto de tiempo (SAES_PLANEADOR_BUDGET_MS): al agotarse se devuelve
+  lo mejor encontrado hasta ese momento y completo=False.
+- Ranking: menos horas muertas entre clases, menos secciones fuera del turno
+  preferido y más cupo (el mínimo entre las secciones elegidas).
+API:
+    - armar_horarios(materias, turnos=None, boleta="", periodo=None, top_n=3)
+        -> (list[Horario], info)
+"""
+
+from __future__ import annotations
+import os
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from utils.functions.cupos import get_ledger
+from utils.functions.horarios import get_slots, DIAS
+from utils.functions.prerrequisitos import get_grafo
+from utils.functions.periodos import get_calendario
+
+_BUDGET_MS = float(os.environ.get("SAES_PLANEADOR_BUDGET_MS", 50))
+_CHECK_EVERY = 256  # nodos entre revisiones del reloj
+
+
+@dataclass(order=True)
+class Horario:
+    huecos: int
+    fuera_turno: int
+    cupo_neg: int  # -cupo mínimo, para que más cupo ordene primero
+    secciones: List[dict] = field(compare=False)
+    mask: int = field(compare=False, default=0)
+
+    @property
+    def cupo(self) -> int:
+        return -self.cupo_neg
+
+
+def huecos(mask: int) -> int:
+    """Horas libres entre la primera y la última clase de cada día."""
+    total = 0
+    for d in range(len(DIAS)):
+        dia = (mask >> (d * 24)) & 0xFFFFFF
+        if dia:
+            total += dia.bit_length() - (dia & -dia).bit_length() + 1 - bin(dia).count("1")
+    return total
+
+
+def _candidatos(mid: str, turnos: Optional[set], carga: int, periodo: Optional[str]) -> List[Tuple]:
+    ledger, slots = get_ledger(), get_slots()
+    out = []
+    # Las secciones salen directo del índice del calendario (sin periodo, el actual)
+    filas = get_calendario().grupos(periodo, mid)
+    for row in filas:
+        gid = row["grupo_id"].upper()
+        disp = ledger.disponibles(gid, mid)
+        mask = slots.mask(gid, mid)
+        if disp <= 0 or mask & carga:
+            continue
+        fuera = 1 if turnos and row.get("turno", "").lower() not in turnos else 0
+        out.append((fuera, -disp, mask, disp, row))
+    out.sort(key=lambda c: (c[0], c[1]))  # primero en turno y con más cupo
+    return out
+
+
+def armar_horarios(materias: Iterable[str], turnos: Optional[Iterable[str]] = None, boleta: str = "",
+                   periodo: Optional[str] = None, top_n: int = 3,
+                   budget_ms: float = _BUDGET_MS) -> Tuple[List[Horario], dict]:
+    materias = list(dict.fromkeys(m.strip().upper() for m in materias if m and m.strip()))
+    turnos = {t.strip().lower() for t in turnos} if turnos else None
+    carga = get_slots().carga(boleta, excluir=materias) if boleta else 0
+    bloqueadas = get_grafo().validar(boleta, materias) if boleta else {}
+    materias = [m for m in materias if m not in bloqueadas]
+
+    cands = {mid: _candidatos(mid, turnos, carga, periodo) for mid in materias}
+    sin_opciones = [mid for mid, c in cands.items() if not c]
+    orden = sorted((mid for mid in materias if cands[mid]), key=lambda m: len(cands[m]))
+    # Horas que todavía pueden llenar huecos a partir de la materia i
+    resto = [0] * (len(orden) + 1)
+    for i in range(len(orden) - 1, -1, -1):
+        resto[i] = resto[i + 1] + min(bin(c[2]).count("1") for c in cands[orden[i]])
+
+    mejores: List[Tuple] = []  # heap de (-clave, n, Horario): el peor arriba
+    limite = time.perf_counter() + budget_ms / 1000.0
+    nodos = 0
+    completo = True
+    elegidas: List[Tuple] = []
+
+    def registrar(mask: int) -> None:
+        h = Horario(huecos(mask), sum(c[0] for c in elegidas), -min(c[3] for c in elegidas),
+                    [c[4] for c in elegidas], mask)
+        clave = (h.huecos, h.fuera_turno, h.cupo_neg)
+        item = (tuple(-x for x in clave), nodos, h)
+        if len(mejores) < top_n:
+            heapq.heappush(mejores, item)
+        elif item > mejores[0]:
+            heapq.heapreplace(mejores, item)
+
+    def buscar(i: int, mask: int, fuera: int, cupo: int) -> bool:
+        nonlocal nodos, completo
+        nodos += 1
+        if nodos % _CHECK_EVERY == 0 and time.perf_counter() > limite:
+            completo = False
+            return False
+        if len(mejores) == top_n:
+            cota = (max(0, huecos(mask) - resto[i]), fuera, -cupo)
+            if cota >= tuple(-x for x in mejores[0][0]):
+                return True  # poda: esta rama no entra al top-N
+        if i == len(orden):
+            registrar(mask)
+            return True
+        for cand in cands[orden[i]]:
+            if cand[2] & mask:
+                continue  # poda: se empalma con lo ya elegido
+            elegidas.append(cand)
+            seguir = buscar(i + 1, mask | cand[2], fuera + cand[0], min(cupo, cand[3]))
+            elegidas.pop()
+            if not seguir:
+                return False
+        return True
+
+    if orden:
+        buscar(0, 0, 0, float("inf"))
+    horarios = sorted(item[2] for item in mejores)
+    info = {"completo": completo, "nodos": nodos, "sin_opciones": sin_opciones,
+            "sin_prerrequisitos": bloqueadas}
+    return horarios, info
@@ -0,0 +1,179 @@
+# utils/functions/prerrequisitos.py
+"""
+Grafo de prerrequisitos (resources/data/vemos/prerrequisitos.csv) como bitsets.
+
+- Cada materia recibe un bit. Al cargar se revisa que no haya ciclos y se
+  calcula, en orden topológico, la cerradura transitiva de cada materia: el
+  OR de los bits de todo lo que hay que aprobar antes (directo o indirecto).
+- Las materias aprobadas de cada boleta (kardex.csv, calificación >= 6,
+  por nombre vía materias.csv) se guardan también como máscara. Si
+  kardex.csv cambia (mtime/tamaño, revisado como mucho cada
+  SAES_KARDEX_CHECK_S segundos) las máscaras se recalculan.
+- "¿Puede cursar X?" es cerradura[X] & ~aprobadas == 0: constante, sin
+  recorrer el kardex ni el grafo.
+API:
+    - get_grafo() -> GrafoPrerrequisitos
+    - GrafoPrerrequisitos.puede_cursar(boleta, materia_id) -> bool
+    - GrafoPrerrequisitos.faltantes(boleta, materia_id) -> list[str]
+    - GrafoPrerrequisitos.validar(boleta, materia_ids) -> {materia_id: [faltantes]}
+"""
+
+from __future__ import annotations
+import os
+import csv
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_DATA_DIR = Path(__file__).resolve().parents[2] / "resources" / "data"
+_PRERREQ_CSV = _DATA_DIR / "vemos" / "prerrequisitos.csv"
+_MATERIAS_CSV = _DATA_DIR / "materias.csv"
+_KARDEX_CSV = _DATA_DIR / "kardex.csv"
+_CHECK_S = float(os.environ.get("SAES_KARDEX_CHECK_S", 2.0))
+
+_CALIF_APROBATORIA = 6
+
+
+def _leer_csv(path: Path) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return [{(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+                    for raw in csv.DictReader(f)]
+    except FileNotFoundError:
+        return []
+
+
+class GrafoPrerrequisitos:
+    def __init__(self, prerreq_csv: Path = _PRERREQ_CSV, materias_csv: Path = _MATERIAS_CSV,
+                 kardex_csv: Path = _KARDEX_CSV, check_s: float = _CHECK_S) -> None:
+        materias = _leer_csv(materias_csv)
+        self._bit: Dict[str, int] = {}
+        self._ids: List[str] = []
+        for m in materias:
+            self._bit_de(m.get("materia_id", ""))
+
+        self._directos: Dict[str, List[str]] = {}
+        for row in _leer_csv(prerreq_csv):
+            mid, pre = row.get("materia_id", "").upper(), row.get("prerrequisito_id", "").upper()
+            if mid and pre:
+                self._bit_de(mid)
+                self._bit_de(pre)
+                self._directos.setdefault(mid, []).append(pre)
+
+        self._cerradura: Dict[str, int] = {}
+        for mid in self._orden_topologico():
+            mask = 0
+            for pre in self._directos.get(mid, []):
+                mask |= (1 << self._bit[pre]) | self._cerradura.get(pre, 0)
+            self._cerradura[mid] = mask
+
+        self._por_nombre = {m.get("nombre", "").lower(): m.get("materia_id", "").upper() for m in materias}
+        self.kardex_csv = Path(kardex_csv)
+        self.check_s = check_s
+        self._lock = threading.Lock()
+        self._firma: Optional[Tuple[int, int]] = None
+        self._proxima_revision = 0.0
+        self._aprobadas: Dict[str, int] = {}
+        self._cargar_aprobadas()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.kardex_csv)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _cargar_aprobadas(self) -> None:
+        firma = self._stat()
+        aprobadas: Dict[str, int] = {}
+        for row in _leer_csv(self.kardex_csv):
+            mid = self._por_nombre.get(row.get("materia", "").lower())
+            try:
+                aprobada = float(row.get("calificacion", "")) >= _CALIF_APROBATORIA
+            except ValueError:
+                aprobada = False
+            if mid and aprobada:
+                boleta = row.get("boleta", "")
+                aprobadas[boleta] = aprobadas.get(boleta, 0) | (1 << self._bit[mid])
+        self._aprobadas = aprobadas  # se publica completa
+        self._firma = firma
+
+    def _revisar(self) -> None:
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            if self._stat() != self._firma:
+                self._cargar_aprobadas()
+            self._proxima_revision = ahora + self.check_s
+
+    def _bit_de(self, mid: str) -> Optional[int]:
+        mid = mid.strip().upper()
+        if not mid:
+            return None
+        if mid not in self._bit:
+            self._bit[mid] = len(self._ids)
+            self._ids.append(mid)
+        return self._bit[mid]
+
+    def _orden_topologico(self) -> List[str]:
+        """Prerrequisitos antes que las materias que los piden. Un ciclo es un
+        error de datos: ninguna materia del ciclo podría cursarse nunca."""
+        orden: List[str] = []
+        estado: Dict[str, int] = {}  # 1 = visitando, 2 = listo
+        for inicio in self._ids:
+            if estado.get(inicio):
+                continue
+            pila = [(inicio, iter(self._directos.get(inicio, [])))]
+            estado[inicio] = 1
+            while pila:
+                mid, hijos = pila[-1]
+                pre = next(hijos, None)
+                if pre is None:
+                    pila.pop()
+                    estado[mid] = 2
+                    orden.append(mid)
+                elif estado.get(pre) == 1:
+                    camino = [m for m, _ in pila]
+                    ciclo = camino[camino.index(pre):] + [pre]
+                    raise ValueError(f"Ciclo en {_PRERREQ_CSV.name}: {' -> '.join(ciclo)}")
+                elif not estado.get(pre):
+                    estado[pre] = 1
+                    pila.append((pre, iter(self._directos.get(pre, []))))
+        return orden
+
+    # ---- Consultas ----
+    def _faltan_mask(self, boleta: str, materia_id: str) -> int:
+        self._revisar()
+        return self._cerradura.get(materia_id.strip().upper(), 0) & ~self._aprobadas.get(str(boleta).strip(), 0)
+
+    def puede_cursar(self, boleta: str, materia_id: str) -> bool:
+        return not self._faltan_mask(boleta, materia_id)
+
+    def faltantes(self, boleta: str, materia_id: str) -> List[str]:
+        mask, out = self._faltan_mask(boleta, materia_id), []
+        while mask:
+            bit = (mask & -mask).bit_length() - 1
+            out.append(self._ids[bit])
+            mask &= mask - 1
+        return out
+
+    def validar(self, boleta: str, materia_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """Solo las materias que no se pueden cursar, con lo que les falta."""
+        return {mid: self.faltantes(boleta, mid) for mid in materia_ids if self._faltan_mask(boleta, mid)}
+
+
+# ------------------ Singleton ------------------
+_GRAFO: Optional[GrafoPrerrequisitos] = None
+_GRAFO_LOCK = threading.Lock()
+
+def get_grafo() -> GrafoPrerrequisitos:
+    global _GRAFO
+    if _GRAFO is None:
+        with _GRAFO_LOCK:
+            if _GRAFO is None:
+                _GRAFO = GrafoPrerrequisitos()
+    return _GRAFO
@@ -0,0 +1,142 @@
+# utils/functions/recuperacion.py
+"""
+Grupos sugeridos para recuperar materias reprobadas (ETS / recursamiento).
+
+- Candidatos de una materia: sus secciones en el periodo (índice del
+  calendario), preparadas una sola vez por (periodo, materia) con su máscara
+  de horario (utils.functions.horarios), el turno y el profesor normalizado
+  (sin acentos ni "Dr./Mtra./Ing.").
+- Filtros duros: cupo vivo en el ledger (utils.functions.cupos) y que no se
+  empalme con lo que el alumno ya tiene apartado (un AND).
+- Ranking (menor es mejor): fuera del turno preferido, mismo profesor con el
+  que reprobó, empalme con lo ya sugerido para otra materia, menos cupo.
+- Varias materias: se resuelven primero las que tienen menos candidatos y
+  cada primera opción se suma a la máscara "sugerida", para que las
+  siguientes prefieran grupos que no choquen con ella.
+- Turno preferido: el que se pida; si no, el de los grupos que ya tiene
+  apartados; si no tiene ninguno, no se penaliza ninguno.
+API:
+    - sugerir(boleta, materias, turno="", por_materia=2) -> {materia_id: [Sugerencia]}
+    - turno_de_carga(boleta) -> "matutino" | "vespertino" | ""
+"""
+
+from __future__ import annotations
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from utils.functions.cupos import get_ledger
+from utils.functions.horarios import get_slots
+from utils.functions.periodos import get_calendario
+
+_TITULOS_RE = re.compile(r"\b(dr|dra|mtro|mtra|ing|lic|prof|profa)\.?\s+")
+
+
+@dataclass(frozen=True)
+class _Candidato:
+    grupo_id: str
+    mask: int
+    turno: str
+    profesor: str  # normalizado
+    row: dict
+
+
+@dataclass(order=True)
+class Sugerencia:
+    fuera_turno: bool
+    mismo_profesor: bool
+    choca_sugeridas: bool
+    cupo_neg: int  # -disponibles, para que más cupo ordene primero
+    grupo_id: str
+    row: dict = field(compare=False)
+
+    @property
+    def disponibles(self) -> int:
+        return -self.cupo_neg
+
+
+def normaliza_profesor(nombre: str) -> str:
+    s = "".join(c for c in unicodedata.normalize("NFD", (nombre or "").lower())
+                if unicodedata.category(c) != "Mn")
+    return " ".join(_TITULOS_RE.sub("", s + " ").split())
+
+
+_CANDIDATOS: Dict[Tuple[str, str], Tuple[_Candidato, ...]] = {}
+_TURNOS: Dict[str, Dict[str, str]] = {}  # periodo -> {grupo_id: turno}
+_CANDIDATOS_LOCK = threading.Lock()
+
+
+def _candidatos(periodo: str, materia_id: str) -> Tuple[_Candidato, ...]:
+    clave = (periodo, materia_id)
+    cands = _CANDIDATOS.get(clave)
+    if cands is None:
+        with _CANDIDATOS_LOCK:
+            cands = _CANDIDATOS.get(clave)
+            if cands is None:
+                slots = get_slots()
+                cands = _CANDIDATOS[clave] = tuple(
+                    _Candidato(row["grupo_id"].upper(), slots.mask(row["grupo_id"], materia_id),
+                               row.get("turno", "").lower(), normaliza_profesor(row.get("profesor", "")), row)
+                    for row in get_calendario().grupos(periodo, materia_id))
+    return cands
+
+
+def turno_de_carga(boleta: str) -> str:
+    """Turno de la mayoría de los grupos que la boleta tiene apartados."""
+    grupos = set(get_ledger().materias_de(boleta).values())
+    if not grupos:
+        return ""
+    periodo = get_calendario().actual()
+    turnos = _TURNOS.get(periodo)
+    if turnos is None:
+        turnos = _TURNOS[periodo] = {r["grupo_id"].upper(): r.get("turno", "").lower()
+                                     for r in get_calendario().grupos(periodo)}
+    conteo: Dict[str, int] = {}
+    for gid in grupos:
+        t = turnos.get(gid, "")
+        if t:
+            conteo[t] = conteo.get(t, 0) + 1
+    return max(sorted(conteo), key=conteo.get) if conteo else ""
+
+
+def sugerir(boleta: str, materias: Iterable[dict], turno: str = "",
+            por_materia: int = 2) -> Dict[str, List[Sugerencia]]:
+    """materias: renglones del análisis de reprobadas (materia_id, profesor).
+    Devuelve, por materia_id, hasta `por_materia` grupos ordenados."""
+    ledger, slots = get_ledger(), get_slots()
+    periodo = get_calendario().actual()
+    turno = (turno or turno_de_carga(boleta)).lower()
+    tiene = ledger.materias_de(boleta) if boleta else {}
+    mask_de = {mid: slots.mask(gid, mid) for mid, gid in tiene.items()}
+
+    pendientes: Dict[str, Tuple[Tuple[_Candidato, ...], str]] = {}
+    for m in materias:
+        mid = (m.get("materia_id") or "").upper()
+        if mid and mid not in pendientes:
+            pendientes[mid] = (_candidatos(periodo, mid), normaliza_profesor(m.get("profesor", "")))
+
+    out: Dict[str, List[Sugerencia]] = {}
+    sugeridas = 0
+    for mid in sorted(pendientes, key=lambda m: len(pendientes[m][0])):
+        cands, profesor = pendientes[mid]
+        carga = 0
+        for otra, mask in mask_de.items():
+            if otra != mid:
+                carga |= mask
+        opciones = []
+        for c in cands:
+            if c.mask & carga:
+                continue  # se empalma con su horario actual
+            disp = ledger.disponibles(c.grupo_id, mid)
+            if disp <= 0:
+                continue
+            opciones.append(Sugerencia(bool(turno) and c.turno != turno,
+                                       bool(profesor) and c.profesor == profesor,
+                                       bool(c.mask & sugeridas), -disp, c.grupo_id, c.row))
+        opciones.sort()
+        out[mid] = opciones[:por_materia]
+        if opciones:
+            sugeridas |= slots.mask(opciones[0].grupo_id, mid)
+    return out
@@ -0,0 +1,160 @@
+# utils/functions/reprobadas.py
+"""
+Materias reprobadas por boleta: un solo análisis para ETS, dictamen y
+armar horario.
+
+- kardex.csv se indexa por boleta. El análisis de una boleta se arma la
+  primera vez que se pide y se guarda por (boleta, periodo actual):
+    * reprobadas: calificación < 6 (las vacías, cursando, y las no
+      numéricas se ignoran), en el orden del kardex;
+    * semestres_transcurridos contra el periodo actual (calendario) y
+      requiere_dictamen si pasaron más de 3;
+    * materia_id (por nombre en materias.csv) y grupos: las secciones de esa
+      materia en el periodo actual (índice del calendario). El cupo y los
+      empalmes cambian en vivo; eso lo filtra quien muestra los grupos.
+- Si kardex.csv cambia (mtime/tamaño, revisado como mucho cada
+  SAES_KARDEX_CHECK_S segundos) se vuelve a indexar y se descartan todos los
+  análisis guardados.
+- Lo devuelto se comparte entre peticiones: no se modifica.
+API:
+    - get_reprobadas() -> AnalisisReprobadas
+    - AnalisisReprobadas.de(boleta) -> Analisis
+    - AnalisisReprobadas.kardex() -> (hay_renglones, con_columna_boleta)
+    - Analisis.cursadas, .reprobadas, .ets, .dictamen
+"""
+
+from __future__ import annotations
+import os
+import csv
+import time
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.functions.periodos import get_calendario
+
+_DATA_DIR = Path(__file__).resolve().parents[2] / "resources" / "data"
+_KARDEX_CSV = _DATA_DIR / "kardex.csv"
+_MATERIAS_CSV = _DATA_DIR / "materias.csv"
+_CHECK_S = float(os.environ.get("SAES_KARDEX_CHECK_S", 2.0))
+
+_CALIF_APROBATORIA = 6
+_SEMESTRES_DICTAMEN = 3  # más de esto, el ETS requiere dictamen
+
+
+@dataclass(frozen=True)
+class Analisis:
+    cursadas: int  # renglones del kardex de la boleta (0 = sin historial)
+    reprobadas: Tuple[dict, ...]
+
+    @property
+    def ets(self) -> List[dict]:
+        return [m for m in self.reprobadas if not m["requiere_dictamen"]]
+
+    @property
+    def dictamen(self) -> List[dict]:
+        return [m for m in self.reprobadas if m["requiere_dictamen"]]
+
+
+def _leer_csv(path: Path) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return [{k.strip().lower(): (v or "").strip() for k, v in raw.items() if k is not None}
+                    for raw in csv.DictReader(f)]
+    except FileNotFoundError:
+        return []
+
+
+class AnalisisReprobadas:
+    def __init__(self, kardex_csv: Path = _KARDEX_CSV, materias_csv: Path = _MATERIAS_CSV,
+                 check_s: float = _CHECK_S) -> None:
+        self.kardex_csv = Path(kardex_csv)
+        self.check_s = check_s
+        self._por_nombre = {m.get("nombre", "").lower(): m.get("materia_id", "").upper()
+                            for m in _leer_csv(materias_csv)}
+        self._lock = threading.Lock()
+        self._firma: Optional[Tuple[int, int]] = None
+        # (kardex por boleta, análisis de esa carga): se publican juntos
+        self._carga: Tuple[Dict[str, List[dict]], Dict[Tuple[str, str], Analisis]] = ({}, {})
+        self._estado = (False, False)
+        self._proxima_revision = 0.0
+        self._recargar()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.kardex_csv)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _recargar(self) -> None:
+        firma = self._stat()
+        kardex: Dict[str, List[dict]] = {}
+        for row in _leer_csv(self.kardex_csv):
+            kardex.setdefault(row.get("boleta", ""), []).append(row)
+        self._carga = (kardex, {})
+        # Sin columna boleta todos los renglones caen bajo ""
+        self._estado = (bool(kardex), any(kardex))
+        self._firma = firma
+
+    def _revisar(self) -> None:
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            if self._stat() != self._firma:
+                self._recargar()
+            self._proxima_revision = ahora + self.check_s
+
+    def _analizar(self, filas: List[dict], periodo: str) -> Analisis:
+        cal = get_calendario()
+        reprobadas = []
+        for row in filas:
+            try:
+                calif = float(row.get("calificacion", ""))
+            except ValueError:
+                continue  # sin calificación (cursando) o no numérica
+            if calif >= _CALIF_APROBATORIA:
+                continue
+            info = dict(row)
+            transcurridos = cal.diferencia(row.get("semestre", ""), periodo)
+            info["semestres_transcurridos"] = transcurridos
+            info["requiere_dictamen"] = transcurridos > _SEMESTRES_DICTAMEN
+            mid = self._por_nombre.get(row.get("materia", "").lower(), "")
+            info["materia_id"] = mid
+            info["grupos"] = cal.grupos(periodo, mid) if mid else []
+            reprobadas.append(info)
+        return Analisis(len(filas), tuple(reprobadas))
+
+    # ---- Consultas ----
+    def kardex(self) -> Tuple[bool, bool]:
+        """(hay renglones, trae columna boleta) del kardex vigente."""
+        self._revisar()
+        return self._estado
+
+    def de(self, boleta: str) -> Analisis:
+        self._revisar()
+        boleta = str(boleta).strip()
+        clave = (boleta, get_calendario().actual())
+        kardex, cache = self._carga
+        analisis = cache.get(clave)
+        if analisis is None:
+            # Sin lock: dos hilos a lo mucho calculan lo mismo
+            analisis = cache[clave] = self._analizar(kardex.get(boleta, []), clave[1])
+        return analisis
+
+
+# ------------------ Singleton ------------------
+_ANALISIS: Optional[AnalisisReprobadas] = None
+_ANALISIS_LOCK = threading.Lock()
+
+def get_reprobadas() -> AnalisisReprobadas:
+    global _ANALISIS
+    if _ANALISIS is None:
+        with _ANALISIS_LOCK:
+            if _ANALISIS is None:
+                _ANALISIS = AnalisisReprobadas()
+    return _ANALISIS
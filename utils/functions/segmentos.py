@@ -0,0 +1,253 @@
+# utils/functions/segmentos.py
+"""
+Rotación y compactación de los logs NDJSON en segmentos.
+
+Para un log resources/logs/inscripciones.ndjson:
+    inscripciones.000001.ndjson      segmento cerrado
+    inscripciones.000002.ndjson.gz   segmento cerrado y comprimido
+    inscripciones.ndjson             segmento activo (donde se escribe)
+
+- Rotación por tamaño (SAES_LOG_ROTATE_BYTES) o por tiempo
+  (SAES_LOG_ROTATE_S): el activo se renombra al siguiente número y, si
+  SAES_LOG_COMPRESS está activo, se comprime con gzip.
+- Compactación: cuando hay más de SAES_LOG_COMPACT_AFTER segmentos cerrados
+  se funden en uno solo, con número nuevo, que conserva únicamente el último
+  estado por folio (las líneas sin folio se conservan tal cual). Un número de
+  segmento nunca cambia de contenido, salvo por la compresión. Los logs de
+  SAES_LOG_COMPACT_SKIP (por defecto inscripciones, donde cada línea tiene
+  folio propio y compactar no libera nada) no se compactan.
+- Los lectores usan iter_entries()/iter_lines(): ven los segmentos cerrados
+  en orden y después el activo, como un único flujo continuo.
+"""
+
+from __future__ import annotations
+import os
+import re
+import contextlib
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import IO, Callable, ContextManager, Iterator, List, Optional, Tuple
+
+_ROTATE_BYTES = int(os.environ.get("SAES_LOG_ROTATE_BYTES", 64 * 1024 * 1024))
+_ROTATE_S = float(os.environ.get("SAES_LOG_ROTATE_S", 24 * 3600))  # 0 desactiva
+_COMPRESS = os.environ.get("SAES_LOG_COMPRESS", "0").strip().lower() in ("1", "true", "si", "yes")
+_COMPACT_AFTER = int(os.environ.get("SAES_LOG_COMPACT_AFTER", 8))  # 0 desactiva
+# Logs (por nombre, sin .ndjson) que no se compactan: sus folios no se repiten
+_COMPACT_SKIP = {s.strip() for s in os.environ.get("SAES_LOG_COMPACT_SKIP", "inscripciones").split(",")
+                 if s.strip()}
+
+_SEQ_WIDTH = 6
+
+
+def _seg_re(path: Path) -> "re.Pattern":
+    stem = re.escape(path.name[:-len(".ndjson")] if path.name.endswith(".ndjson") else path.stem)
+    return re.compile(rf"^{stem}\.(\d{{{_SEQ_WIDTH}}})\.ndjson(\.gz)?$")
+
+
+# ------------------ Listado / lectura ------------------
+
+def closed_segments(path: Path) -> List[Path]:
+    """Segmentos cerrados en orden. Si un número existe plano y .gz (compresión
+    a medias), se usa el plano."""
+    path = Path(path)
+    rx = _seg_re(path)
+    por_seq = {}
+    try:
+        nombres = os.listdir(path.parent)
+    except FileNotFoundError:
+        return []
+    for name in nombres:
+        m = rx.match(name)
+        if not m:
+            continue
+        seq = int(m.group(1))
+        if seq not in por_seq or not m.group(2):
+            por_seq[seq] = path.parent / name
+    return [por_seq[k] for k in sorted(por_seq)]
+
+
+def segments(path: Path) -> List[Path]:
+    """Todos los segmentos legibles, del más viejo al activo."""
+    path = Path(path)
+    segs = closed_segments(path)
+    if path.exists():
+        segs.append(path)
+    return segs
+
+
+def segment_seq(path: Path, seg_name: str) -> Optional[int]:
+    m = _seg_re(Path(path)).match(seg_name)
+    return int(m.group(1)) if m else None
+
+
+def segment_order(path: Path, seg_name: str) -> Tuple[int, int]:
+    """Clave de orden de un segmento por nombre (el activo va al final)."""
+    m = _seg_re(Path(path)).match(seg_name)
+    return (0, int(m.group(1))) if m else (1, 0)
+
+
+def open_segment(seg: Path) -> IO[bytes]:
+    return gzip.open(seg, "rb") if seg.name.endswith(".gz") else open(seg, "rb")
+
+
+def iter_lines(path: Path, start: Optional[Tuple[str, int]] = None) -> Iterator[Tuple[Path, int, bytes]]:
+    """Recorre (segmento, offset, línea) de todos los segmentos en orden.
+    start=(nombre_segmento, offset) reanuda desde ese punto. Solo entrega
+    líneas completas (terminadas en '\\n')."""
+    path = Path(path)
+    segs = segments(path)
+    if start is not None:
+        orden = segment_order(path, start[0])
+        segs = [s for s in segs if segment_order(path, s.name) >= orden]
+    for seg in segs:
+        off = start[1] if (start is not None and seg.name == start[0]) else 0
+        try:
+            f = open_segment(seg)
+        except FileNotFoundError:
+            continue  # compactado/rotado mientras leíamos
+        with f:
+            if off:
+                f.seek(off)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                yield seg, off, line
+                off += len(line)
+
+
+def iter_entries(path: Path) -> Iterator[dict]:
+    for _, _, line in iter_lines(path):
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+# ------------------ Rotación ------------------
+
+def should_rotate(path: Path, opened_at: float, size: Optional[int] = None) -> bool:
+    if size is None:
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return False
+    if size <= 0:
+        return False
+    if _ROTATE_BYTES and size >= _ROTATE_BYTES:
+        return True
+    return bool(_ROTATE_S) and time.time() - opened_at >= _ROTATE_S
+
+
+def next_seq(path: Path) -> int:
+    """Número que recibirá el segmento activo cuando se rote."""
+    rx = _seg_re(path)
+    segs = closed_segments(path)
+    return int(rx.match(segs[-1].name).group(1)) + 1 if segs else 1
+
+
+def _seg_path(path: Path, seq: int) -> Path:
+    stem = path.name[:-len(".ndjson")]
+    return path.with_name(f"{stem}.{seq:0{_SEQ_WIDTH}d}.ndjson")
+
+
+def compress_segment(seg: Path) -> Path:
+    gz = seg.with_name(seg.name + ".gz")
+    tmp = gz.with_name(gz.name + ".tmp")
+    with open(seg, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        while True:
+            chunk = src.read(1 << 20)
+            if not chunk:
+                break
+            dst.write(chunk)
+    os.replace(tmp, gz)
+    os.unlink(seg)
+    return gz
+
+
+def rotate(path: Path, compress: bool = _COMPRESS) -> Optional[Path]:
+    """Cierra el segmento activo. Devuelve la ruta del segmento cerrado."""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    closed = _seg_path(path, next_seq(path))
+    os.replace(path, closed)
+    if compress:
+        closed = compress_segment(closed)
+    return closed
+
+
+# ------------------ Compactación ------------------
+
+def needs_compaction(path: Path) -> bool:
+    path = Path(path)
+    if not _COMPACT_AFTER or path.name[:-len(".ndjson")] in _COMPACT_SKIP:
+        return False
+    return len(closed_segments(path)) > _COMPACT_AFTER
+
+
+def compact(path: Path, compress: bool = _COMPRESS,
+            swap_lock: Optional[Callable[[], ContextManager]] = None) -> Optional[Path]:
+    """Funde todos los segmentos cerrados en uno con el último estado por folio.
+    El resultado recibe un número nuevo (el siguiente), así el orden se
+    mantiene, el segmento activo no se toca y ningún número cambia de contenido.
+
+    Se lee en streaming, en dos pasadas (la primera solo guarda la posición
+    de la última línea de cada folio), hacia un temporal; swap_lock (el lock
+    de escritura del log) se toma únicamente para publicarlo. Si mientras
+    tanto se rotó un segmento, se descarta el temporal y devuelve None: el
+    compactado quedaría después de datos más nuevos."""
+    path = Path(path)
+    segs = closed_segments(path)
+    if len(segs) < 2:
+        return None
+
+    ultima = {}  # folio -> posición de su última línea
+    for pos, folio, _ in _lineas_con_folio(segs):
+        if folio:
+            ultima[folio] = pos
+
+    tmp = path.with_name(path.name[:-len(".ndjson")] + ".compactando.tmp")
+    with open(tmp, "wb") as raw:
+        f = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compress else raw
+        try:
+            for pos, folio, line in _lineas_con_folio(segs):
+                if not folio or ultima.get(folio) == pos:
+                    f.write(line)
+        finally:
+            if f is not raw:
+                f.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    del ultima
+
+    with (swap_lock() if swap_lock else contextlib.nullcontext()):
+        if closed_segments(path) != segs:
+            os.unlink(tmp)
+            return None
+        destino = _seg_path(path, next_seq(path))
+        if compress:
+            destino = destino.with_name(destino.name + ".gz")
+        # Primero aparece el compactado; luego se borran los fundidos.
+        # Si algo falla a la mitad quedan líneas repetidas, nunca perdidas.
+        os.replace(tmp, destino)
+        for seg in segs:
+            if seg.exists():
+                os.unlink(seg)
+    return destino
+
+
+def _lineas_con_folio(segs: List[Path]) -> Iterator[Tuple[int, Optional[str], bytes]]:
+    pos = 0
+    for seg in segs:
+        with open_segment(seg) as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    continue
+                pos += 1
+                try:
+                    folio = json.loads(line).get("folio")
+                except (ValueError, AttributeError):
+                    folio = None
+                yield pos, folio, line
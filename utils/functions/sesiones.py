@@ -0,0 +1,189 @@
+# utils/functions/sesiones.py
+"""
+Almacén de sesiones de conversación (Context) compartible entre procesos.
+
+- El Context se serializa compacto: JSON sin espacios y, si pasa de
+  _ZLIB_MIN_BYTES, comprimido con zlib (el listado de grupos de inscripción
+  es lo que más pesa).
+- Backends:
+    * MemoryBackend: dict en el proceso (un solo worker, pruebas). Purga
+      las expiradas cada _PURGE_EVERY escrituras y guarda como mucho
+      SAES_SESSION_MAX sesiones: al llenarse descarta la menos reciente.
+    * SqliteBackend: archivo SQLite en modo WAL, compartido por todos los
+      workers de la máquina. Una conexión por hilo.
+API:
+    - dump_context(ctx) -> bytes / load_context(blob) -> Context
+    - get_backend() -> SessionBackend (singleton, según SAES_SESSION_BACKEND)
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from utils.automata import Context
+
+_SESSION_DB = Path(os.environ.get(
+    "SAES_SESSION_DB",
+    Path(__file__).resolve().parents[2] / "resources" / "sessions" / "sessions.db",
+))
+_SESSION_TTL_S = int(os.environ.get("SAES_SESSION_TTL_S", 4 * 3600))
+_SESSION_MAX = int(os.environ.get("SAES_SESSION_MAX", 100_000))
+_ZLIB_MIN_BYTES = 512
+
+# Prefijo de un byte para saber cómo decodificar
+_RAW = b"j"
+_ZIP = b"z"
+
+
+# ------------------ Serialización ------------------
+
+def dump_context(ctx: Context) -> bytes:
+    data = dict(ctx)
+    data["__state__"] = ctx.state
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= _ZLIB_MIN_BYTES:
+        return _ZIP + zlib.compress(raw, 6)
+    return _RAW + raw
+
+
+def load_context(blob: Optional[bytes]) -> Context:
+    ctx = Context()
+    if not blob:
+        return ctx
+    try:
+        raw = zlib.decompress(blob[1:]) if blob[:1] == _ZIP else blob[1:]
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return ctx  # sesión corrupta: empezamos de cero
+    state = data.pop("__state__", None) or data.get("state") or "START"
+    ctx.update(data)
+    ctx.state = state
+    return ctx
+
+
+# ------------------ Backends ------------------
+
+class SessionBackend(ABC):
+    @abstractmethod
+    def get(self, sid: str) -> Optional[Context]:
+        """Context guardado, o None si no existe o expiró."""
+
+    @abstractmethod
+    def put(self, sid: str, ctx: Context) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, sid: str) -> None:
+        ...
+
+
+class MemoryBackend(SessionBackend):
+    _PURGE_EVERY = 1000  # escrituras entre purgas de sesiones expiradas
+
+    def __init__(self, ttl_s: int = _SESSION_TTL_S, max_sesiones: int = _SESSION_MAX) -> None:
+        self.ttl_s = ttl_s
+        self.max_sesiones = max_sesiones
+        self._lock = threading.Lock()
+        # sid -> (blob, actualizada), de la menos a la más recientemente escrita
+        self._data: OrderedDict[str, Tuple[bytes, float]] = OrderedDict()
+        self._writes = 0
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+        if item is None or time.time() - item[1] > self.ttl_s:
+            return None
+        return load_context(item[0])
+
+    def put(self, sid, ctx):
+        blob = dump_context(ctx)
+        now = time.time()
+        with self._lock:
+            self._data[sid] = (blob, now)
+            self._data.move_to_end(sid)
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._purgar(now)
+            while len(self._data) > self.max_sesiones:
+                self._data.popitem(last=False)
+
+    def _purgar(self, now: float) -> None:
+        # En orden de escritura: las expiradas están todas al principio
+        limite = now - self.ttl_s
+        while self._data:
+            sid, (_, updated) = next(iter(self._data.items()))
+            if updated >= limite:
+                break
+            del self._data[sid]
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SqliteBackend(SessionBackend):
+    """Sesiones en SQLite (WAL): lecturas concurrentes y escrituras cortas entre procesos."""
+
+    _PURGE_EVERY = 1000  # escrituras entre purgas de sesiones expiradas
+
+    def __init__(self, path: Path = _SESSION_DB, ttl_s: int = _SESSION_TTL_S) -> None:
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self._local = threading.local()
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS sesiones ("
+                     " sid TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sesiones_updated ON sesiones(updated)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT data, updated FROM sesiones WHERE sid = ?", (sid,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_s:
+            return None
+        return load_context(row[0])
+
+    def put(self, sid, ctx):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO sesiones (sid, data, updated) VALUES (?, ?, ?)",
+                     (sid, dump_context(ctx), time.time()))
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sesiones WHERE updated < ?", (time.time() - self.ttl_s,))
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM sesiones WHERE sid = ?", (sid,))
+
+
+# ------------------ Singleton ------------------
+_BACKEND: Optional[SessionBackend] = None
+_BACKEND_LOCK = threading.Lock()
+
+def get_backend() -> SessionBackend:
+    """'memory' (por defecto) o 'sqlite' según SAES_SESSION_BACKEND."""
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                kind = os.environ.get("SAES_SESSION_BACKEND", "memory").strip().lower()
+                _BACKEND = SqliteBackend() if kind == "sqlite" else MemoryBackend()
+    return _BACKEND
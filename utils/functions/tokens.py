@@ -0,0 +1,153 @@
+# utils/functions/tokens.py
+"""
+Sesión en un token firmado (SAES_SESSION_TOKENS=1): cualquier worker atiende
+cualquier petición sin buscar la sesión en un almacén compartido.
+
+Formato:  <payload base64url>.<HMAC-SHA256 base64url>
+    payload = {"v": 1, "i": sid, "x": expira (epoch s), "g": 0|1, "c": {campos}}
+
+- En el token va solo lo chico y estable del Context: user, auth_ok, el
+  estado del autómata y los contadores de intentos fallidos del login
+  (_CAMPOS). Lo demás (flujo de inscripción, dictamen pendiente...) se
+  guarda en el backend de sesiones (utils.functions.sesiones) bajo el sid
+  del token, y "g" dice si hay algo guardado: sin flujo en curso no se toca
+  el almacén, ni para leer ni para escribir.
+- Se firma con el primer secreto de SAES_TOKEN_SECRET (lista separada por
+  comas) y se acepta cualquiera de ellos: para rotar, se agrega el nuevo al
+  frente y se quita el viejo cuando ya expiraron sus tokens. Sin secreto se
+  genera uno por proceso (solo sirve con un worker) y se avisa.
+- Expira a los SAES_TOKEN_TTL_S segundos; cada respuesta trae uno nuevo
+  (expiración deslizante). Firma inválida, token vencido o versión distinta:
+  sesión nueva.
+- Sin estado no hay revocación: "cerrar sesion" emite un token sin usuario,
+  pero el anterior sigue siendo válido hasta que expira. Por lo mismo, el
+  conteo de fallos por sesión se puede reiniciar reenviando un token viejo;
+  la espera por boleta (utils.functions.credenciales) no depende del token.
+API:
+    - get_tokens() -> SesionesToken
+    - SesionesToken.cargar(token) -> (sid, ctx, con_flujo)
+    - SesionesToken.guardar(sid, ctx, con_flujo) -> token
+    - SesionesToken.sid_de(token) -> sid | None   (solo si la firma es válida)
+"""
+
+from __future__ import annotations
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.automata import Context
+from utils.functions.sesiones import SessionBackend, get_backend
+
+_TTL_S = int(os.environ.get("SAES_TOKEN_TTL_S", 4 * 3600))
+_VERSION = 1
+
+# Parte estable del Context que viaja en el token
+_CAMPOS = ("user", "auth_ok", "state", "auth_fallos", "auth_espera_hasta")
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def _secretos() -> List[bytes]:
+    crudos = [s.strip() for s in os.environ.get("SAES_TOKEN_SECRET", "").split(",") if s.strip()]
+    if not crudos:
+        print("[tokens] SAES_TOKEN_SECRET no está definido: se usa un secreto de este "
+              "proceso, los tokens no sirven en otros workers ni tras reiniciar")
+        return [secrets.token_bytes(32)]
+    return [s.encode("utf-8") for s in crudos]
+
+
+class SesionesToken:
+    def __init__(self, backend: SessionBackend, secretos: List[bytes], ttl_s: int = _TTL_S) -> None:
+        if not secretos:
+            raise ValueError("Se necesita al menos un secreto")
+        self.backend = backend
+        self.secretos = list(secretos)
+        self.ttl_s = ttl_s
+
+    # ---- Firma ----
+    def _firma(self, payload: bytes, secreto: bytes) -> bytes:
+        return hmac.new(secreto, payload, hashlib.sha256).digest()
+
+    def _emitir(self, datos: dict) -> str:
+        payload = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return _b64(payload) + "." + _b64(self._firma(payload, self.secretos[0]))
+
+    def _abrir(self, token: Optional[str]) -> Optional[dict]:
+        """Payload del token si la firma es de alguno de los secretos y no ha
+        expirado; None si no."""
+        if not token or token.count(".") != 1:
+            return None
+        try:
+            crudo, firma = (_unb64(p) for p in token.split("."))
+        except (ValueError, TypeError):
+            return None
+        if not any(hmac.compare_digest(firma, self._firma(crudo, s)) for s in self.secretos):
+            return None
+        try:
+            datos = json.loads(crudo.decode("utf-8"))
+        except ValueError:
+            return None
+        if (not isinstance(datos, dict) or datos.get("v") != _VERSION
+                or not isinstance(datos.get("c"), dict) or not datos.get("i")
+                or not isinstance(datos.get("x"), (int, float)) or datos["x"] < time.time()):
+            return None
+        return datos
+
+    # ---- Sesión ----
+    def sid_de(self, token: Optional[str]) -> Optional[str]:
+        datos = self._abrir(token)
+        return datos["i"] if datos else None
+
+    def cargar(self, token: Optional[str]) -> Tuple[str, Context, bool]:
+        """(sid, ctx, con_flujo). Token inválido o vencido: sesión nueva."""
+        datos = self._abrir(token)
+        if datos is None:
+            return secrets.token_urlsafe(18), Context(), False
+        sid = datos["i"]
+        ctx = Context()
+        con_flujo = bool(datos.get("g"))
+        if con_flujo:
+            guardado = self.backend.get(sid)
+            if guardado is not None:
+                ctx.update(guardado)
+        ctx.update({k: v for k, v in datos["c"].items() if k in _CAMPOS})
+        ctx.state = ctx.get("state") or "START"
+        return sid, ctx, con_flujo
+
+    def guardar(self, sid: str, ctx: Context, con_flujo: bool) -> str:
+        """Guarda el flujo (si hay, o lo borra si ya no hay) y devuelve el token nuevo."""
+        estable: Dict[str, object] = {k: ctx[k] for k in _CAMPOS if k in ctx}
+        estable["state"] = ctx.state
+        flujo = Context({k: v for k, v in ctx.items() if k not in _CAMPOS})
+        if flujo:
+            flujo.state = ctx.state
+            self.backend.put(sid, flujo)
+        elif con_flujo:
+            self.backend.delete(sid)
+        return self._emitir({"v": _VERSION, "i": sid, "x": int(time.time()) + self.ttl_s,
+                             "g": 1 if flujo else 0, "c": estable})
+
+
+# ------------------ Singleton ------------------
+_TOKENS: Optional[SesionesToken] = None
+_TOKENS_LOCK = threading.Lock()
+
+def get_tokens() -> SesionesToken:
+    global _TOKENS
+    if _TOKENS is None:
+        with _TOKENS_LOCK:
+            if _TOKENS is None:
+                _TOKENS = SesionesToken(get_backend(), _secretos())
+    return _TOKENS
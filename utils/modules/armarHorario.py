@@ -0,0 +1,87 @@
+# utils/modules/armarHorario.py
+import re
+
+from utils.functions.planeador import armar_horarios
+from utils.functions.periodos import get_calendario
+from utils.functions.reprobadas import get_reprobadas
+
+_TOP_N = 3
+
+# ------------------ Utilidades ------------------
+
+_MATERIA_ID_RE = re.compile(r"\b([A-Za-z]{3}\d{3})\b")
+
+
+def _turnos_de(text: str):
+    t = (text or "").lower()
+    turnos = []
+    if re.search(r"\b(matutino|turno\s*[:=]?\s*m)\b", t):
+        turnos.append("matutino")
+    if re.search(r"\b(vespertino|turno\s*[:=]?\s*v)\b", t):
+        turnos.append("vespertino")
+    return turnos
+
+
+def _materias_reprobadas(boleta: str):
+    """materia_id de las materias reprobadas del kardex (análisis compartido con ETS)."""
+    return [m["materia_id"] for m in get_reprobadas().de(boleta).reprobadas if m["materia_id"]]
+
+
+def _render_horarios(horarios, info, materias, turnos) -> str:
+    out = []
+    out.append("HORARIOS SUGERIDOS")
+    out.append("=" * 40)
+    out.append(f"Materias: {', '.join(materias)}")
+    if turnos:
+        out.append(f"Turno preferido: {', '.join(t.capitalize() for t in turnos)}")
+    if info.get("sin_opciones"):
+        out.append(f"Sin grupos con cupo (o sin empalme) para: {', '.join(info['sin_opciones'])}")
+    for mid, pre in sorted(info.get("sin_prerrequisitos", {}).items()):
+        out.append(f"No puedes cursar {mid}: primero aprueba {', '.join(pre)}")
+    out.append("")
+
+    if not horarios:
+        out.append("No encontré una combinación de grupos sin empalmes.")
+    for i, h in enumerate(horarios, 1):
+        out.append(f"Opción {i} | Horas muertas: {h.huecos} | Cupo mínimo: {h.cupo}"
+                   + (f" | Fuera de turno: {h.fuera_turno}" if h.fuera_turno else ""))
+        out.append("-" * 40)
+        for row in sorted(h.secciones, key=lambda r: r.get("materia_id", "")):
+            out.append(f"  {row.get('materia_id', '')} {row.get('nombre_materia', '')}")
+            out.append(f"     {row.get('grupo_id', '')}: {row.get('profesor', '')} | "
+                       f"{row.get('horario', '')} ({row.get('modalidad', '')})")
+        out.append("")
+
+    if not info.get("completo", True):
+        out.append("(Búsqueda recortada por tiempo: se muestran las mejores encontradas)")
+    out.append("Puedes pedir otras materias:  armar horario MAT101 MAT103 turno M")
+    return "\n".join(out)
+
+# ------------------ Disparadores / RE ------------------
+
+ARMAR_HORARIO_RE = r"\b(armar|arma|armame|generar|genera|sugerir|sugiere|proponer|propon|buscar|busca)\s+(un\s+|mi\s+)?horarios?\b"
+
+# ------------------ Handler ------------------
+
+def handle(ctx, text):
+    if not ctx.get("auth_ok"):
+        return "Primero inicia sesión."
+
+    boleta = str(ctx.get("user", "")).strip()
+    materias = [m.upper() for m in _MATERIA_ID_RE.findall(text or "")]
+    if not materias:
+        materias = _materias_reprobadas(boleta)
+        if not materias:
+            return ("No tienes materias reprobadas con grupos en el periodo actual.\n"
+                    "Indica las materias que quieres cursar, por ejemplo:\n"
+                    "  armar horario MAT101 MAT103 turno M")
+
+    turnos = _turnos_de(text)
+    horarios, info = armar_horarios(materias, turnos=turnos, boleta=boleta,
+                                    periodo=get_calendario().actual(), top_n=_TOP_N)
+    return _render_horarios(horarios, info, materias, turnos)
+
+
+# Mantener el estado de autenticado
+NEXT_STATE = "AUTH_OK"
+ALLOWED_STATES = {"AUTH_OK"}
@@ -1,8 +1,13 @@
 # utils/modules/cerrarSesion.py
 SALIR_RE = r"\b(cerrar\s+sesion|logout|salir|terminar)\b"
 
+# Se conservan al cerrar sesión: cerrar y volver a entrar no reinicia la espera
+_CONSERVAR = ("auth_fallos", "auth_espera_hasta")
+
 def handle(ctx, text):
+    conservar = {k: ctx[k] for k in _CONSERVAR if k in ctx}
     ctx.clear()
+    ctx.update(conservar)
     ctx["state"] = "START"
     # si usas atributo:
     try:
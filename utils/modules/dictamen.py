@@ -1,10 +1,16 @@
 # utils/modules/dictamen.py
 import re
-import csv
-import json
+import threading
 from datetime import datetime
 from pathlib import Path
 
+from utils.functions.eventlog import get_writer
+from utils.functions.folios import nuevo_folio
+from utils.functions.logstore import get_store
+from utils.functions.adeudos import get_adeudos, render_bloqueo
+from utils.functions.periodos import get_calendario
+from utils.functions.reprobadas import get_reprobadas
+
 # ------------------ Configuración de datos ------------------
 
 
@@ -15,91 +21,108 @@ _KARDEX_CSV = Path(__file__).resolve().parents[2] / "resources" / "data" / "kard
 _LOGS_DIR = Path(__file__).resolve().parents[2] / "resources" / "logs"
 _DICTAMEN_LOG = _LOGS_DIR / "dictamen.ndjson"
 
-# Caché simple en memoria
-_KARDEX_CACHE = None
-
-# Periodo actual (ajústalo si lo manejas en otro lado)
-_PERIODO_ACTUAL = "2025-1"
-
+# Una solicitud abierta por (boleta, materia, periodo): mientras esté
+# "pendiente" una carta nueva la actualiza; en revisión ya no se toca.
+_ESTATUS_ABIERTOS = ("pendiente", "en_revision")
+_ESTATUS_ACTUALIZABLES = ("pendiente",)
+# Locks por franja (hash de la clave): memoria fija sin importar cuántas claves
+_SOLICITUD_LOCKS = tuple(threading.Lock() for _ in range(64))
 
 # ------------------ Utilidades de carga ------------------
 
-def _load_kardex():
-    """Carga el CSV del kardex y lo deja en caché. Devuelve (rows, has_boleta)."""
-    global _KARDEX_CACHE
-    if _KARDEX_CACHE is not None:
-        return _KARDEX_CACHE
-
-    rows = []
-    has_boleta = False
-    try:
-        with open(_KARDEX_CSV, "r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f)
-            for raw in reader:
-                row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
-                rows.append(row)
-            if rows:
-                has_boleta = "boleta" in rows[0]
-    except FileNotFoundError:
-        rows = []
-        has_boleta = False
-
-    _KARDEX_CACHE = (rows, has_boleta)
-    return _KARDEX_CACHE
-
-
 def _datos_disponibles():
-    kardex, _ = _load_kardex()
-    if not kardex:
+    hay_kardex, _ = get_reprobadas().kardex()
+    if not hay_kardex:
         return (False, f"No encuentro el archivo de kardex: '{_KARDEX_CSV}'")
     return (True, None)
 
 
 # ------------------ Lógica de dictamen ------------------
 
-def _calcular_diferencia_semestres(semestre_reprobado, semestre_actual=_PERIODO_ACTUAL):
-    """Calcula la diferencia en semestres entre cuando se reprobó y el semestre actual.
-    Formato esperado: 'YYYY-1' o 'YYYY-2'."""
-    try:
-        a_r, p_r = semestre_reprobado.split("-")
-        a_r = int(a_r); p_r = int(p_r)
-
-        a_a, p_a = semestre_actual.split("-")
-        a_a = int(a_a); p_a = int(p_a)
-
-        return (a_a * 2 + p_a) - (a_r * 2 + p_r)
-    except Exception:
-        return 0  # Si no se puede parsear, consideramos que es reciente
-
-
-def _encontrar_materias_dictamen(kardex_usuario):
-    """Devuelve lista de materias reprobadas que requieren dictamen (>3 semestres)."""
-    res = []
-    for r in kardex_usuario:
-        calif_s = r.get("calificacion", "").strip()
-        if not calif_s:
-            continue
-        try:
-            calif = float(calif_s)
-        except ValueError:
-            continue
-        if calif >= 6:
-            continue
-
-        semestre = r.get("semestre", "")
-        semestres_transcurridos = _calcular_diferencia_semestres(semestre)
-        if semestres_transcurridos > 3:
-            info = r.copy()
-            info["semestres_transcurridos"] = semestres_transcurridos
-            res.append(info)
-    return res
-
-
-def _append_dictamen_log(entry: dict):
-    """Agrega una línea NDJSON al archivo de dictamen."""
-    _LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    with open(_DICTAMEN_LOG, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+def _encontrar_materias_dictamen(boleta):
+    """Materias reprobadas que requieren dictamen (>3 semestres), del análisis
+    compartido con ETS. Sin los grupos de recuperación: esto se guarda en la
+    sesión y ahí solo se necesita la materia."""
+    return [{k: v for k, v in m.items() if k != "grupos"}
+            for m in get_reprobadas().de(boleta).dictamen]
+
+
+def _ultimas_versiones(entradas):
+    """Una entrada por folio (la última escrita), en el orden en que apareció cada folio."""
+    por_folio = {}
+    for e in entradas:
+        if e.get("tipo") == "solicitud_dictamen" and e.get("folio"):
+            por_folio[e["folio"]] = e  # dict conserva el orden de la primera aparición
+    return list(por_folio.values())
+
+
+def _solicitudes_abiertas(boleta: str, materia: str, periodo: str):
+    """Solicitudes abiertas de la boleta para esa materia y periodo (índice
+    compuesto del log), la más antigua primero."""
+    entradas = get_store(_DICTAMEN_LOG).by_keys(boleta=boleta, materia=materia, periodo_actual=periodo)
+    return [e for e in _ultimas_versiones(entradas) if e.get("estatus") in _ESTATUS_ABIERTOS]
+
+
+def _lock_solicitud(clave):
+    return _SOLICITUD_LOCKS[hash(clave) % len(_SOLICITUD_LOCKS)]
+
+
+def _registrar_carta(boleta: str, pending: dict, carta: str):
+    """Registra la carta sin duplicar solicitudes. Devuelve (accion, entrada):
+    "nueva", "actualizada", "sin_cambios" o "en_tramite" (abierta y ya no
+    actualizable: no se escribe nada). OSError si no se pudo escribir."""
+    periodo = get_calendario().actual()
+    materia = pending.get("materia", "desconocida")
+    # El lock del proceso ordena a los hilos; el del log (entre procesos)
+    # garantiza que nadie escriba entre la consulta y la escritura
+    with _lock_solicitud((boleta, _normaliza(materia), periodo)), \
+            get_writer(_DICTAMEN_LOG).exclusivo() as escribir:
+        abiertas = _solicitudes_abiertas(boleta, materia, periodo)
+        now = datetime.now().isoformat(timespec="seconds")
+        if abiertas:
+            vigente = abiertas[0]
+            if vigente.get("estatus") not in _ESTATUS_ACTUALIZABLES:
+                return "en_tramite", vigente
+            if vigente.get("carta_motivos") == carta:
+                return "sin_cambios", vigente
+            entrada = dict(vigente)
+            entrada.update({
+                "carta_motivos": carta,
+                "ts_actualizacion": now,
+                "actualizaciones": int(vigente.get("actualizaciones", 0)) + 1,
+            })
+            accion = "actualizada"
+        else:
+            entrada = {
+                "folio": nuevo_folio("DIC"),
+                "ts": now,
+                "periodo_actual": periodo,
+                "boleta": boleta,
+                "materia": materia,
+                "semestre_cursado": pending.get("semestre", ""),
+                "calificacion": pending.get("calificacion", ""),
+                "grupo_original": pending.get("grupo", ""),
+                "profesor_original": pending.get("profesor", ""),
+                "semestres_transcurridos": pending.get("semestres_transcurridos", 0),
+                "tipo": "solicitud_dictamen",
+                "carta_motivos": carta,
+                "estatus": "pendiente"
+            }
+            accion = "nueva"
+        escribir(entrada)
+    return accion, entrada
+
+
+def _render_mis_solicitudes(boleta: str) -> str:
+    solicitudes = _ultimas_versiones(get_store(_DICTAMEN_LOG).by_boleta(boleta))
+    if not solicitudes:
+        return "No tienes solicitudes de dictamen registradas."
+    out = ["TUS SOLICITUDES DE DICTAMEN", "=" * 30]
+    for e in reversed(solicitudes):
+        actualizada = f" | Actualizada: {e['ts_actualizacion']}" if e.get("ts_actualizacion") else ""
+        out.append(f"- {e.get('folio','')} | {e.get('ts','')} | {e.get('materia','')} "
+                   f"| Estatus: {e.get('estatus','')}{actualizada}")
+    return "\n".join(out)
 
 
 def _normaliza(s: str) -> str:
@@ -135,18 +158,33 @@ DICTAMEN_CARTA_RE = r"""
 """
 
 
+# 4) Consultar solicitudes ya enviadas: "mis solicitudes de dictamen"
+DICTAMEN_MIS_RE = r"""
+\b(
+    mis\s+(?:solicitudes\s+de\s+)?dictamen(?:es)?
+  | (?:estatus|estado|seguimiento)\s+(?:de\s+)?(?:mi\s+|mis\s+)?dictamen(?:es)?
+)\b
+"""
+
+
 # ------------------ Handler ------------------
 
 def handle(ctx, text):
     if not ctx.get("auth_ok"):
         return "Primero inicia sesión."
 
+    # La solicitud de dictamen es un trámite: con adeudos no se registra
+    m_carta = re.search(DICTAMEN_CARTA_RE, text, flags=re.I | re.X)
+    adeudos = get_adeudos().de(str(ctx.get("user", "")).strip()) if m_carta else None
+    if adeudos:
+        return render_bloqueo(adeudos, "solicitar dictamen")
+
     # Asegurar datos
     ok, err = _datos_disponibles()
     if not ok:
         return err
 
-    kardex, has_boleta = _load_kardex()
+    _, has_boleta = get_reprobadas().kardex()
     if not has_boleta:
         return ("El archivo de kardex no tiene columna 'boleta'. "
                 "No puedo identificar tus materias específicas.")
@@ -155,14 +193,11 @@ def handle(ctx, text):
     if not boleta:
         return "Primero necesito tu boleta (inicia sesión)."
 
-    # Filtrar kardex del usuario
-    kuser = [r for r in kardex if _normaliza(r.get("boleta")) == _normaliza(boleta)]
-    if not kuser:
+    if not get_reprobadas().de(boleta).cursadas:
         return (f"No encontré tu historial académico (boleta {boleta}). "
                 "Verifica con servicios escolares.")
 
     # 3) Si el usuario envió una carta y ya hay una materia seleccionada:
-    m_carta = re.search(DICTAMEN_CARTA_RE, text, flags=re.I | re.X)
     if m_carta:
         pending = ctx.get("dictamen_selected")
         if not pending:
@@ -172,27 +207,10 @@ def handle(ctx, text):
         if not carta:
             return "Tu carta está vacía. Intenta de nuevo con: 'carta: <tu texto>'."
 
-        # Construimos entrada
-        now = datetime.now().isoformat(timespec="seconds")
-        folio = f"DIC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        entrada = {
-            "folio": folio,
-            "ts": now,
-            "periodo_actual": _PERIODO_ACTUAL,
-            "boleta": boleta,
-            "materia": pending.get("materia", "desconocida"),
-            "semestre_cursado": pending.get("semestre", ""),
-            "calificacion": pending.get("calificacion", ""),
-            "grupo_original": pending.get("grupo", ""),
-            "profesor_original": pending.get("profesor", ""),
-            "semestres_transcurridos": pending.get("semestres_transcurridos", 0),
-            "tipo": "solicitud_dictamen",
-            "carta_motivos": carta,
-            "estatus": "pendiente"
-        }
-
+        # Una sola solicitud abierta por materia y periodo: la carta repetida
+        # actualiza el folio vigente o se rechaza con su estatus
         try:
-            _append_dictamen_log(entrada)
+            accion, entrada = _registrar_carta(boleta, pending, carta)
         except Exception as e:
             return f"Ocurrió un error al guardar tu carta: {e}"
 
@@ -200,18 +218,36 @@ def handle(ctx, text):
         ctx.pop("dictamen_selected", None)
         ctx.pop("dictamen_opciones", None)
 
-        return (f"¡Listo! Registré tu carta de dictamen para '{entrada['materia']}'.\n"
+        folio, materia, estatus = entrada.get("folio", ""), entrada.get("materia", ""), entrada.get("estatus", "")
+        if accion == "en_tramite":
+            return (f"Ya tienes una solicitud de dictamen para '{materia}'.\n"
+                    f"Folio: {folio} | Estatus: {estatus}\n"
+                    "Servicios escolares ya la está revisando, así que no se puede modificar.\n"
+                    "Consulta su avance con: 'mis solicitudes de dictamen'.")
+        if accion == "sin_cambios":
+            return (f"Esa carta ya está registrada en tu solicitud para '{materia}'.\n"
+                    f"Folio: {folio} | Estatus: {estatus}\n"
+                    "No hice cambios. ¿Necesitas algo más?")
+        if accion == "actualizada":
+            return (f"Ya tenías una solicitud abierta para '{materia}': actualicé su carta.\n"
+                    f"Folio: {folio} | Estatus: {estatus}\n"
+                    "Servicios escolares revisarán la versión más reciente. ¿Necesitas algo más?")
+        return (f"¡Listo! Registré tu carta de dictamen para '{materia}'.\n"
                 f"Folio: {folio}\n"
                 f"Archivo: {str(_DICTAMEN_LOG)}\n"
                 "Servicios escolares revisarán tu solicitud. ¿Necesitas algo más?")
 
+    # 4) Consulta de solicitudes enviadas (no requiere recorrer el log)
+    if re.search(DICTAMEN_MIS_RE, _normaliza(text), flags=re.I | re.X):
+        return _render_mis_solicitudes(boleta)
+
     # 2) Si pidió seleccionar materia: "dictamen 2" o "dictamen Nombre Materia"
     m_sel = re.search(DICTAMEN_SELECT_RE, text, flags=re.I | re.X)
     if m_sel:
         # Asegurar que ya listamos opciones antes; si no, las generamos
         opciones = ctx.get("dictamen_opciones")
         if not opciones:
-            opciones = _encontrar_materias_dictamen(kuser)
+            opciones = _encontrar_materias_dictamen(boleta)
             ctx["dictamen_opciones"] = opciones
 
         if not opciones:
@@ -257,7 +293,7 @@ def handle(ctx, text):
 
     # 1) Inicio del flujo: listar materias con dictamen
     # Preparar listado
-    materias_dic = _encontrar_materias_dictamen(kuser)
+    materias_dic = _encontrar_materias_dictamen(boleta)
     if not materias_dic:
         return ("¡Excelente! No tienes materias que requieran dictamen.\n"
                 "Si buscas ETS normales, puedes pedir: 'ets'.")
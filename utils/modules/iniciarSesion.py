@@ -1,5 +1,8 @@
 # utils/modules/iniciarSesion.py
 import re
+import time
+
+from utils.functions.credenciales import KdfOcupado, espera_por_fallos, get_credenciales
 
 # Disparadores para iniciar sesión
 LOGIN_RE = r"""
@@ -18,6 +21,54 @@ USER_RE = r"\b(?:mi\s+usuario\s+es\s+)?(202363\d{4})\b"
 PASS_SENTENCE_RE = r"\bmi\s+contrasena\s+es\s+([A-Za-z0-9@#$%^&*().,;:!_\-]{4,})\b"
 PASS_TOKEN_RE    = r"^\s*([A-Za-z0-9@#$%^&*().,;:!_\-]{4,})\s*$"
 
+# Intentos fallidos de esta sesión (sobreviven a "cerrar sesion")
+_CLAVES_FALLOS = ("auth_fallos", "auth_espera_hasta")
+
+
+def _segundos(espera):
+    return max(1, int(espera + 0.999))
+
+
+def _verificar(ctx, token):
+    """Devuelve la respuesta de un intento de contraseña; marca auth_ok si es correcta."""
+    cred = get_credenciales()
+    user = ctx["user"]
+    # La espera de la sesión primero; la de la boleta reserva el intento
+    espera = ctx.get("auth_espera_hasta", 0) - time.time()
+    if espera <= 0:
+        espera = cred.reservar_intento(user)
+    if espera > 0:
+        return (f"Demasiados intentos fallidos. Espera {_segundos(espera)} s "
+                "antes de volver a intentar.")
+    try:
+        ok = cred.verificar(user, token)
+    except KdfOcupado as e:
+        # No cuenta como fallo: solo se le pide esperar
+        cred.devolver_intento(user)
+        return (f"Estoy verificando muchas contraseñas ahora mismo. Espera {_segundos(e.reintentar_s)} s "
+                "antes de volver a intentar.")
+
+    if ok:
+        cred.exito(user)
+        for k in _CLAVES_FALLOS:
+            ctx.pop(k, None)
+        ctx["auth_ok"] = True
+        ctx.state = ctx["state"] = "AUTH_OK"
+        return ("¡Ya estás adentro1 Pide lo que necesites: "
+                "'ver calificaciones', 'info academica', 'info personal', "
+                "'materias', 'tramites', 'inscripcion' u 'opciones'.")
+
+    espera = cred.fallo(user)
+    fallos = ctx["auth_fallos"] = ctx.get("auth_fallos", 0) + 1
+    espera = max(espera, espera_por_fallos(fallos))
+    if espera > 0:
+        ctx["auth_espera_hasta"] = time.time() + espera
+        return (f"Usuario o contraseña incorrectos. Espera {_segundos(espera)} s "
+                "antes de volver a intentar.")
+    return ("Usuario o contraseña incorrectos. Intenta de nuevo, o escribe otra "
+            "boleta si te equivocaste de usuario.")
+
+
 def handle(ctx, text):
     user = ctx.get("user")
     auth_ok = ctx.get("auth_ok", False)
@@ -43,12 +94,15 @@ def handle(ctx, text):
             if m2:
                 token = m2.group(1)
 
+        # Solo una boleta: se equivocó de usuario
+        m_user = re.fullmatch(r"\s*(202363\d{4})\s*", text)
+        if m_user and not m:
+            ctx["user"] = m_user.group(1)
+            ctx.state = ctx["state"] = "AUTH"
+            return f"Usuario '{ctx['user']}' guardado. Ahora dime tu contraseña."
+
         if token:
-            ctx["auth_ok"] = True
-            ctx.state = ctx["state"] = "AUTH_OK"
-            return ("¡Ya estás adentro1 Pide lo que necesites: "
-                    "'ver calificaciones', 'info academica', 'info personal', "
-                    "'materias', 'tramites', 'inscripcion' u 'opciones'.")
+            return _verificar(ctx, token)
         return ("Ahora dime tu contraseña (puedes escribir solo la contraseña o "
                 "'mi contrasena es <tu_clave>').")
 
@@ -56,6 +110,9 @@ def handle(ctx, text):
     ctx.state = ctx["state"] = "AUTH_OK"
     return ("Hmm, dejame revisarlo. Te recomiendo contactar a nuestro servicio de soporte personalizado: https://web.whatsapp.com/send?phone=+5255123456789")
 
+def warmup():
+    get_credenciales()
+
 # No pisamos el estado desde el autómata; lo controla el handler
 NEXT_STATE = ""
 ALLOWED_STATES = {"START", "AUTH", "AUTH_OK", "END"}
@@ -1,46 +1,22 @@
 # utils/modules/inscripcion.py
 import re
-import csv
-import json
 from datetime import datetime
-from pathlib import Path
 
-# ------------------ Configuración ------------------
-
-_GRUPOS_CSV = Path(__file__).resolve().parents[2] / "resources" / "data" / "grupos.csv"
-
-_LOGS_DIR = Path(__file__).resolve().parents[2] / "resources" / "logs"
-_INSCRIPCIONES_LOG = _LOGS_DIR / "inscripciones.ndjson"
-
-_GRUPOS_CACHE = None
-_PERIODO_ACTUAL = "2025-1"
+from utils.functions.eventlog import get_writer
+from utils.functions.folios import nuevo_folio
+from utils.functions.cupos import get_ledger
+from utils.functions.horarios import get_slots
+from utils.functions.prerrequisitos import get_grafo
+from utils.functions.adeudos import get_adeudos, render_bloqueo
+from utils.functions.espera import get_espera
+from utils.functions.periodos import get_calendario
 
 # ------------------ Utilidades ------------------
 
-def _load_grupos():
-    """Carga el CSV de grupos a caché (keys en minúsculas)."""
-    global _GRUPOS_CACHE
-    if _GRUPOS_CACHE is not None:
-        return _GRUPOS_CACHE
-
-    rows = []
-    try:
-        with open(_GRUPOS_CSV, "r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f)
-            for raw in reader:
-                row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
-                rows.append(row)
-    except FileNotFoundError:
-        rows = []
-
-    _GRUPOS_CACHE = rows
-    return _GRUPOS_CACHE
-
-
 def _datos_disponibles():
-    grupos = _load_grupos()
-    if not grupos:
-        return (False, f"No encuentro el archivo de grupos: '{_GRUPOS_CSV}'")
+    cal = get_calendario()
+    if not cal.grupos():
+        return (False, f"No hay grupos cargados para el periodo {cal.actual() or '(sin calendario)'}.")
     return (True, None)
 
 
@@ -70,18 +46,20 @@ def _int(v, default=0):
 
 
 def _disp(row) -> int:
-    return _int(row.get("capacidad", 0)) - _int(row.get("inscritos", 0))
+    # El cupo vivo está en el ledger (CSV + inscripciones registradas)
+    return get_ledger().disponibles(row.get("grupo_id", ""), row.get("materia_id", ""))
 
 
-def _agrupar_por_grupo_y_turno(grupos_rows, turno_label: str):
+def _agrupar_por_grupo_y_turno(grupos_rows, turno_label: str, boleta: str = ""):
     """
-    Dict { grupo_id: { 'turno':..., 'rows':[...], 'disp_min': int, 'disp_total': int } }
-    Filtra por periodo actual y turno; ordenado por grupo_id.
+    Dict { grupo_id: { 'turno':..., 'rows':[...], 'disp_min': int, 'disp_total': int, 'empalme': bool } }
+    grupos_rows son las filas del periodo actual (índice del calendario); filtra
+    por turno y ordena por grupo_id.
+    'empalme': el grupo choca con lo que el alumno ya tiene apartado en otras materias.
     """
+    get_ledger().al_dia()  # lo que hayan inscrito otros procesos
     agg = {}
     for r in grupos_rows:
-        if r.get("periodo_id", "") != _PERIODO_ACTUAL:
-            continue
         if r.get("turno", "").lower() != turno_label.lower():
             continue
         gid = r.get("grupo_id", "")
@@ -99,9 +77,18 @@ def _agrupar_por_grupo_y_turno(grupos_rows, turno_label: str):
             agg[gid]["rows"].append(r)
             agg[gid]["disp_min"] = min(agg[gid]["disp_min"], disp)
             agg[gid]["disp_total"] += max(disp, 0)
+    for gid, data in agg.items():
+        data["empalme"] = _empalma_con_carga(boleta, gid, data["rows"]) if boleta else False
     return dict(sorted(agg.items(), key=lambda kv: kv[0]))
 
 
+def _empalma_con_carga(boleta: str, gid: str, rows) -> bool:
+    """Un solo AND entre el horario del grupo y la carga actual del alumno."""
+    slots = get_slots()
+    carga = slots.carga(boleta, excluir=[r.get("materia_id", "") for r in rows])
+    return bool(carga and slots.mask(gid) & carga)
+
+
 def _render_listado_turno(agg: dict) -> str:
     if not agg:
         return "No hay grupos disponibles para ese turno en el periodo actual."
@@ -117,7 +104,8 @@ def _render_listado_turno(agg: dict) -> str:
         salon = ejemplo.get("salon", "")
         disp_min = data["disp_min"]
         disp_txt = (str(disp_min)) if disp_min is not None else ("?")
-        out.append(f"- {gid} | {len(rows)} materias | Horario ej.: {horario} ({modalidad}) | Salón ej.: {salon} | Cupo min: {disp_txt}")
+        empalme_txt = " | Empalma con tu horario" if data.get("empalme") else ""
+        out.append(f"- {gid} | {len(rows)} materias | Horario ej.: {horario} ({modalidad}) | Salón ej.: {salon} | Cupo min: {disp_txt}{empalme_txt}")
     out.append("")
     out.append("Indica el grupo con:  grupo: 3CV2")
     out.append("Para cambiar de turno:  turno: M   o   turno: V")
@@ -125,10 +113,56 @@ def _render_listado_turno(agg: dict) -> str:
     return "\n".join(out)
 
 
+_MSG_SIN_REGISTRO = "No pude registrar el movimiento en este momento; no se hizo ningún cambio. Intenta de nuevo."
+
+
 def _append_inscripcion_log(entry: dict):
-    _LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    with open(_INSCRIPCIONES_LOG, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    # Se encola; el hilo del escritor lo baja a disco en lote. Mismo log que el ledger.
+    log = get_ledger().log_path
+    if log is not None:
+        get_writer(log).append(entry)
+
+
+def _render_espera(boleta: str) -> str:
+    posiciones = get_espera().posiciones(boleta)
+    inscritas = get_ledger().materias_de(boleta)
+    out = []
+    if posiciones:
+        out.append("Tu lista de espera:")
+        for gid, pos in posiciones.items():
+            out.append(f"- {gid}: posición {pos}")
+    else:
+        out.append("No estás en ninguna lista de espera.")
+    if inscritas:
+        grupos = sorted(set(inscritas.values()))
+        out.append(f"Grupos inscritos: {', '.join(grupos)}")
+    return "\n".join(out)
+
+
+def _dar_de_baja(ctx, grupos_rows, gid: str) -> str:
+    rows = _buscar_grupo_en_todos(grupos_rows, gid)
+    turno_label = (rows[0].get("turno") or "").strip() if rows else ""
+    folios = []
+
+    def registrar(detalle):
+        propias = set(detalle.get("materias", []))
+        entry = _entrada(ctx, turno_label, gid, "baja",
+                         materias_rows=[r for r in rows if r.get("materia_id", "") in propias])
+        folios.append(entry["folio"])
+        return entry
+
+    try:
+        resultado, _ = get_ledger().liberar_grupo(_boleta(ctx), gid, registrar=registrar)
+    except OSError:
+        return _MSG_SIN_REGISTRO
+    if resultado != "baja":
+        return f"No tienes materias inscritas en {gid}."
+    return (f"Listo, te di de baja de {gid}. Si alguien espera lugar, se inscribe en automático.\n"
+            f"(Folio: {folios[0]})")
+
+
+def _boleta(ctx) -> str:
+    return str(ctx.get("user", "")).strip()
 
 
 def _normaliza(s: str) -> str:
@@ -137,17 +171,17 @@ def _normaliza(s: str) -> str:
 
 def _buscar_grupo_en_todos(grupos_rows, gid: str):
     gid_up = (gid or "").strip().upper()
-    res = [r for r in grupos_rows if (r.get("grupo_id", "").strip().upper() == gid_up and r.get("periodo_id") == _PERIODO_ACTUAL)]
+    res = [r for r in grupos_rows if r.get("grupo_id", "").strip().upper() == gid_up]
     return res  # puede estar en M o V (distintas materias/rows)
 
 
-def _log_evento(ctx, turno_label, gid_req, resultado, detalle=None, materias_rows=None):
+def _entrada(ctx, turno_label, gid_req, resultado, detalle=None, materias_rows=None) -> dict:
     now = datetime.now().isoformat(timespec="seconds")
-    folio = f"INS-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    folio = nuevo_folio("INS")
     entry = {
         "folio": folio,
         "ts": now,
-        "periodo": _PERIODO_ACTUAL,
+        "periodo": get_calendario().actual(),
         "boleta": str(ctx.get("user", "")).strip(),
         "turno": {"code": ctx.get("insc_turno", ""), "label": turno_label},
         "grupo_id": gid_req,
@@ -164,15 +198,21 @@ def _log_evento(ctx, turno_label, gid_req, resultado, detalle=None, materias_row
             "modalidad": r.get("modalidad", ""),
             "salon": r.get("salon", ""),
             "capacidad": r.get("capacidad", ""),
-            "inscritos": r.get("inscritos", ""),
+            "inscritos": str(get_ledger().inscritos(r.get("grupo_id", ""), r.get("materia_id", ""))),
             "disponibles": max(_disp(r), 0),
             "slots": r.get("slots", "")
         } for r in materias_rows]
+    return entry
+
+
+def _log_evento(ctx, turno_label, gid_req, resultado, detalle=None, materias_rows=None):
+    """Intento que no cambia el cupo: se encola y se devuelve su folio."""
+    entry = _entrada(ctx, turno_label, gid_req, resultado, detalle, materias_rows)
     try:
         _append_inscripcion_log(entry)
     except Exception:
         pass
-    return folio
+    return entry["folio"]
 
 # ------------------ Disparadores / RE ------------------
 
@@ -185,17 +225,42 @@ UNCERTAIN_RE = r"^\s*(no\s*s[eé]|no\s*se\s*que\s*elegir|no\s*estoy\s*seguro|ayu
 REINICIAR_RE = r"^\s*(reiniciar|cancelar(\s+inscripci[oó]n)?|empezar\s+de\s+nuevo)\s*$"
 CAMBIAR_TURNO_RE = r"^\s*(cambiar\s+turno|otro\s+turno)\s*$"
 
+# Lista de espera y bajas
+ESPERA_RE = r"^\s*(lista\s+de\s+espera|mi\s+lugar(\s+en\s+(la\s+)?(lista|espera|fila))?|posici[oó]n\s+en\s+(la\s+)?(lista|espera|fila))\s*$"
+CANCELAR_ESPERA_RE = r"^\s*(cancelar|dejar)\s+(la\s+)?(lista\s+de\s+)?espera\s*[:=]?\s*(?P<g>\d{1,2}C[MV]\d+)\s*$"
+BAJA_RE = r"^\s*(baja|dar(me)?\s+de\s+baja(\s+del?)?(\s+grupo)?)\s*[:=]?\s*(?P<g>\d{1,2}C[MV]\d+)\s*$"
+
 # ------------------ Handler ------------------
 
 def handle(ctx, text):
     if not ctx.get("auth_ok"):
         return "Primero inicia sesión."
 
+    # Adeudos primero: un lookup, antes de agrupar o registrar nada
+    adeudos = get_adeudos().de(_boleta(ctx))
+    if adeudos:
+        return render_bloqueo(adeudos, "inscribirte")
+
     ok, err = _datos_disponibles()
     if not ok:
         return err
 
-    grupos_rows = _load_grupos()
+    grupos_rows = get_calendario().grupos()
+
+    # ---- Lista de espera / bajas (no dependen del turno elegido) ----
+    if re.search(ESPERA_RE, text, flags=re.I | re.X):
+        return _render_espera(_boleta(ctx))
+
+    m_cancelar = re.search(CANCELAR_ESPERA_RE, text, flags=re.I | re.X)
+    if m_cancelar:
+        gid = m_cancelar.group("g").strip().upper()
+        if get_espera().salir(_boleta(ctx), gid):
+            return f"Saliste de la lista de espera de {gid}."
+        return f"No estás en la lista de espera de {gid}."
+
+    m_baja = re.search(BAJA_RE, text, flags=re.I | re.X)
+    if m_baja:
+        return _dar_de_baja(ctx, grupos_rows, m_baja.group("g").strip().upper())
 
     # ---- Reiniciar flujo ----
     if re.search(REINICIAR_RE, text, flags=re.I | re.X):
@@ -222,7 +287,7 @@ def handle(ctx, text):
             return "Turno no reconocido. Usa: turno: M   o   turno: V"
 
         ctx["insc_turno"] = "M" if turno_label == "Matutino" else "V"
-        agg = _agrupar_por_grupo_y_turno(grupos_rows, turno_label)
+        agg = _agrupar_por_grupo_y_turno(grupos_rows, turno_label, _boleta(ctx))
         ctx["insc_listado"] = agg
 
         return (f"Muy bien, seleccionaste turno {turno_label}.\n"
@@ -237,7 +302,7 @@ def handle(ctx, text):
                     "  turno: M   (Matutino)\n"
                     "  turno: V   (Vespertino)")
         turno_label = _turno_label_from_code(turno_code)
-        agg = ctx.get("insc_listado") or _agrupar_por_grupo_y_turno(grupos_rows, turno_label)
+        agg = ctx.get("insc_listado") or _agrupar_por_grupo_y_turno(grupos_rows, turno_label, _boleta(ctx))
         ctx["insc_listado"] = agg
         return (f"Sigues en turno {turno_label}. Aquí están los grupos:\n"
                 f"{_render_listado_turno(agg)}")
@@ -253,7 +318,8 @@ def handle(ctx, text):
         turno_code = ctx["insc_turno"]
         turno_label = _turno_label_from_code(turno_code)
 
-        agg = ctx.get("insc_listado") or _agrupar_por_grupo_y_turno(grupos_rows, turno_label)
+        # Siempre fresco: el cupo cambia con cada inscripción
+        agg = _agrupar_por_grupo_y_turno(grupos_rows, turno_label, _boleta(ctx))
         ctx["insc_listado"] = agg
 
         data = agg.get(gid_req)
@@ -265,7 +331,7 @@ def handle(ctx, text):
                 folio = _log_evento(ctx, turno_label, gid_req, "turno_mismatch",
                                     detalle=f"Grupo {gid_req} pertenece a turno {turno_real}")
                 # Sugerencias del turno actual
-                suger = ", ".join(list(agg.keys())[:3]) if agg else "sin opciones"
+                suger = ", ".join([g for g, d in agg.items() if not d.get("empalme")][:3]) or "sin opciones"
                 return (f"El grupo '{gid_req}' pertenece al turno {turno_real}, pero ahora estás en {turno_label}.\n"
                         "¿Quieres cambiar de turno o elegir uno de estos?\n"
                         f"- Cambiar turno:  turno: {'M' if turno_real.lower().startswith('m') else 'V'}\n"
@@ -274,37 +340,86 @@ def handle(ctx, text):
             else:
                 # Sugerencias por prefijo
                 pref = gid_req[:3]
-                similares = [g for g in agg.keys() if _normaliza(g).startswith(_normaliza(pref))]
+                similares = [g for g, d in agg.items() if _normaliza(g).startswith(_normaliza(pref)) and not d.get("empalme")]
                 sug = f"Sugerencias: {', '.join(similares)}" if similares else "Verifica el listado con 'ver grupos'."
                 folio = _log_evento(ctx, turno_label, gid_req, "grupo_no_en_turno")
                 return (f"No identifiqué el grupo '{gid_req}' en turno {turno_label}.\n"
                         f"{sug}\n"
                         f"(Intento registrado: {folio})")
 
-        # Cupo a nivel grupo (mínimo entre materias)
-        disp_min = data["disp_min"]
-        hay_cupo = disp_min > 0
-
-        # Construimos materias para log
         materias_rows = data["rows"]
-        resultado = "inscrito" if hay_cupo else "sin_cupo"
-        folio = _log_evento(ctx, turno_label, gid_req, resultado, materias_rows=materias_rows)
+        faltan = get_grafo().validar(_boleta(ctx), [r.get("materia_id", "") for r in materias_rows])
+        if faltan:
+            detalle_txt = "; ".join(f"{mid} requiere {', '.join(pre)}" for mid, pre in sorted(faltan.items()))
+            folio = _log_evento(ctx, turno_label, gid_req, "sin_prerrequisitos", detalle=detalle_txt)
+            return (f"No puedes inscribir {gid_req}: te faltan prerrequisitos.\n"
+                    f"{detalle_txt}\n"
+                    f"(Intento registrado: {folio})")
+
+        if data.get("empalme"):
+            folio = _log_evento(ctx, turno_label, gid_req, "empalme")
+            libres = [g for g, d in agg.items() if not d.get("empalme") and d["disp_min"] > 0]
+            return (f"El horario de {gid_req} se empalma con materias que ya tienes inscritas.\n"
+                    f"Sugerencias sin empalme: {', '.join(libres[:3]) or 'ninguna en este turno'}\n"
+                    f"(Intento registrado: {folio})")
+
+        # Si ya espera lugar en este grupo, no se reintenta: se le da su posición
+        boleta = _boleta(ctx)
+        pos = get_espera().posicion(boleta, gid_req)
+        if pos:
+            return (f"Sigues en la lista de espera de {gid_req}: posición {pos}.\n"
+                    "Te inscribo automáticamente cuando se libere un lugar.\n"
+                    "Consulta con 'lista de espera' o sal con 'cancelar espera " + gid_req + "'.")
+
+        # Reservación atómica: todas las materias del grupo o ninguna. La
+        # inscripción queda escrita en el log antes de confirmarla.
+        folios = []
+
+        def registrar(_detalle):
+            entry = _entrada(ctx, turno_label, gid_req, "inscrito", materias_rows=materias_rows)
+            folios.append(entry["folio"])
+            return entry
+
+        try:
+            resultado, detalle = get_ledger().reservar_grupo(boleta, gid_req, registrar=registrar)
+        except OSError:
+            return _MSG_SIN_REGISTRO
+
+        if resultado == "materia_duplicada":
+            otras = ", ".join(f"{mid} en {gid}" for mid, gid in sorted(detalle["materias"].items()))
+            folio = _log_evento(ctx, turno_label, gid_req, resultado, detalle=f"Ya inscrito: {otras}")
+            return (f"No puedo inscribirte en {gid_req}: ya tienes {otras}.\n"
+                    f"(Intento registrado: {folio})")
+
+        disp_min = min(detalle.get("disponibles", {}).values(), default=0)
+        if resultado == "ya_inscrito":
+            return (f"Ya estás inscrito en {gid_req} ({turno_label}).\n"
+                    f"Cupo mínimo a nivel grupo: {disp_min}\n"
+                    "¿Deseas ver el detalle de materias u otro grupo?")
 
-        if hay_cupo:
+        if resultado == "inscrito":
+            folio = folios[0]
             return (f"De acuerdo, te inscribo en {gid_req} ({turno_label}).\n"
-                    f"Cupo mínimo a nivel grupo: {(str(disp_min))}\n"
-                    f"Se registró en: {str(_INSCRIPCIONES_LOG)}\n"
+                    f"Cupo mínimo a nivel grupo: {disp_min}\n"
+                    f"Folio: {folio}\n"
                     "¿Deseas ver el detalle de materias u otro grupo?")
         else:
+            # Sin cupo: se forma en la lista de espera del grupo
+            _log_evento(ctx, turno_label, gid_req, resultado, materias_rows=materias_rows)
+            pos = get_espera().formar(boleta, gid_req)
+            if pos == 0:
+                return (f"Se liberó un lugar justo ahora: quedaste inscrito en {gid_req} ({turno_label}).\n"
+                        "¿Deseas ver el detalle de materias u otro grupo?")
             # Ofrecer alternativas con mayor cupo
             alternativas = sorted(
-                [(g, d["disp_min"]) for g, d in agg.items() if d["disp_min"] > 0 and g != gid_req],
+                [(g, d["disp_min"]) for g, d in agg.items() if d["disp_min"] > 0 and g != gid_req and not d.get("empalme")],
                 key=lambda x: -x[1]
             )[:3]
             alt_txt = ", ".join([f"{g} (cupo {(str(dm))})" for g, dm in alternativas]) if alternativas else "No encontré alternativas con cupo en este turno."
-            return (f"Lo intenté, pero {gid_req} ya se llenó (cupo mínimo: {(str(disp_min))}).\n"
+            return (f"Lo intenté, pero {gid_req} ya se llenó (cupo mínimo: {(str(max(disp_min, 0)))}).\n"
+                    f"Te formé en la lista de espera: posición {pos}. Te inscribo en cuanto se libere un lugar.\n"
                     f"Sugerencias: {alt_txt}\n"
-                    f"Quedó registro en: {str(_INSCRIPCIONES_LOG)}\n"
+                    f"Quedó registro en: {str(get_ledger().log_path)}\n"
                     "Elige otro grupo con:  grupo: <ID>   o cambia de turno:  turno: M/V")
 
     # ---- Inicio del flujo / ayuda general ----
@@ -319,7 +434,7 @@ def handle(ctx, text):
     # ---- Si no matchea nada y hay contexto, devolvemos ayuda contextual ----
     if ctx.get("insc_turno"):
         turno_label = _turno_label_from_code(ctx["insc_turno"])
-        agg = ctx.get("insc_listado") or _agrupar_por_grupo_y_turno(grupos_rows, turno_label)
+        agg = ctx.get("insc_listado") or _agrupar_por_grupo_y_turno(grupos_rows, turno_label, _boleta(ctx))
         ctx["insc_listado"] = agg
         return (f"No entendí, pero sigues en turno {turno_label}.\n"
                 f"{_render_listado_turno(agg)}")
@@ -331,6 +446,14 @@ def handle(ctx, text):
             "Luego indica el grupo:\n"
             "  grupo: 3CV2   (o escribe 'inscripcion' para ver los pasos)")
 
+# Arranque: máscaras de horario, prerrequisitos, adeudos y calendario se construyen una sola vez.
+# El ledger de cupo y la lista de espera se arman con la primera consulta de cupo.
+def warmup():
+    get_slots()
+    get_grafo()
+    get_adeudos()
+    get_calendario()
+
 # Mantener el estado de autenticado
 NEXT_STATE = "AUTH_OK"
 ALLOWED_STATES = {"AUTH_OK"}
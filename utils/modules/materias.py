@@ -4,6 +4,8 @@ import csv
 from pathlib import Path
 from collections import defaultdict
 
+from utils.functions.periodos import get_calendario
+
 # ------------------ Configuración de datos ------------------
 
 # Rutas absolutas a los CSVs
@@ -109,7 +111,7 @@ def _calcular_disponibilidad(grupos):
     }
 
 
-def _render_materias_grupos(grupos, materias_dict, stats):
+def _render_materias_grupos(grupos, materias_dict, stats, periodo=""):
     """Renderiza la lista de materias y grupos con información completa."""
     if not grupos:
         return "No hay grupos disponibles para este periodo."
@@ -121,7 +123,9 @@ def _render_materias_grupos(grupos, materias_dict, stats):
         por_materia[materia_id].append(grupo)
     
     out = []
-    out.append("MATERIAS Y GRUPOS DISPONIBLES - PERIODO 2025-1")
+    info_periodo = get_calendario().periodo(periodo)
+    descripcion = f" ({info_periodo.descripcion})" if info_periodo and info_periodo.descripcion else ""
+    out.append(f"MATERIAS Y GRUPOS DISPONIBLES - PERIODO {periodo}{descripcion}")
     out.append("=" * 60)
     out.append(f"Total de grupos: {stats['total_grupos']}")
     out.append(f"Grupos con cupo disponible: {stats['grupos_disponibles']}")
@@ -187,22 +191,22 @@ def handle(ctx, text):
     if not ok:
         return err
     
-    grupos = _load_grupos()
     materias = _load_materias()
     
     # Convertir materias a diccionario para búsqueda rápida
     materias_dict = {m.get('materia_id', ''): m for m in materias}
     
-    # Filtrar grupos por periodo actual (2025-1)
-    grupos_periodo = [g for g in grupos if g.get('periodo_id', '') == '2025-1']
+    # Grupos del periodo actual (índice del calendario)
+    periodo = get_calendario().actual()
+    grupos_periodo = get_calendario().grupos(periodo)
     
     if not grupos_periodo:
-        return ("No encontré grupos disponibles para el periodo actual (2025-1). "
+        return (f"No encontré grupos disponibles para el periodo actual ({periodo}). "
                "¿Quieres 'ver calificaciones', 'info academica', 'tramites' o 'inscripcion'?")
     
     # Calcular estadísticas y renderizar
     stats = _calcular_disponibilidad(grupos_periodo)
-    materias_texto = _render_materias_grupos(grupos_periodo, materias_dict, stats)
+    materias_texto = _render_materias_grupos(grupos_periodo, materias_dict, stats, periodo)
     
     return (f"{materias_texto}\n\n"
            "¿Quieres 'inscripcion' para inscribirte, 'ver calificaciones' o 'info academica'?")
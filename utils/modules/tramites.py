@@ -1,5 +1,62 @@
 # utils/modules/tramites.py
 import re
+from pathlib import Path
+
+from utils.functions.logstore import get_store
+from utils.functions.adeudos import get_adeudos, render_bloqueo
+
+# ------------------ Configuración de datos ------------------
+
+_LOGS_DIR = Path(__file__).resolve().parents[2] / "resources" / "logs"
+_INSCRIPCIONES_LOG = _LOGS_DIR / "inscripciones.ndjson"
+_DICTAMEN_LOG = _LOGS_DIR / "dictamen.ndjson"
+
+_MAX_SOLICITUDES = 10
+
+
+def _buscar_folio(folio: str):
+    log = _DICTAMEN_LOG if folio.startswith("DIC-") else _INSCRIPCIONES_LOG
+    return get_store(log).by_folio(folio)
+
+
+def _solicitudes_de(boleta: str):
+    """Dictámenes + intentos de inscripción de la boleta, del más reciente al más viejo."""
+    res = get_store(_DICTAMEN_LOG).by_boleta(boleta) + get_store(_INSCRIPCIONES_LOG).by_boleta(boleta)
+    return sorted(res, key=lambda e: e.get("ts", ""), reverse=True)
+
+
+def _render_solicitud(e: dict) -> str:
+    if e.get("tipo") == "solicitud_dictamen":
+        return (f"- {e.get('folio','')} | {e.get('ts','')} | Dictamen: {e.get('materia','')} "
+                f"| Estatus: {e.get('estatus','')}")
+    return (f"- {e.get('folio','')} | {e.get('ts','')} | Inscripción grupo {e.get('grupo_id','')} "
+            f"| Resultado: {e.get('resultado','')}")
+
+
+def _render_seguimiento(ctx) -> str:
+    boleta = str(ctx.get("user", "")).strip()
+    solicitudes = _solicitudes_de(boleta)
+    if not solicitudes:
+        return ("[Trámites > Seguimiento]\n"
+                "No encontré solicitudes registradas con tu boleta.\n"
+                "Opciones: volver a 'tramites', 'solicitud', 'citas'.")
+    out = ["[Trámites > Seguimiento]", "Tus solicitudes más recientes:"]
+    out += [_render_solicitud(e) for e in solicitudes[:_MAX_SOLICITUDES]]
+    if len(solicitudes) > _MAX_SOLICITUDES:
+        out.append(f"(y {len(solicitudes) - _MAX_SOLICITUDES} más)")
+    out.append("Para ver una en detalle escribe su folio, por ejemplo: DIC-...")
+    return "\n".join(out)
+
+
+def _render_folio(ctx, folio: str) -> str:
+    e = _buscar_folio(folio)
+    boleta = str(ctx.get("user", "")).strip()
+    if not e or str(e.get("boleta", "")).strip() != boleta:
+        return f"No encontré el folio {folio} entre tus solicitudes."
+    out = [f"Folio {folio}", _render_solicitud(e)]
+    if e.get("detalle"):
+        out.append(f"Detalle: {e['detalle']}")
+    return "\n".join(out)
 
 # ------------------ Disparadores / RE ------------------
 
@@ -42,34 +99,48 @@ TRAM_CITAS_RE = r"""
 )\b
 """
 
+# Consulta directa de un folio: "estatus de DIC-20250916131817"
+FOLIO_RE = r"\b(?:ins|dic)-\d{14,17}(?:-w\d{3}-[0-9a-z]{7})?\b"
+
 # ------------------ Handler ------------------
 
 def handle(ctx, text):
     # Normalizamos flags de búsqueda
     flags = re.I | re.X
 
+    # Adeudos: un lookup antes de cualquier búsqueda en logs
+    adeudos = get_adeudos().de(str(ctx.get("user", "")).strip())
+
     # Subintenciones primero
     if re.search(TRAM_SOLICITUD_RE, text, flags=flags):
+        if adeudos:
+            return render_bloqueo(adeudos, "registrar solicitudes")
         return ("[Trámites > Solicitud]\n"
                 "Aquí podrás **registrar una solicitud**. (WIP)\n"
                 "Opciones: volver a 'tramites', 'seguimiento', 'citas'.")
 
+    m_folio = re.search(FOLIO_RE, text, flags=flags)
+    if m_folio:
+        return _render_folio(ctx, m_folio.group(0).upper())
+
     if re.search(TRAM_SEGUIMIENTO_RE, text, flags=flags):
-        return ("[Trámites > Seguimiento]\n"
-                "Aquí puedes **consultar el estado** de tu trámite. (WIP)\n"
-                "Opciones: volver a 'tramites', 'solicitud', 'citas'.")
+        return _render_seguimiento(ctx)
 
     if re.search(TRAM_CITAS_RE, text, flags=flags):
+        if adeudos:
+            return render_bloqueo(adeudos, "agendar citas")
         return ("[Trámites > Citas]\n"
                 "Aquí podrás **agendar o consultar citas** relacionadas. (WIP)\n"
                 "Opciones: volver a 'tramites', 'solicitud', 'seguimiento'.")
 
     # Entrada general a la sección de Trámites (mensaje de bienvenida)
     if re.search(TRAMITES_RE, text, flags=flags):
+        aviso = ("\n\n⚠️ Tienes adeudos pendientes: solo puedes consultar el seguimiento."
+                 if adeudos else "")
         return ("Hola, esta es la **sección de Trámites**.\n"
                 "Aquí puedes consultar **Documentos e información de**:\n"
                 "- **Solicitud**\n- **Seguimiento**\n- **Citas**\n\n"
-                "Escribe una opción (por ejemplo: 'solicitud', 'seguimiento' o 'citas').")
+                "Escribe una opción (por ejemplo: 'solicitud', 'seguimiento' o 'citas')." + aviso)
 
     # Si tu automáta enruta por RE, quizá este else no sea necesario.
     return "No entendí. Prueba con: 'tramites', 'solicitud', 'seguimiento' o 'citas'."